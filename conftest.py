@@ -0,0 +1,22 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+
+
+def pytest_configure(config):
+    # The tests must not read, write or flush the Redis cache shared with Celery
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+    # The worker threads would not see the rows of a test, which is never committed
+    settings.EMAIL_DISPATCH_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Every test starts with an empty cache.
+    """
+    cache.clear()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'trades',
     'users',
     'home_page',
@@ -170,6 +171,8 @@ except ImportError:
     print("Email Backend is not configured! Please complete the data.")
 
 SEND_EMAIL_CELERY = True
+# The threads sending the e-mails after the response without Celery, with 0 they are sent in the request
+EMAIL_DISPATCH_WORKERS = 2
 EMAIL_TEMPLATE = "users/email.html"
 
 
@@ -178,6 +181,12 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'static/media')
 MEDIA_URL = '/media/'
 DEFAULT_AVATAR = MEDIA_URL + 'avatars/default_avatar.png'
 
+# The job files are sent by the front web server: "x-accel-redirect" (nginx, with an internal
+# location serving MEDIA_ROOT under JOBS_FILES_SENDFILE_PREFIX), "x-sendfile" (Apache, lighttpd)
+# or by Django itself, if it is None
+JOBS_FILES_SENDFILE = None
+JOBS_FILES_SENDFILE_PREFIX = '/protected-media/'
+
 
 # Celery & Redis
 CELERY_TIMEZONE = "Europe/Warsaw"
@@ -190,9 +199,6 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
         "LOCATION": "redis://127.0.0.1:6379",
-        "OPTIONS": {
-            "CLIENT_CLASS": "django.core.cache.backends.redis.client.DefaultClient",
-        },
         # "KEY_PREFIX": "example",
     }
 }
@@ -213,18 +219,48 @@ BASE_URL = urlunparse((SCHEME, NETLOC, "", None, None, None))
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
 CELERY_BEAT_SCHEDULE = {
-    'jobs-upcoming-deadline-contractor': {
-        'task': 'jobs.tasks.jobs_upcoming_deadline_contractor',
+    'jobs-deadline-reminders': {
+        'task': 'jobs.tasks.jobs_deadline_reminders',
         'schedule': crontab(hour="0", minute="15"),
     },
-    'jobs-overdue-deadline-principal': {
-        'task': 'jobs.tasks.jobs_overdue_deadline_principal',
-        'schedule': crontab(hour="0", minute="30"),
-    },
     'jobs-monthly-status-report': {
         'task': 'jobs.tasks.jobs_monthly_status_report',
         'schedule': crontab(day_of_month="1", hour="2", minute="00"),
-    }
+    },
+    'jobs-flush-file-downloads': {
+        'task': 'jobs.tasks.jobs_flush_file_downloads',
+        'schedule': crontab(minute="*/5"),
+    },
+    'jobs-collect-orphan-blobs': {
+        'task': 'jobs.tasks.jobs_collect_orphan_blobs',
+        'schedule': crontab(hour="3", minute="00"),
+    },
+    'jobs-abort-stale-uploads': {
+        'task': 'jobs.tasks.jobs_abort_stale_uploads',
+        'schedule': crontab(hour="3", minute="15"),
+    },
+    'jobs-clean-files-archives': {
+        'task': 'jobs.tasks.jobs_clean_files_archives',
+        'schedule': crontab(hour="3", minute="30"),
+    },
+    'users-dispatch-email-outbox': {
+        'task': 'users.tasks.users_dispatch_email_outbox',
+        'schedule': crontab(minute="*"),
+    },
+    'users-clean-email-outbox': {
+        'task': 'users.tasks.users_clean_email_outbox',
+        'schedule': crontab(hour="4", minute="00"),
+    },
+    'users-hourly-notification-digests': {
+        'task': 'users.tasks.users_send_notification_digests',
+        'schedule': crontab(minute="05"),
+        'args': ("hourly",),
+    },
+    'users-daily-notification-digests': {
+        'task': 'users.tasks.users_send_notification_digests',
+        'schedule': crontab(hour="7", minute="00"),
+        'args': ("daily",),
+    },
 }
 
 
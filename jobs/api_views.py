@@ -0,0 +1,212 @@
+import hashlib
+
+from django.db.models import Count, Max, prefetch_related_objects
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from jobs.blobs import attach_known_blob
+from jobs.consts import (
+    JOBS_API_FIELDS_ERROR,
+    JOBS_API_FIELDS_PARAM,
+    JOBS_API_PER_PAGE,
+    JOBS_SEARCH_API_LIMIT,
+    JOBS_SEARCH_PARAM,
+    JOBS_SEARCH_QUERY_ERROR,
+)
+from jobs.models import get_attachments_prefetch, Job, JobFileUpload
+from jobs.paginators import KeysetCursorPagination
+from jobs.serializers import (
+    JobFileSerializer,
+    JobFileUploadSerializer,
+    JobSearchSerializer,
+    JobSerializer,
+)
+from jobs.uploads import abort_upload, append_chunk, start_upload
+from jobs.views import filter_jobs
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_jobs(request):
+    search = request.query_params.get(JOBS_SEARCH_PARAM, "").strip()
+    if not search:
+        return Response({"detail": JOBS_SEARCH_QUERY_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+
+    jobs = (
+        Job.objects.select_related("trade")
+        .defer("description", "comments")
+        .search(search)
+        .order_by("-rank", "-pk")[:JOBS_SEARCH_API_LIMIT]
+    )
+    serializer = JobSearchSerializer(jobs, many=True)
+    return Response(serializer.data)
+
+
+def get_sparse_fields(request):
+    """
+    Return the field names of the `fields` parameter or None if all the fields are wanted.
+
+    :raises ValidationError: if a field is not a field of the `JobSerializer`
+    """
+    if not (value := request.query_params.get(JOBS_API_FIELDS_PARAM)):
+        return None
+    fields = {name.strip() for name in value.split(",") if name.strip()}
+    if unknown := fields - set(JobSerializer.Meta.fields):
+        raise ValidationError(
+            {JOBS_API_FIELDS_PARAM: JOBS_API_FIELDS_ERROR.format(sorted(unknown))}
+        )
+    return fields
+
+
+def attach_job_files(jobs):
+    """
+    Fetch the attachments of all the jobs in one query, as their `attachment_files`.
+    """
+    prefetch_related_objects(jobs, get_attachments_prefetch())
+
+
+def get_etag(request, *parts):
+    """
+    Return an ETag of the response to the request (with its parameters) built of the parts,
+    which have to change whenever the content changes.
+    """
+    key = ":".join(str(part) for part in (request.get_full_path(), *parts))
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def conditional(request, response_func, etag, last_modified=None):
+    """
+    Return 304 Not Modified if the client has the current version, otherwise the response
+    of the `response_func` with the ETag and the Last-Modified headers.
+    """
+    last_modified = last_modified and int(last_modified.timestamp())
+    if not_modified := get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified
+    ):
+        return not_modified
+
+    response = response_func()
+    response["ETag"] = quote_etag(etag)
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def jobs_list(request):
+    """
+    List the jobs with the filters, the search and the sort of the jobs list,
+    paginated by the cursor.
+
+    The related objects are fetched in a constant number of queries and the `fields`
+    parameter limits the fields of the jobs. The ETag changes when a job is created,
+    changed or deleted, so the clients polling with `If-None-Match` get 304 Not Modified.
+    """
+    fields = get_sparse_fields(request)
+    try:
+        jobs, filter_form, order_by, _ = filter_jobs(
+            request, Job.objects.select_related("trade"), headlines=False
+        )
+    except ValueError as error:
+        return Response({"order_by": [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+    if filter_form.errors:
+        return Response(filter_form.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Deleting a job changes the count, but not the last update of the others
+    state = jobs.aggregate(count=Count("pk"), last_updated=Max("updated"))
+
+    def get_response():
+        pagination = KeysetCursorPagination(order_by=order_by, per_page=JOBS_API_PER_PAGE)
+        page = pagination.paginate_queryset(jobs, request)
+        if fields is None or "attachments" in fields:
+            attach_job_files(page)
+        serializer = JobSerializer(page, many=True, fields=fields, context={"request": request})
+        return pagination.get_paginated_response(serializer.data)
+
+    return conditional(request, get_response, etag=get_etag(request, *state.values()))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def job_details(request, job_pk):
+    """
+    Return a job, with the ETag and the Last-Modified headers for the conditional requests.
+    """
+    fields = get_sparse_fields(request)
+    updated = get_object_or_404(Job.objects.values_list("updated", flat=True), pk=job_pk)
+
+    def get_response():
+        job = Job.objects.select_related("trade").get(pk=job_pk)
+        attach_job_files([job])
+        serializer = JobSerializer(job, fields=fields, context={"request": request})
+        return Response(serializer.data)
+
+    return conditional(
+        request, get_response, etag=get_etag(request, updated.isoformat()), last_modified=updated
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def job_file_uploads(request, job_pk):
+    """
+    Start a chunked upload of a job file.
+
+    The client sends the `name`, the `size` and optionally the `sha256` of the file.
+    Then it sends the chunks of at most `chunk_size` bytes to the returned `url`,
+    in order, with PUT requests and the `Content-Range` header.
+
+    A file with the `sha256` of an already stored content is attached right away
+    and the job file is returned instead of an upload.
+    """
+    job = get_object_or_404(Job, pk=job_pk)
+    serializer = JobFileUploadSerializer(data=request.data, context={"request": request})
+    serializer.is_valid(raise_exception=True)
+    if serializer.validated_data["sha256"]:
+        job_file = attach_known_blob(
+            job,
+            serializer.validated_data["sha256"].lower(),
+            serializer.validated_data["size"],
+            serializer.validated_data["name"],
+        )
+        if job_file is not None:
+            data = JobFileSerializer(job_file, context={"request": request}).data
+            return Response(data, status=status.HTTP_201_CREATED, headers={"Location": data["url"]})
+    upload = start_upload(job, request.user, **serializer.validated_data)
+    data = JobFileUploadSerializer(upload, context={"request": request}).data
+    return Response(data, status=status.HTTP_201_CREATED, headers={"Location": data["url"]})
+
+
+@api_view(["GET", "PUT", "DELETE"])
+@permission_classes([IsAuthenticated])
+def job_file_upload(request, upload_pk):
+    """
+    Resume (GET returns the `offset` to continue from), continue (PUT a chunk)
+    or cancel (DELETE) an upload of a job file.
+
+    A chunk may come with the `Content-Digest: sha-256=:<base64>:` header, so a chunk
+    damaged on the way is rejected and sent again. The last chunk returns the job file.
+    """
+    upload = get_object_or_404(JobFileUpload, pk=upload_pk, user=request.user)
+    if request.method == "DELETE":
+        abort_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    if request.method == "PUT":
+        job_file = append_chunk(
+            upload,
+            request.stream,
+            request.headers.get("Content-Range"),
+            request.headers.get("Content-Digest"),
+        )
+        if job_file is not None:
+            serializer = JobFileSerializer(job_file, context={"request": request})
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        upload.refresh_from_db()
+    return Response(JobFileUploadSerializer(upload, context={"request": request}).data)
@@ -0,0 +1,189 @@
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.shortcuts import reverse
+from django.utils.timezone import localtime
+
+from jobs.consts import (
+    EMAIL_JOBS_ARCHIVE_CONTENT,
+    EMAIL_JOBS_ARCHIVE_SUBJECT,
+    JOBS_ARCHIVE_DIRECTORY,
+    JOBS_ARCHIVE_MAX_AGE,
+    JOBS_ARCHIVE_READ_SIZE,
+    JOBS_ARCHIVE_STORED_EXTENSIONS,
+    JOBS_ARCHIVE_STREAM_MAX_FILES,
+    JOBS_ARCHIVE_STREAM_MAX_SIZE,
+)
+from jobs.exports import StreamBuffer
+from jobs.models import JobFile
+from users.helpers import send_email
+from users.models import User
+
+ARCHIVE_TOKEN_SALT = "jobs.archives"
+
+
+def archive_job_files(job_files):
+    """
+    Return the stored job files of a selection in the order of the archive.
+    """
+    return job_files.exclude(file="").filter(job__isnull=False).order_by("job_id", "pk")
+
+
+def is_too_large_to_stream(job_files):
+    """
+    Tell whether the selected job files should be archived by a worker instead of streamed.
+
+    The files without a blob, which the backfill could not move, are measured in the storage.
+    """
+    totals = job_files.aggregate(count=Count("pk"), size=Sum("blob__size"))
+    if totals["count"] > JOBS_ARCHIVE_STREAM_MAX_FILES:
+        return True
+    size = totals["size"] or 0
+    for job_file in job_files.filter(blob__isnull=True).only("file"):
+        try:
+            size += job_file.file.size
+        except FileNotFoundError:
+            continue
+    return size > JOBS_ARCHIVE_STREAM_MAX_SIZE
+
+
+def _archive_entries(job_files):
+    """
+    Yield the job files with their unique names in the archive, one directory per job.
+    """
+    used = set()
+    for job_file in job_files.iterator(chunk_size=JOBS_ARCHIVE_STREAM_MAX_FILES):
+        stem, extension = os.path.splitext(job_file.file_basename)
+        arcname = f"job_{job_file.job_id:06d}/{stem}{extension}"
+        number = 1
+        while arcname.lower() in used:
+            number += 1
+            arcname = f"job_{job_file.job_id:06d}/{stem} ({number}){extension}"
+        used.add(arcname.lower())
+        yield job_file, arcname
+
+
+def stream_zip(job_files):
+    """
+    Yield a ZIP archive of the job files in chunks, while the files are read.
+
+    The memory use does not depend on the sizes of the files. The formats which are
+    compressed already are stored as they are, the rest is deflated. The missing files
+    are skipped.
+
+    :param job_files: a queryset of job files, see `archive_job_files`
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for job_file, arcname in _archive_entries(job_files):
+            try:
+                file = job_file.file.open("rb")
+            except FileNotFoundError:
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=localtime(job_file.uploaded).timetuple()[:6])
+            stored = arcname.rpartition(".")[2].lower() in JOBS_ARCHIVE_STORED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with file, archive.open(info, mode="w", force_zip64=True) as entry:
+                while chunk := file.read(JOBS_ARCHIVE_READ_SIZE):
+                    entry.write(chunk)
+                    if data := buffer.drain():
+                        yield data
+    yield buffer.drain()
+
+
+def build_archive(job_file_pks):
+    """
+    Write a ZIP archive of the job files to the archives directory of the media storage.
+
+    The archive is written to a temporary file and moved in place, when it is complete.
+
+    :param job_file_pks: the pks of the job files
+    :return: the name of the archive
+    """
+    name = os.path.join(JOBS_ARCHIVE_DIRECTORY, f"{uuid.uuid4().hex}.zip")
+    target = default_storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    descriptor, path = tempfile.mkstemp(dir=os.path.dirname(target))
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            for chunk in stream_zip(archive_job_files(JobFile.objects.filter(pk__in=job_file_pks))):
+                file.write(chunk)
+        os.replace(path, target)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return name
+
+
+def archive_download_url(user_pk, name, file_name):
+    """
+    Return the absolute URL of a built archive, signed for a single user.
+    """
+    token = signing.dumps(
+        {"user": user_pk, "name": name, "file_name": file_name}, salt=ARCHIVE_TOKEN_SALT
+    )
+    return settings.BASE_URL + reverse("jobs-archive-download", kwargs={"token": token})
+
+
+def load_archive_token(token, user_pk):
+    """
+    Return the name of the archive and the name of the download, if the token is valid.
+
+    :raise signing.BadSignature: if the token is not valid, has expired or belongs to another user
+    """
+    data = signing.loads(token, salt=ARCHIVE_TOKEN_SALT, max_age=JOBS_ARCHIVE_MAX_AGE)
+    if data["user"] != user_pk:
+        raise signing.BadSignature("The archive belongs to another user")
+    return data["name"], data["file_name"]
+
+
+def send_archive(user_pk, job_file_pks, file_name):
+    """
+    Build a ZIP archive of the job files and e-mail its download link to the user.
+
+    :param int user_pk: the pk of the user who asked for the archive
+    :param job_file_pks: the pks of the job files
+    :param str file_name: the name of the downloaded archive
+    :return: the name of the archive or None, if the user does not exist anymore
+    """
+    user = User.objects.filter(pk=user_pk).first()
+    if user is None:
+        return None
+    name = build_archive(job_file_pks)
+    send_email(
+        recipients=[user.email],
+        subject=EMAIL_JOBS_ARCHIVE_SUBJECT,
+        content=EMAIL_JOBS_ARCHIVE_CONTENT.format(
+            count=len(job_file_pks),
+            url=archive_download_url(user.pk, name, file_name),
+            days=JOBS_ARCHIVE_MAX_AGE // (24 * 60 * 60),
+        ),
+        idempotency_key=f"jobs-archive:{name}",
+    )
+    return name
+
+
+def clean_archives(max_age=JOBS_ARCHIVE_MAX_AGE):
+    """
+    Remove the built archives, whose links have expired.
+
+    :param int max_age: the age of the removed archives in seconds
+    :return: the number of the removed archives
+    """
+    directory = default_storage.path(JOBS_ARCHIVE_DIRECTORY)
+    if not os.path.isdir(directory):
+        return 0
+    oldest = time.time() - max_age
+    count = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < oldest:
+            os.remove(entry.path)
+            count += 1
+    return count
@@ -0,0 +1,103 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils.timezone import now
+
+from jobs.consts import JOBS_BLOBS_GRACE_PERIOD
+from jobs.models import FileBlob, JobFile
+from jobs.storage import blob_storage
+from jobs.thumbnails import thumbnail_name
+
+
+def attach_blob(job, sha256, size, name):
+    """
+    Attach a stored blob to the job as a job file with the given name.
+
+    :param job: the job the file is attached to
+    :param str sha256: the hex digest of the blob, already stored
+    :param int size: the size of the blob in bytes
+    :param str name: the name the file is shown with
+    :return: the created `JobFile`
+    """
+    with transaction.atomic():
+        # The update waits for a blob being collected as an orphan and then finds no row
+        while not FileBlob.objects.filter(pk=sha256).update(
+            references=F("references") + 1, updated=now()
+        ):
+            FileBlob.objects.get_or_create(sha256=sha256, defaults={"size": size})
+        return JobFile.objects.create(
+            job=job,
+            content_object=job,
+            blob_id=sha256,
+            name=name,
+            file=blob_storage.blob_name(sha256),
+        )
+
+
+def create_job_file(job, content, name=None):
+    """
+    Store the content as a blob, hashed while it is written, and attach it to the job.
+    A content, which is already stored, is not stored again.
+
+    :param job: the job the file is attached to
+    :param content: a `File`, e.g. an uploaded file
+    :param str name: the name the file is shown with, the name of the content by default
+    :return: the created `JobFile`
+    """
+    blob_name = blob_storage.save(None, content)
+    return attach_blob(job, blob_storage.blob_sha256(blob_name), content.size, name or content.name)
+
+
+def attach_known_blob(job, sha256, size, name):
+    """
+    Attach an already stored content to the job without uploading it again.
+
+    The blob is locked before its file is touched, so it is either skipped by a running
+    collection or not found after it.
+
+    :return: the created `JobFile` or None, if no such content is stored
+    """
+    with transaction.atomic():
+        if FileBlob.objects.select_for_update().filter(pk=sha256, size=size).first() is None:
+            return None
+        if not blob_storage.touch(blob_storage.blob_name(sha256)):
+            return None
+        return attach_blob(job, sha256, size, name)
+
+
+def release_blob(sha256):
+    """
+    Drop a reference to the blob of a deleted job file. The blob itself is collected later.
+    """
+    FileBlob.objects.filter(pk=sha256).update(references=F("references") - 1, updated=now())
+
+
+def collect_orphan_blobs(grace_period=JOBS_BLOBS_GRACE_PERIOD):
+    """
+    Remove the blobs, which have not been referenced by any job file for the grace period.
+
+    The blobs are locked while they are removed, so a job file attached at the same time
+    waits and stores its blob again.
+
+    :param int grace_period: the number of seconds an unreferenced blob is kept for
+    :return: the number of the removed blobs
+    """
+    cutoff = now() - datetime.timedelta(seconds=grace_period)
+    with transaction.atomic():
+        orphans = list(
+            FileBlob.objects.select_for_update(skip_locked=True)
+            .filter(references__lte=0, updated__lt=cutoff)
+            .exclude(Exists(JobFile.objects.filter(blob=OuterRef("pk"))))
+        )
+        removed = []
+        for blob in orphans:
+            name = blob_storage.blob_name(blob.sha256)
+            # A blob found again by the storage has been touched and waits for another round
+            if blob_storage.exists(name) and blob_storage.get_modified_time(name) >= cutoff:
+                continue
+            blob_storage.delete(name)
+            blob_storage.delete(thumbnail_name(name))
+            removed.append(blob.sha256)
+        FileBlob.objects.filter(pk__in=removed).delete()
+    return len(removed)
@@ -22,18 +22,119 @@ class JobStatuses(models.TextChoices):
 
 # Constants
 JOBS_PER_PAGE = 10
+JOBS_ORDER_BY_FIELDS = ("pk", "description", "deadline", "created")
+JOBS_ORDER_BY_DEFAULT = "-created"
+JOBS_CURSOR_PARAM = "cursor"
+JOBS_PREVIEW_LENGTH = 128
+JOBS_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+JOBS_FRAGMENT_CACHE_VERSION = 1  # Bump after changing the job row/card templates
+JOBS_SEARCH_CONFIGS = ("polish", "english")  # The same as in the search vector trigger
+JOBS_SEARCH_HIGHLIGHT_START = "\x02"
+JOBS_SEARCH_HIGHLIGHT_STOP = "\x03"
+JOBS_SEARCH_API_LIMIT = 20
+JOBS_API_PER_PAGE = 50
+JOBS_API_FIELDS_PARAM = "fields"
+JOBS_SEARCH_PARAM = "q"
+JOBS_EXPORT_CHUNK_SIZE = 2000
+JOBS_EXPORT_HEADER = (
+    "ID",
+    "Principal",
+    "Contractor",
+    "Status",
+    "Kind",
+    "Description",
+    "Deadline",
+    "km from",
+    "km to",
+    "Trade",
+    "Comments",
+    "Created",
+    "Attachments",
+)
+JOBS_EXPORT_FILE_NAME = "jobs_{:%Y-%m-%d}.{}"
+JOBS_DOWNLOADS_BUFFER_TIMEOUT = 24 * 60 * 60
+JOBS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+JOBS_UPLOAD_MAX_SIZE = 10 * 1024 * 1024 * 1024
+JOBS_UPLOAD_READ_SIZE = 64 * 1024
+JOBS_UPLOAD_PART_SUFFIX = ".part"
+# The uploads, which have not received a chunk for a week, are removed with their partial files
+JOBS_UPLOAD_MAX_AGE = 7 * 24 * 60 * 60
+# The content of the job files is stored once under its SHA-256, e.g. `blobs/ab/cd/abcd...`
+JOBS_BLOBS_DIRECTORY = "blobs"
+JOBS_BLOBS_TEMPORARY_DIRECTORY = "blobs/tmp"
+# The unreferenced blobs are kept for a while, so a re-upload of a removed file is still instant
+JOBS_BLOBS_GRACE_PERIOD = 24 * 60 * 60
+# The thumbnails of the image attachments are stored next to the files, as `<file>.thumb.jpg`
+JOBS_THUMBNAIL_EXTENSIONS = ("jpg", "jpeg", "png", "tif", "tiff")
+JOBS_THUMBNAIL_SIZE = (320, 320)
+JOBS_THUMBNAIL_QUALITY = 80
+JOBS_THUMBNAIL_SUFFIX = ".thumb.jpg"
+JOBS_THUMBNAIL_BATCH_SIZE = 50
+JOBS_THUMBNAIL_WORKERS = 4
+JOBS_THUMBNAIL_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+# The files of these formats are compressed already, they are stored in the archives as they are
+JOBS_ARCHIVE_STORED_EXTENSIONS = ("jpg", "jpeg", "png", "pdf", "zip", "docx", "xlsx", "laz")
+JOBS_ARCHIVE_READ_SIZE = 1024 * 1024
+# A larger selection of files is archived by a worker and the link is sent by an e-mail
+JOBS_ARCHIVE_STREAM_MAX_FILES = 500
+JOBS_ARCHIVE_STREAM_MAX_SIZE = 2 * 1024 * 1024 * 1024
+JOBS_ARCHIVE_DIRECTORY = "archives"
+JOBS_ARCHIVE_MAX_AGE = 3 * 24 * 60 * 60
+JOBS_ARCHIVE_FILE_NAME = "job_files_{:%Y-%m-%d}.zip"
+JOB_ARCHIVE_FILE_NAME = "job_{:06d}_files.zip"
+# The allowed extensions of the uploaded job files with the signatures their content starts with,
+# the files without a fixed signature (texts, coordinates lists) are not checked
+JOBS_UPLOAD_SIGNATURES = {
+    "pdf": (b"%PDF-",),
+    "jpg": (b"\xff\xd8\xff",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "tif": (b"II*\x00", b"MM\x00*"),
+    "tiff": (b"II*\x00", b"MM\x00*"),
+    "zip": (b"PK\x03\x04", b"PK\x05\x06"),
+    "docx": (b"PK\x03\x04",),
+    "xlsx": (b"PK\x03\x04",),
+    "dwg": (b"AC10",),
+    "las": (b"LASF",),
+    "laz": (b"LASF",),
+    "e57": (b"ASTM-E57",),
+    "dxf": None,
+    "csv": None,
+    "txt": None,
+    "xyz": None,
+}
+# Not carried over by the filter links
+JOBS_PAGINATION_PARAMS = ("page", JOBS_CURSOR_PARAM, "order_by")
 
 
 # Forms
 KM_HELP_TEXT = "Use , or . as a separator"
 DEADLINE_FORM_ERROR = "A date from the past was given"
+RANGE_FORM_ERROR = "The end of the range is before its start"
+KM_FORMAT_ERROR = "Use the 123+400 or 123.400 format"
 
 
 # Views
 JOB_CREATE_SUCCESS_MESSAGE = "The job has been created!"
 JOB_SAVE_SUCCESS_MESSAGE = "The job has been saved!"
+JOBS_ARCHIVE_QUEUED_MESSAGE = "There are too many files to send them right away. A download link will be e-mailed to you when the archive is ready."
+JOBS_ARCHIVE_UNAVAILABLE_MESSAGE = "There are too many files to send them right away and the archive cannot be prepared now. Try again later."
 JOB_ROLE_CONTRACTOR = "contractor"
 JOB_ROLE_PRINCIPAL = "principal"
+JOB_ROLES = (JOB_ROLE_PRINCIPAL, JOB_ROLE_CONTRACTOR)
+JOBS_IN_PROGRESS = "in_progress"
+JOBS_ORDER_BY_ERROR = "Jobs cannot be sorted by `{}`"
+JOBS_SEARCH_QUERY_ERROR = "The `q` parameter is required"
+JOBS_API_FIELDS_ERROR = "Unknown fields: {}"
+UPLOAD_EXTENSION_ERROR = "Only these files can be uploaded: {}"
+UPLOAD_SIGNATURE_ERROR = "The content of the file does not match its extension"
+UPLOAD_SIZE_ERROR = "The file is larger than {} bytes"
+UPLOAD_CHUNK_SIZE_ERROR = "A chunk cannot be larger than {} bytes"
+UPLOAD_RANGE_ERROR = "Use the `Content-Range: bytes <start>-<end>/<size>` header"
+UPLOAD_OFFSET_ERROR = "The upload continues from the byte {}"
+UPLOAD_LENGTH_ERROR = "The chunk does not match its range"
+UPLOAD_DIGEST_ERROR = "The checksum of the chunk does not match"
+UPLOAD_CHECKSUM_ERROR = "The checksum of the file does not match, upload it again"
 
 
 # E-mails
@@ -43,11 +144,10 @@ EMAIL_JOB_CHANGE_STATUS_SUBJECT = "The job number {} has changed status"
 EMAIL_JOB_CHANGE_STATUS_CONTENT = "The job number {job_pk} has changed status to <strong>{status}</strong>. Check the details here <a href={url}>[CLICK]</a>"
 EMAIL_JOB_CHANGE_CONTRACTOR_SUBJECT = "The job number {} has been assigned to you"
 EMAIL_JOB_CHANGE_CONTRACTOR_CONTENT = "The job number {job_pk} in the {trade} trade has been assigned to you. Check the details here <a href={url}>[CLICK]</a>"
-EMAIL_JOB_UPCOMING_DEADLINE_SUBJECT = "Tomorrow is the deadline for the job number {}."
-EMAIL_JOB_UPCOMING_DEADLINE_CONTENT = (
-    "Tomorrow is the deadline for the job number {}. Remember to finish your work."
-)
-EMAIL_JOB_OVERDUE_DEADLINE_SUBJECT = "Your job number {} has not been completed."
-EMAIL_JOB_OVERDUE_DEADLINE_CONTENT = "The deadline for the job number {} has passed and it not has been completed. Contact the Contractor to arrange the details."
+EMAIL_JOB_DEADLINE_REMINDER_SUBJECT = "A reminder about the deadlines of {} of your job(s)."
+EMAIL_JOB_DEADLINE_REMINDER_CONTENT = "Remember about the deadlines of the jobs below."
+EMAIL_JOB_DEADLINE_REMINDER_TEMPLATE = "jobs/deadline_reminder.html"
 EMAIL_JOB_MONTHLY_STATUS_SUBJECT = "Jobs Monthly Status"
+EMAIL_JOBS_ARCHIVE_SUBJECT = "The archive of the job files is ready"
+EMAIL_JOBS_ARCHIVE_CONTENT = "The archive of {count} job files is ready. Download it here <a href={url}>[CLICK]</a>, the link expires in {days} days."
 EMAIL_JOB_MONTHLY_STATUS_CONTENT = "Monthly statistics for the year <strong>{year}</strong>, month <strong>{month}</strong> are in the attachment"
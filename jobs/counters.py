@@ -0,0 +1,59 @@
+from django.db import connection, transaction
+from django.db.models import Count
+
+from jobs.consts import JOB_ROLES
+from jobs.models import Job, JobCounter
+
+
+def count_jobs():
+    """
+    Count the jobs from scratch, the way the counters should count them.
+
+    :return: a dict of `{(user_id, role, status): count}`, without zeros
+    """
+    counts = {}
+    for role in JOB_ROLES:
+        rows = Job.objects.order_by().values_list(f"{role}_id", "status").annotate(Count("pk"))
+        for user_id, status, count in rows:
+            counts[(user_id, role, status)] = count
+    return counts
+
+
+def find_counters_drift():
+    """
+    Compare the stored counters with the jobs.
+
+    :return: a sorted list of `(user_id, role, status, stored, expected)` of the wrong counters
+    """
+    expected = count_jobs()
+    stored = {
+        (user_id, role, status): count
+        for user_id, role, status, count in JobCounter.objects.values_list(
+            "user_id", "role", "status", "count"
+        )
+    }
+    return sorted(
+        (*key, stored.get(key, 0), expected.get(key, 0))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, 0) != expected.get(key, 0)
+    )
+
+
+def rebuild_counters():
+    """
+    Replace all the counters with the ones counted from scratch.
+
+    The jobs table is locked against writes for the time of the rebuild, so no change
+    of a job is lost between counting the jobs and storing the counters.
+
+    :return: the number of the stored counters
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE jobs_job IN SHARE MODE")
+        JobCounter.objects.all().delete()
+        counters = JobCounter.objects.bulk_create(
+            JobCounter(user_id=user_id, role=role, status=status, count=count)
+            for (user_id, role, status), count in count_jobs().items()
+        )
+    return len(counters)
@@ -0,0 +1,187 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Greatest
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import content_disposition_header
+from django.utils.timezone import now
+
+from jobs.consts import JOBS_DOWNLOADS_BUFFER_TIMEOUT
+from jobs.models import JobFile
+
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+SENDFILE_X_ACCEL_REDIRECT = "x-accel-redirect"
+SENDFILE_X_SENDFILE = "x-sendfile"
+
+DOWNLOADS_SEQUENCE_KEY = "job-file-downloads:sequence"
+DOWNLOADS_FLUSHED_KEY = "job-file-downloads:flushed"
+DOWNLOADS_SEEN_KEY = "job-file-downloads:seen"
+
+
+class RangeFile:
+    """
+    A file-like object reading only the given number of bytes from the current position.
+
+    It has no `seek` and `tell`, so `FileResponse` does not compute its length
+    from the whole file.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the first and the last byte of a single `Range: bytes=...` or None for the whole file.
+
+    :param header: the `Range` header
+    :param int size: the size of the file
+    :return: a tuple of `(start, end)`, the end is inclusive
+    :raise ValueError: if the range cannot be satisfied
+    """
+    match = RANGE_RE.match(header or "")
+    if not match or match.group("start", "end") == ("", ""):
+        # A missing, malformed or multipart range is answered with the whole file
+        return None
+    start, end = match.group("start", "end")
+    if not start:
+        # The last `end` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Range not satisfiable: {header}")
+    return start, end
+
+
+def serve_file(request, file_field, filename, as_attachment=True):
+    """
+    Send the stored file as an attachment or to be shown inline.
+
+    With `JOBS_FILES_SENDFILE` set, the view only sends the headers and the front web server
+    transfers the file: `x-accel-redirect` for nginx (the files are under the internal
+    `JOBS_FILES_SENDFILE_PREFIX` location) or `x-sendfile` for Apache and lighttpd.
+    Otherwise the file is streamed by Django, with the support of a single byte range,
+    so the interrupted downloads can be resumed.
+
+    :param request: the request object
+    :param file_field: the `FieldFile` to send
+    :param str filename: the name of the downloaded file
+    :param bool as_attachment: whether the file is downloaded or shown in the browser
+    :return: the response
+    """
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    disposition = content_disposition_header(as_attachment=as_attachment, filename=filename)
+    backend = getattr(settings, "JOBS_FILES_SENDFILE", None)
+    if backend:
+        response = HttpResponse(content_type=content_type)
+        response["Content-Disposition"] = disposition
+        if backend == SENDFILE_X_ACCEL_REDIRECT:
+            prefix = settings.JOBS_FILES_SENDFILE_PREFIX
+            response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(file_field.name)
+        else:
+            response["X-Sendfile"] = file_field.path
+        return response
+
+    path = file_field.path
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError as error:
+        raise Http404(filename) from error
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(
+            RangeFile(file, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Disposition"] = disposition
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _entry_key(number):
+    return f"job-file-downloads:{number}"
+
+
+def record_download(job_file_pk, when=None):
+    """
+    Buffer the time of a download in the cache, instead of writing it to the job file.
+
+    The entries are numbered with a counter, so `flush_downloads` reads them without
+    scanning the cache.
+    """
+    cache.add(DOWNLOADS_SEQUENCE_KEY, 0, timeout=None)
+    number = cache.incr(DOWNLOADS_SEQUENCE_KEY)
+    cache.set(_entry_key(number), (job_file_pk, when or now()), JOBS_DOWNLOADS_BUFFER_TIMEOUT)
+
+
+def flush_downloads():
+    """
+    Write the buffered downloads to `last_download` of the job files, in a single query.
+
+    An entry may be numbered, but not stored yet, by a download running at the same time.
+    Such an entry waits for the next flush. If it is still missing then, it was lost.
+
+    :return: the number of the updated job files
+    """
+    sequence = cache.get(DOWNLOADS_SEQUENCE_KEY, 0)
+    flushed = cache.get(DOWNLOADS_FLUSHED_KEY, 0)
+    seen = cache.get(DOWNLOADS_SEEN_KEY, 0)
+    keys = [_entry_key(number) for number in range(flushed + 1, sequence + 1)]
+    entries = cache.get_many(keys)
+
+    latest = {}
+    for index, key in enumerate(keys):
+        if key not in entries:
+            if flushed + index + 1 > seen:
+                keys = keys[:index]
+                break
+            continue
+        job_file_pk, when = entries[key]
+        latest[job_file_pk] = max(when, latest.get(job_file_pk, when))
+
+    updated = 0
+    if latest:
+        # The time only moves forward, GREATEST skips the NULL of a never downloaded file
+        updated = JobFile.objects.filter(pk__in=latest).update(
+            last_download=Greatest(
+                "last_download",
+                Case(
+                    *[When(pk=pk, then=Value(when)) for pk, when in latest.items()],
+                    output_field=DateTimeField(),
+                ),
+            )
+        )
+    cache.set_many(
+        {DOWNLOADS_FLUSHED_KEY: flushed + len(keys), DOWNLOADS_SEEN_KEY: sequence}, timeout=None
+    )
+    cache.delete_many(keys)
+    return updated
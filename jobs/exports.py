@@ -0,0 +1,200 @@
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from itertools import chain, islice
+from xml.sax.saxutils import escape
+
+from django.template.defaultfilters import capfirst, date, yesno
+from django.utils.timezone import localtime
+
+from jobs.consts import JOBS_EXPORT_CHUNK_SIZE, JOBS_EXPORT_HEADER
+from jobs.templatetags.job_filters import km
+
+# Spreadsheets run a cell starting with one of these as a formula
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# Control characters are not allowed in XML 1.0
+XML_ILLEGAL_CHARACTERS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_SHEET = "xl/worksheets/sheet1.xml"
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'<Override PartName="/{XLSX_SHEET}" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/'
+        '2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Jobs" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/'
+        '2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = "</sheetData></worksheet>"
+
+
+class Echo:
+    """
+    An object that implements just the write method of the file-like interface,
+    so the `csv.writer` returns the rows instead of writing them.
+    """
+
+    def write(self, value):
+        return value
+
+
+class StreamBuffer:
+    """
+    A write-only file-like object, which keeps the written bytes until they are drained.
+
+    It cannot seek, so a `zipfile.ZipFile` writing to it puts the sizes of the files
+    after their data and the archive can be sent while it is being written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def job_export_row(job):
+    """
+    Return the cells of a job, formatted like in the jobs list.
+
+    :param job: a job fetched with `JobQuerySet.with_related`
+    :return: a list of the cells
+    """
+    return [
+        job.pk,
+        job.principal.get_full_name(),
+        job.contractor.get_full_name(),
+        capfirst(job.get_status_display()),
+        capfirst(job.get_kind_display()),
+        job.description,
+        date(job.deadline, "d.m.Y"),
+        km(job.km_from),
+        km(job.km_to) if job.km_to else "-",
+        str(job.trade),
+        job.comments,
+        date(localtime(job.created), "d.m.Y H:i"),
+        capfirst(yesno(job.has_attachments)),
+    ]
+
+
+def job_export_rows(jobs):
+    """
+    Yield the cells of the jobs, read from the database in chunks.
+    """
+    for job in jobs.iterator(chunk_size=JOBS_EXPORT_CHUNK_SIZE):
+        yield job_export_row(job)
+
+
+def _batched(rows):
+    rows = iter(rows)
+    while batch := list(islice(rows, JOBS_EXPORT_CHUNK_SIZE)):
+        yield batch
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and len(value) > 1 and value.startswith(CSV_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def stream_csv(rows, header=JOBS_EXPORT_HEADER):
+    """
+    Yield a CSV file in chunks of rows.
+
+    The file starts with the byte order mark, so spreadsheets read it as UTF-8.
+
+    :param rows: an iterable of lists of cells
+    :param header: the first row
+    """
+    writer = csv.writer(Echo(), dialect="excel")
+    yield "\ufeff" + writer.writerow(header)
+    for batch in _batched(rows):
+        yield "".join(writer.writerow([_csv_cell(value) for value in row]) for row in batch)
+
+
+def _xlsx_column(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number, row):
+    cells = []
+    for index, value in enumerate(row):
+        reference = f"{_xlsx_column(index)}{number}"
+        if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+            cells.append(f'<c r="{reference}"><v>{value}</v></c>')
+        else:
+            text = escape(XML_ILLEGAL_CHARACTERS_RE.sub("", str(value)))
+            cells.append(
+                f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+            )
+    return f'<row r="{number}">{"".join(cells)}</row>'.encode()
+
+
+def stream_xlsx(rows, header=JOBS_EXPORT_HEADER):
+    """
+    Yield an XLSX file with a single sheet in chunks of rows.
+
+    The texts are written inline (without the shared strings table), so nothing has to be
+    kept in the memory until the end of the sheet.
+
+    :param rows: an iterable of lists of cells
+    :param header: the first row
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open(XLSX_SHEET, mode="w", force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            for number, row in enumerate(chain([header], rows), start=1):
+                sheet.write(_xlsx_row(number, row))
+                if number % JOBS_EXPORT_CHUNK_SIZE == 0:
+                    yield buffer.drain()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.drain()
@@ -4,15 +4,30 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Div, Field, Layout
 from django import forms
 from django.db.models import Case, Value, When
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-from jobs.consts import DEADLINE_FORM_ERROR, KM_HELP_TEXT
-from jobs.models import Job, JobFile
+from jobs.consts import (
+    DEADLINE_FORM_ERROR,
+    JobKinds,
+    JobStatuses,
+    KM_FORMAT_ERROR,
+    KM_HELP_TEXT,
+    RANGE_FORM_ERROR,
+)
+from jobs.helpers import parse_km
+from jobs.models import Job, JobFile, JOBS_CONCLUDED_STATUSES
+from trades.models import Trade
 from users.models import SURVEYOR, User
 
 
+def user_choice_label(user):
+    return f"{user.last_name} {user.first_name} [{user.get_role_display()}]"
+
+
 class JobModelChoiceField(forms.ModelChoiceField):
     def label_from_instance(self, obj):
-        return f"{obj.last_name} {obj.first_name} [{obj.get_role_display()}]"
+        return user_choice_label(obj)
 
 
 class JobCreateForm(forms.ModelForm):
@@ -144,3 +159,123 @@ class JobFileForm(forms.ModelForm):
         widgets = {
             "file": forms.TextInput(attrs={"type": "File", "multiple": True}),
         }
+
+
+class KmField(forms.CharField):
+    """
+    A chainage written as `123+400` or `123.400`, cleaned to kilometres.
+    """
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return None
+        try:
+            return parse_km(value)
+        except ValueError as error:
+            raise forms.ValidationError(KM_FORMAT_ERROR) from error
+
+
+class JobFilterForm(forms.Form):
+    """
+    The filters of the jobs list. Every filled in field narrows down the jobs.
+    """
+
+    status = forms.ChoiceField(choices=[("", "any")] + JobStatuses.choices, required=False)
+    open_only = forms.BooleanField(label="Only open jobs", required=False)
+    kind = forms.ChoiceField(choices=[("", "any")] + JobKinds.choices, required=False)
+    trade = forms.ModelChoiceField(queryset=Trade.objects.order_by("name"), required=False)
+    principal = forms.TypedChoiceField(coerce=int, empty_value=None, required=False)
+    contractor = forms.TypedChoiceField(coerce=int, empty_value=None, required=False)
+    deadline_from = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    deadline_to = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    created_from = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    created_to = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    km_from = KmField(label="Chainage from", required=False)
+    km_to = KmField(label="Chainage to", required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The users are queried once for both the principal and the contractor and only
+        # if they are needed - to render the form or to validate a chosen user
+        self.fields["principal"].choices = self.fields["contractor"].choices = (
+            lambda: self.user_choices
+        )
+
+        self.helper = FormHelper()
+        self.helper.form_tag = False
+        self.helper.disable_csrf = True
+        self.helper.layout = Layout(
+            Div(
+                Field("status", wrapper_class="col-md-2"),
+                Field("kind", wrapper_class="col-md-2"),
+                Field("trade", wrapper_class="col-md-2"),
+                Field("principal", wrapper_class="col-md-3"),
+                Field("contractor", wrapper_class="col-md-3"),
+                css_class="row",
+            ),
+            Div(
+                Field("deadline_from", wrapper_class="col-md-2"),
+                Field("deadline_to", wrapper_class="col-md-2"),
+                Field("created_from", wrapper_class="col-md-2"),
+                Field("created_to", wrapper_class="col-md-2"),
+                Field("km_from", wrapper_class="col-md-2"),
+                Field("km_to", wrapper_class="col-md-2"),
+                css_class="row",
+            ),
+            Field("open_only"),
+        )
+
+    @cached_property
+    def user_choices(self):
+        users = User.objects.only("first_name", "last_name", "role").order_by(
+            "last_name", "first_name"
+        )
+        return [("", "any")] + [(user.pk, user_choice_label(user)) for user in users]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in ("deadline", "created", "km"):
+            value_from = cleaned_data.get(f"{field}_from")
+            value_to = cleaned_data.get(f"{field}_to")
+            if value_from is not None and value_to is not None and value_from > value_to:
+                self.add_error(f"{field}_to", RANGE_FORM_ERROR)
+        return cleaned_data
+
+    @staticmethod
+    def _start_of_day(date):
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+    def filter(self, queryset):
+        """
+        Narrow down the queryset by the filled in fields of a valid form.
+
+        The lookups compare the columns themselves (never a function of a column),
+        so the indexes on `jobs_job` can be used. The chainage range selects the jobs
+        which touch it.
+
+        :param queryset: a queryset of jobs
+        :return: the filtered queryset
+        """
+        data = self.cleaned_data
+        lookups = {field: data[field] for field in ("status", "kind", "trade") if data.get(field)}
+        for field in ("principal", "contractor"):
+            if data.get(field):
+                lookups[f"{field}_id"] = data[field]
+        if data.get("deadline_from"):
+            lookups["deadline__gte"] = data["deadline_from"]
+        if data.get("deadline_to"):
+            lookups["deadline__lte"] = data["deadline_to"]
+        if data.get("created_from"):
+            lookups["created__gte"] = self._start_of_day(data["created_from"])
+        if data.get("created_to"):
+            lookups["created__lt"] = self._start_of_day(
+                data["created_to"] + datetime.timedelta(days=1)
+            )
+
+        queryset = queryset.filter(**lookups)
+        if data.get("open_only"):
+            queryset = queryset.exclude(status__in=JOBS_CONCLUDED_STATUSES)
+        if data.get("km_from") is not None or data.get("km_to") is not None:
+            queryset = queryset.overlapping_chainage(data.get("km_from"), data.get("km_to"))
+        return queryset
@@ -0,0 +1,133 @@
+import hashlib
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from jobs.consts import JOBS_FRAGMENT_CACHE_TIMEOUT, JOBS_FRAGMENT_CACHE_VERSION
+from jobs.models import Job
+from trades.models import Trade
+from users.models import User
+
+FRAGMENT_STATS_HITS = "job-fragment-stats:hits"
+FRAGMENT_STATS_MISSES = "job-fragment-stats:misses"
+
+
+def _version_key(model, pk):
+    return f"fragment-version:{model._meta.label_lower}:{pk}"
+
+
+def _bump_version(model, pk):
+    key = _version_key(model, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # A fresh version never repeats an old one, even if the version key has been evicted
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_fragment_version(model, pk):
+    """
+    Change the version of the object, so every fragment which shows it is rendered again.
+
+    The version is changed again, once the transaction is committed, so a fragment rendered
+    by another request before the commit is not kept under the new version.
+    """
+    _bump_version(model, pk)
+    transaction.on_commit(partial(_bump_version, model, pk))
+
+
+def get_fragment_versions(keys):
+    versions = cache.get_many(keys)
+    if missing := [key for key in keys if key not in versions]:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _incr_stats(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, delta)
+
+
+def get_fragment_stats():
+    """
+    Return the number of hits and misses of the job fragments cache.
+    """
+    stats = cache.get_many([FRAGMENT_STATS_HITS, FRAGMENT_STATS_MISSES])
+    return stats.get(FRAGMENT_STATS_HITS, 0), stats.get(FRAGMENT_STATS_MISSES, 0)
+
+
+def reset_fragment_stats():
+    cache.delete_many([FRAGMENT_STATS_HITS, FRAGMENT_STATS_MISSES])
+
+
+def render_job_fragments(jobs, template_name, extra_context=None, use_cache=True):
+    """
+    Render the template for every job, reading the already rendered fragments from the cache.
+
+    A fragment is keyed by the job pk and the versions of the job, its trade, its principal
+    and its contractor, so it is rendered again as soon as any of them changes.
+
+    :param jobs: an iterable of jobs with the related objects already fetched
+    :param str template_name: a template rendered with the `job` in the context
+    :param dict extra_context: an additional context, which is also a part of the key
+    :param bool use_cache: whether to use the cache, e.g. not for the one-off search results
+    :return: a list of the rendered fragments in the order of the jobs
+    """
+    jobs = list(jobs)
+    extra_context = extra_context or {}
+    if not use_cache:
+        return [
+            mark_safe(render_to_string(template_name, {"job": job, **extra_context}))
+            for job in jobs
+        ]
+
+    context_key = ",".join(f"{name}={value}" for name, value in sorted(extra_context.items()))
+    prefix = hashlib.md5(
+        f"{JOBS_FRAGMENT_CACHE_VERSION}:{template_name}:{context_key}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+
+    job_version_keys = {
+        job.pk: (
+            _version_key(Job, job.pk),
+            _version_key(Trade, job.trade_id),
+            _version_key(User, job.principal_id),
+            _version_key(User, job.contractor_id),
+        )
+        for job in jobs
+    }
+    versions = get_fragment_versions(
+        list({key for keys in job_version_keys.values() for key in keys})
+    )
+    fragment_keys = {
+        job_pk: f"job-fragment:{prefix}:{job_pk}:" + ".".join(str(versions[key]) for key in keys)
+        for job_pk, keys in job_version_keys.items()
+    }
+
+    cached_fragments = cache.get_many(list(fragment_keys.values()))
+    new_fragments = {}
+    fragments = []
+    for job in jobs:
+        key = fragment_keys[job.pk]
+        fragment = cached_fragments.get(key)
+        if fragment is None:
+            fragment = render_to_string(template_name, {"job": job, **extra_context})
+            new_fragments[key] = fragment
+        fragments.append(mark_safe(fragment))
+
+    if new_fragments:
+        cache.set_many(new_fragments, timeout=JOBS_FRAGMENT_CACHE_TIMEOUT)
+    _incr_stats(FRAGMENT_STATS_HITS, len(jobs) - len(new_fragments))
+    _incr_stats(FRAGMENT_STATS_MISSES, len(new_fragments))
+    return fragments
@@ -0,0 +1,40 @@
+import re
+from decimal import Decimal
+
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from jobs.consts import JOBS_SEARCH_HIGHLIGHT_START, JOBS_SEARCH_HIGHLIGHT_STOP, KM_FORMAT_ERROR
+
+KM_PLUS_METRES_RE = re.compile(r"(?P<kilometres>\d+)\+(?P<metres>\d{1,3}(\.\d+)?)")
+KM_DECIMAL_RE = re.compile(r"\d+(\.\d+)?")
+
+
+def highlight(headline):
+    """
+    Escape the search headline and mark the found words with the `<mark>` tag.
+
+    :param str headline: a headline annotated by `JobQuerySet.search`
+    :return: a safe HTML string
+    """
+    return mark_safe(
+        escape(headline)
+        .replace(JOBS_SEARCH_HIGHLIGHT_START, "<mark>")
+        .replace(JOBS_SEARCH_HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+def parse_km(value):
+    """
+    Parse a chainage written as `123+400` (kilometres + metres) or as `123.400` / `123,400`.
+
+    :param str value: a chainage
+    :return: the chainage in kilometres
+    :raises ValueError: if the value is not a chainage
+    """
+    value = value.strip().replace(",", ".")
+    if match := KM_PLUS_METRES_RE.fullmatch(value):
+        return Decimal(match["kilometres"]) + Decimal(match["metres"]) / 1000
+    if KM_DECIMAL_RE.fullmatch(value):
+        return Decimal(value)
+    raise ValueError(KM_FORMAT_ERROR)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.counters import find_counters_drift, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-user job counters from scratch or checks them for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the counters with the jobs and fail if any of them is wrong.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            count = rebuild_counters()
+            self.stdout.write(self.style.SUCCESS(f"The counters have been rebuilt ({count})!"))
+            return
+
+        drift = find_counters_drift()
+        for user_id, role, status, stored, expected in drift:
+            self.stdout.write(
+                f"User {user_id} as a {role}, {status}: {stored} stored, {expected} expected"
+            )
+        if drift:
+            raise CommandError(
+                f"{len(drift)} counters have drifted, run the command without --check"
+            )
+        self.stdout.write(self.style.SUCCESS("The counters are correct!"))
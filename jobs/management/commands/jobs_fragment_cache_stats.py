@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from jobs.fragments import get_fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = "Shows the hit rate of the cached job rows and cards."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters after showing them."
+        )
+
+    def handle(self, *args, **options):
+        hits, misses = get_fragment_stats()
+        total = hits + misses
+        hit_rate = hits / total * 100 if total else 0
+        self.stdout.write(f"Hits: {hits}, misses: {misses}, hit rate: {hit_rate:.1f}%")
+
+        if options["reset"]:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS("The counters have been reset!"))
@@ -48,14 +48,13 @@ class Command(BaseCommand):
                 year=last_month.year, month=last_month.strftime("%B")
             ),
             attachments=[csv_file],
+            idempotency_key=f"jobs-monthly-status:{last_month:%Y-%m}",
         )
 
     def handle(self, *args, **options):
         data = (
             Job.objects.annotate(
-                has_attachments=Exists(
-                    JobFile.objects.filter(content_type__model="job", object_id=OuterRef("pk"))
-                ),
+                has_attachments=Exists(JobFile.objects.filter(job=OuterRef("pk"))),
                 date_formatted=Func(
                     F("created"), Value("DD.MM.YYYY"), function="to_char", output_field=CharField()
                 ),
@@ -0,0 +1,92 @@
+import datetime
+import statistics
+import time
+from random import choice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from faker import Faker
+
+from jobs.consts import JobKinds, JOBS_SEARCH_API_LIMIT
+from jobs.models import Job
+from trades.models import Trade
+from users.models import User
+
+fake = Faker(["pl_PL", "en_US"])
+BATCH_SIZE = 10_000
+
+
+class Command(BaseCommand):
+    help = "Compares the full-text search of the jobs with the `icontains` scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("query", help="The searched text.")
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="How many times each query is run."
+        )
+        parser.add_argument(
+            "--create",
+            type=int,
+            default=0,
+            help="Create that many random jobs for the benchmark. They are rolled back at the end.",
+        )
+
+    def create_jobs(self, number):
+        principal = User.objects.order_by("pk").first()
+        trade = Trade.objects.order_by("pk").first()
+        if not principal or not trade:
+            raise CommandError("At least one user and one trade are needed to create the jobs.")
+
+        sentences = [fake.sentence(nb_words=12) for _ in range(2_000)]
+        deadline = datetime.date.today()
+        for start in range(0, number, BATCH_SIZE):
+            Job.objects.bulk_create(
+                Job(
+                    principal=principal,
+                    contractor=principal,
+                    trade=trade,
+                    kind=JobKinds.STAKING,
+                    description=" ".join(choice(sentences) for _ in range(6)),
+                    comments=choice(sentences),
+                    deadline=deadline,
+                )
+                for _ in range(min(BATCH_SIZE, number - start))
+            )
+            self.stdout.write(f"Created {min(start + BATCH_SIZE, number)}/{number} jobs")
+
+    def measure(self, name, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = len(query())
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"{name}: found {found}, median {statistics.median(timings):.2f} ms, "
+            f"max {max(timings):.2f} ms"
+        )
+
+    def handle(self, *args, **options):
+        text = options["query"]
+
+        def icontains_scan():
+            return list(
+                Job.objects.filter(Q(description__icontains=text) | Q(comments__icontains=text))
+                .order_by("-pk")
+                .values_list("pk", flat=True)[:JOBS_SEARCH_API_LIMIT]
+            )
+
+        def full_text_search():
+            return list(
+                Job.objects.search(text)
+                .order_by("-rank", "-pk")
+                .values_list("pk", flat=True)[:JOBS_SEARCH_API_LIMIT]
+            )
+
+        with transaction.atomic():
+            if options["create"]:
+                self.create_jobs(options["create"])
+            self.stdout.write(f"Jobs in the database: {Job.objects.count()}")
+            self.measure("icontains scan", icontains_scan, options["repeat"])
+            self.measure("full-text search", full_text_search, options["repeat"])
+            transaction.set_rollback(True)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from jobs.consts import JOBS_THUMBNAIL_BATCH_SIZE, JOBS_THUMBNAIL_WORKERS
+from jobs.tasks import jobs_make_thumbnails
+from jobs.thumbnails import make_thumbnails, pending_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Makes the missing thumbnails of the image job files, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=JOBS_THUMBNAIL_BATCH_SIZE,
+            help="The number of the job files in a batch.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=JOBS_THUMBNAIL_WORKERS,
+            help="The number of the images of a batch rendered in parallel with --sync.",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Make the thumbnails here instead of sending the batches to the workers.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        job_file_pks = list(pending_thumbnails().values_list("pk", flat=True))
+        batches = [
+            job_file_pks[start : start + batch_size]
+            for start in range(0, len(job_file_pks), batch_size)
+        ]
+        if not options["sync"]:
+            for batch in batches:
+                jobs_make_thumbnails.delay(batch)
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(batches)} batches of thumbnails have been queued!")
+            )
+            return
+
+        count = sum(make_thumbnails(batch, workers=options["workers"]) for batch in batches)
+        self.stdout.write(self.style.SUCCESS(f"{count} thumbnails have been made!"))
@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+from functools import partial
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from jobs.consts import JobKinds, JobStatuses
+from jobs.models import Job
+from trades.models import Trade
+from users.const import NotificationDeliveries
+from users.helpers import wait_for_dispatches
+from users.management.commands.users_email_benchmark import SMTPSink
+from users.models import EmailOutbox, User
+from users.outbox import dispatch_outbox, rate_limit_key
+
+MODES = (
+    ("In the request", {"SEND_EMAIL_CELERY": False, "EMAIL_DISPATCH_WORKERS": 0}),
+    ("Local worker pool", {"SEND_EMAIL_CELERY": False}),
+    ("Celery, with the task stubbed", {"SEND_EMAIL_CELERY": True}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the response time of the job page POST, which changes the status and "
+        "the contractor, when the e-mails are sent in the request, by the local worker pool "
+        "and by Celery, against a local SMTP server. Only the e-mails of the benchmark are "
+        "sent, the Celery task is stubbed instead of sent to the broker. The created job, "
+        "users and e-mails are removed at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=10,
+            help="The number of the requests in each mode, each sends two e-mails.",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=200,
+            help="The delay of the server greeting in ms, like the handshakes of a remote server.",
+        )
+
+    def create_job(self):
+        users = [
+            User.objects.create_user(
+                email=f"benchmark-{index}-{time.time_ns()}@example.com",
+                first_name="Benchmark",
+                last_name=str(index),
+                is_active=True,
+                notification_delivery=NotificationDeliveries.IMMEDIATE,
+            )
+            for index in range(3)
+        ]
+        trade = Trade.objects.order_by("pk").first()
+        job = Job.objects.create(
+            principal=users[0],
+            contractor=users[1],
+            trade=trade,
+            kind=JobKinds.STAKING,
+            description="Benchmark",
+            deadline=time.strftime("%Y-%m-%d"),
+        )
+        return job, users
+
+    def measure(self, name, client, job, users, number, sink, dispatch):
+        url = reverse("jobs-job", kwargs={"job_pk": job.pk})
+        statuses = [JobStatuses.ACCEPTED, JobStatuses.ONGOING]
+        sink.received = 0
+        timings = []
+        for index in range(number):
+            data = {
+                "contractor": users[1 + (index + 1) % 2].pk,
+                "status": statuses[index % 2],
+                "comments": f"Benchmark {index}",
+            }
+            start = time.perf_counter()
+            client.post(url, data=data)
+            timings.append((time.perf_counter() - start) * 1000)
+        wait_for_dispatches()
+        # The e-mails left to the stubbed Celery task are sent like its worker would
+        dispatch()
+        self.stdout.write(
+            f"{name}: median {statistics.median(timings):.1f} ms, "
+            f"max {max(timings):.1f} ms, {sink.received}/{number * 2} e-mails sent"
+        )
+
+    def handle(self, *args, **options):
+        if not Trade.objects.exists():
+            self.stderr.write("At least one trade is needed to create the job.")
+            return
+
+        sink = SMTPSink(options["latency"] / 1000)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        host, port = sink.server_address
+        job, users = self.create_job()
+        client = Client()
+        client.force_login(users[0])
+        # The outbox may hold the e-mails of the real users, they are left for their dispatch
+        dispatch = partial(dispatch_outbox, recipients=[user.email for user in users])
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=["testserver"],
+                EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                EMAIL_HOST=host,
+                EMAIL_PORT=port,
+                EMAIL_USE_SSL=False,
+                EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER="",
+                EMAIL_HOST_PASSWORD="",
+            ), mock.patch("users.helpers.dispatch_outbox", dispatch), mock.patch(
+                "users.helpers.users_dispatch_email_outbox"
+            ):
+                for name, mode_settings in MODES:
+                    # Every mode starts with the whole rate limit of the outbox
+                    cache.delete(rate_limit_key())
+                    with override_settings(**mode_settings):
+                        self.measure(name, client, job, users, options["requests"], sink, dispatch)
+        finally:
+            sink.shutdown()
+            sink.server_close()
+            EmailOutbox.objects.filter(recipient__in=[user.email for user in users]).delete()
+            job.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
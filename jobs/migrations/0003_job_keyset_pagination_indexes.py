@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0002_add_file_to_the_job"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["description", "id"], name="jobs_job_description_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["deadline", "id"], name="jobs_job_deadline_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["created", "id"], name="jobs_job_created_id_idx"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:49
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# PostgreSQL has no built-in Polish stemmer. Without a `polish` configuration (e.g. one using
+# the `polish_ispell` dictionary), a copy of the `simple` configuration is created instead,
+# which can be altered later without touching the trigger.
+CREATE_POLISH_CONFIGURATION = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'polish') THEN
+        CREATE TEXT SEARCH CONFIGURATION polish (COPY = simple);
+    END IF;
+END
+$$;
+"""
+
+CREATE_SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION jobs_job_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('polish', coalesce(NEW.description, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'A') ||
+        setweight(to_tsvector('polish', coalesce(NEW.comments, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.comments, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER jobs_job_search_vector_update
+    BEFORE INSERT OR UPDATE OF description, comments ON jobs_job
+    FOR EACH ROW EXECUTE FUNCTION jobs_job_search_vector_update();
+
+UPDATE jobs_job SET description = description;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS jobs_job_search_vector_update ON jobs_job;
+DROP FUNCTION IF EXISTS jobs_job_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0003_job_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_POLISH_CONFIGURATION, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_SEARCH_VECTOR_TRIGGER, reverse_sql=DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.AddIndex(
+            model_name="job",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="jobs_job_search_vector_idx"
+            ),
+        ),
+    ]
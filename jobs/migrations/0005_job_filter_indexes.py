@@ -0,0 +1,43 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0004_job_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["status", "created", "id"], name="jobs_job_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["status", "deadline", "id"], name="jobs_job_status_deadline_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["trade", "status"], name="jobs_job_trade_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["kind", "status"], name="jobs_job_kind_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(
+                    ("status__in", ["closed", "finished", "refused"]), _negated=True
+                ),
+                fields=["deadline", "id"],
+                name="jobs_job_open_deadline_idx",
+            ),
+        ),
+    ]
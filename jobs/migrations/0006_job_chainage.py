@@ -0,0 +1,55 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:00
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+# A missing km_to makes the chainage a single point. The ends are sorted, so a job entered
+# "backwards" (km_from > km_to) still gets a valid range.
+CREATE_CHAINAGE_TRIGGER = """
+CREATE OR REPLACE FUNCTION jobs_job_chainage_update() RETURNS trigger AS $$
+BEGIN
+    NEW.chainage := numrange(
+        LEAST(NEW.km_from, coalesce(NEW.km_to, NEW.km_from)),
+        GREATEST(NEW.km_from, coalesce(NEW.km_to, NEW.km_from)),
+        '[]'
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER jobs_job_chainage_update
+    BEFORE INSERT OR UPDATE OF km_from, km_to ON jobs_job
+    FOR EACH ROW EXECUTE FUNCTION jobs_job_chainage_update();
+
+UPDATE jobs_job SET km_from = km_from;
+"""
+
+DROP_CHAINAGE_TRIGGER = """
+DROP TRIGGER IF EXISTS jobs_job_chainage_update ON jobs_job;
+DROP FUNCTION IF EXISTS jobs_job_chainage_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0005_job_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="chainage",
+            field=django.contrib.postgres.fields.ranges.DecimalRangeField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(CREATE_CHAINAGE_TRIGGER, reverse_sql=DROP_CHAINAGE_TRIGGER),
+        migrations.AddIndex(
+            model_name="job",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["chainage"], name="jobs_job_chainage_idx"
+            ),
+        ),
+    ]
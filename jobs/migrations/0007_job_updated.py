@@ -0,0 +1,22 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0006_job_chainage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="updated",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        # The existing jobs have not been changed since their creation as far as we know
+        migrations.RunSQL(
+            "UPDATE jobs_job SET updated = created", reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The counters move only when the status or one of the users of a job changes, so saving
+# the other fields of a job does not lock the counter rows.
+CREATE_COUNTERS_TRIGGER = """
+CREATE OR REPLACE FUNCTION jobs_job_counters_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE jobs_jobcounter SET count = count - 1
+        WHERE (user_id, role, status) IN (
+            (OLD.principal_id, 'principal', OLD.status),
+            (OLD.contractor_id, 'contractor', OLD.status)
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO jobs_jobcounter (user_id, role, status, count)
+        VALUES (NEW.principal_id, 'principal', NEW.status, 1),
+               (NEW.contractor_id, 'contractor', NEW.status, 1)
+        ON CONFLICT (user_id, role, status) DO UPDATE SET count = jobs_jobcounter.count + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER jobs_job_counters_update
+    AFTER INSERT OR DELETE ON jobs_job
+    FOR EACH ROW EXECUTE FUNCTION jobs_job_counters_update();
+
+CREATE TRIGGER jobs_job_counters_update_change
+    AFTER UPDATE OF status, principal_id, contractor_id ON jobs_job
+    FOR EACH ROW
+    WHEN (
+        OLD.status IS DISTINCT FROM NEW.status
+        OR OLD.principal_id IS DISTINCT FROM NEW.principal_id
+        OR OLD.contractor_id IS DISTINCT FROM NEW.contractor_id
+    )
+    EXECUTE FUNCTION jobs_job_counters_update();
+
+INSERT INTO jobs_jobcounter (user_id, role, status, count)
+SELECT principal_id, 'principal', status, count(*) FROM jobs_job GROUP BY principal_id, status
+UNION ALL
+SELECT contractor_id, 'contractor', status, count(*) FROM jobs_job GROUP BY contractor_id, status;
+"""
+
+DROP_COUNTERS_TRIGGER = """
+DROP TRIGGER IF EXISTS jobs_job_counters_update_change ON jobs_job;
+DROP TRIGGER IF EXISTS jobs_job_counters_update ON jobs_job;
+DROP FUNCTION IF EXISTS jobs_job_counters_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("jobs", "0007_job_updated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "role",
+                    models.CharField(
+                        choices=[
+                            ("principal", "principal"),
+                            ("contractor", "contractor"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("waiting", "waiting"),
+                            ("accepted", "accepted"),
+                            ("refused", "refused"),
+                            ("making_documents", "making documents"),
+                            ("ready_to_stake_out", "ready to stake out"),
+                            ("data_passed", "data passed"),
+                            ("ongoing", "ongoing"),
+                            ("finished", "finished"),
+                            ("closed", "closed"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="job_counters",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="jobcounter",
+            constraint=models.UniqueConstraint(
+                fields=("user", "role", "status"),
+                name="jobs_jobcounter_user_role_status_uniq",
+            ),
+        ),
+        migrations.RunSQL(CREATE_COUNTERS_TRIGGER, reverse_sql=DROP_COUNTERS_TRIGGER),
+    ]
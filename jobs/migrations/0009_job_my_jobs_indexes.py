@@ -0,0 +1,27 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0008_job_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["principal", "status", "-id"],
+                name="jobs_job_principal_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["contractor", "status", "-id"],
+                name="jobs_job_contractor_status_idx",
+            ),
+        ),
+    ]
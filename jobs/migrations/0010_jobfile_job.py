@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0009_job_my_jobs_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobfile",
+            name="job",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="attachments",
+                to="jobs.job",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_jobfile_job(apps, schema_editor):
+    """
+    Copy the generic relation of the job files to the `job` foreign key.
+
+    The rows are updated in chunks of ids, each in its own transaction, so the table
+    is not locked for the whole backfill and an interrupted run can be started again.
+    The files of the jobs, which do not exist anymore, are left without a job.
+    """
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    JobFile = apps.get_model("jobs", "JobFile")
+    Job = apps.get_model("jobs", "Job")
+
+    job_content_type = ContentType.objects.filter(app_label="jobs", model="job").first()
+    if job_content_type is None:
+        return
+
+    pending = JobFile.objects.filter(content_type=job_content_type, job__isnull=True)
+    last_pk = 0
+    while True:
+        chunk_pks = list(
+            pending.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BACKFILL_CHUNK_SIZE]
+        )
+        if not chunk_pks:
+            break
+        pending.filter(
+            pk__gte=chunk_pks[0],
+            pk__lte=chunk_pks[-1],
+            object_id__in=Job.objects.values("pk"),
+        ).update(job_id=models.F("object_id"))
+        last_pk = chunk_pks[-1]
+
+
+class Migration(migrations.Migration):
+    # Every chunk of the backfill is committed separately
+    atomic = False
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("jobs", "0010_jobfile_job"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_jobfile_job, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0012_jobfileupload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileBlob",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("size", models.PositiveBigIntegerField()),
+                ("references", models.IntegerField(default=0)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="jobfile",
+            name="name",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="jobfile",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="job_files",
+                to="jobs.fileblob",
+            ),
+        ),
+    ]
@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models, transaction
+
+BACKFILL_CHUNK_SIZE = 500
+# The layout of the blobs when the migration was written, it does not follow later changes
+BLOBS_DIRECTORY = "blobs"
+READ_SIZE = 8 * 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while piece := file.read(READ_SIZE):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def blob_name(sha256):
+    return os.path.join(BLOBS_DIRECTORY, sha256[:2], sha256[2:4], sha256)
+
+
+def move_to_blob(storage, path, sha256):
+    """
+    Move the file to its blob or remove it, if the blob is stored already.
+    """
+    target = storage.path(blob_name(sha256))
+    if os.path.exists(target):
+        os.utime(target)
+        os.remove(path)
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if storage.file_permissions_mode is not None:
+        os.chmod(path, storage.file_permissions_mode)
+    os.replace(path, target)
+
+
+def backfill_jobfile_blob(apps, schema_editor):
+    """
+    Move the stored job files to their blobs, so the copies of the same content are stored once.
+
+    Every file is moved in its own transaction, so an interrupted run can be started again.
+    The job files, whose file is missing, are left as they are.
+    """
+    FileBlob = apps.get_model("jobs", "FileBlob")
+    JobFile = apps.get_model("jobs", "JobFile")
+    storage = FileSystemStorage()
+
+    pending = JobFile.objects.filter(blob__isnull=True).exclude(file="")
+    last_pk = 0
+    while True:
+        chunk = list(pending.filter(pk__gt=last_pk).order_by("pk")[:BACKFILL_CHUNK_SIZE])
+        if not chunk:
+            break
+        for job_file in chunk:
+            path = storage.path(job_file.file.name)
+            if not os.path.isfile(path):
+                continue
+            sha256 = file_sha256(path)
+            with transaction.atomic():
+                blob, _ = FileBlob.objects.get_or_create(
+                    sha256=sha256, defaults={"size": os.path.getsize(path)}
+                )
+                FileBlob.objects.filter(pk=sha256).update(references=models.F("references") + 1)
+                job_file.blob = blob
+                job_file.name = os.path.basename(job_file.file.name)
+                job_file.file = blob_name(sha256)
+                job_file.save(update_fields=["blob", "name", "file"])
+                move_to_blob(storage, path, sha256)
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Every file of the backfill is committed separately
+    atomic = False
+
+    dependencies = [
+        ("jobs", "0013_file_blobs"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_jobfile_blob, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0014_jobfile_blob_backfill"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobfile",
+            name="thumbnail",
+            field=models.FileField(blank=True, max_length=1024, upload_to=""),
+        ),
+    ]
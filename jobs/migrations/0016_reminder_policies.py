@@ -0,0 +1,99 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+DEFAULT_POLICIES = [
+    {
+        "name": "A week before the deadline",
+        "recipient": "contractor",
+        "offset_days": -7,
+        "message": "Plan your work to finish on time.",
+    },
+    {
+        "name": "Tomorrow is the deadline",
+        "recipient": "contractor",
+        "offset_days": -1,
+        "message": "Remember to finish your work.",
+    },
+    {
+        "name": "The deadline has passed",
+        "recipient": "principal",
+        "offset_days": 1,
+        "repeat_days": 7,
+        "message": "The jobs have not been completed. Contact the Contractor to arrange the details.",
+    },
+]
+
+
+def create_default_policies(apps, schema_editor):
+    """
+    Create the reminder policies, the last one is repeated every week while a job is overdue.
+    """
+    ReminderPolicy = apps.get_model("jobs", "ReminderPolicy")
+    ReminderPolicy.objects.bulk_create(ReminderPolicy(**policy) for policy in DEFAULT_POLICIES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trades", "0001_initial"),
+        ("jobs", "0015_jobfile_thumbnail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderPolicy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name", models.CharField(max_length=128)),
+                (
+                    "recipient",
+                    models.CharField(
+                        choices=[("principal", "principal"), ("contractor", "contractor")],
+                        max_length=16,
+                    ),
+                ),
+                ("offset_days", models.SmallIntegerField()),
+                ("repeat_days", models.PositiveSmallIntegerField(blank=True, null=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("staking", "staking out"),
+                            ("inventory", "as-built inventory"),
+                            ("other", "other"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("message", models.TextField(blank=True)),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "trade",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trades.trade",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "reminder policies",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="reminderpolicy",
+            constraint=models.CheckConstraint(
+                check=models.Q(("repeat_days__gt", 0)), name="jobs_reminderpolicy_repeat_days_gt_0"
+            ),
+        ),
+        migrations.RunPython(create_default_policies, migrations.RunPython.noop),
+    ]
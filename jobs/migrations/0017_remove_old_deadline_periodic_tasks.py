@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.utils.timezone import now
+
+# The tasks replaced by `jobs_deadline_reminders`, their periodic tasks are kept
+# by the database beat scheduler after they have been removed from the beat schedule
+OLD_TASKS = [
+    "jobs.tasks.jobs_upcoming_deadline_contractor",
+    "jobs.tasks.jobs_overdue_deadline_principal",
+]
+
+
+def remove_old_periodic_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+    if PeriodicTask.objects.filter(task__in=OLD_TASKS).delete()[0]:
+        # The historical models send no signals, the running beat reloads its schedule,
+        # when it sees the time of the last change
+        PeriodicTasks.objects.update_or_create(ident=1, defaults={"last_update": now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+        ("jobs", "0016_reminder_policies"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_old_periodic_tasks, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,14 +1,122 @@
 import os
+import uuid
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import DecimalRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+)
 from django.db import models
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.db.models.functions import Left
 
-from jobs.consts import JobKinds, JobStatuses
+from jobs.consts import (
+    JOB_ROLES,
+    JobKinds,
+    JOBS_PREVIEW_LENGTH,
+    JOBS_SEARCH_CONFIGS,
+    JOBS_SEARCH_HIGHLIGHT_START,
+    JOBS_SEARCH_HIGHLIGHT_STOP,
+    JobStatuses,
+)
 from trades.models import Trade
 from users.models import User
 
 JOBS_CONCLUDED_STATUSES = [JobStatuses.CLOSED, JobStatuses.FINISHED, JobStatuses.REFUSED]
+JOBS_IN_PROGRESS_STATUSES = [
+    JobStatuses.MAKING_DOCUMENTS,
+    JobStatuses.READY_TO_STAKE_OUT,
+    JobStatuses.DATA_PASSED,
+    JobStatuses.ONGOING,
+]
+
+
+class JobQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Fetch the principal, the contractor, the trade and the attachments flag with the jobs.
+        """
+        return self.select_related("principal", "contractor", "trade").annotate(
+            has_attachments=Exists(JobFile.objects.filter(job=OuterRef("pk")))
+        )
+
+    def with_attachments(self):
+        """
+        Prefetch the attachments of the jobs, in one query, as their `attachment_files`.
+        """
+        return self.prefetch_related(get_attachments_prefetch())
+
+    def with_previews(self):
+        """
+        Defer the long texts and fetch only their beginnings, which is enough for the lists.
+        """
+        return self.defer("description", "comments").annotate(
+            description_preview=Left("description", JOBS_PREVIEW_LENGTH + 1),
+            comments_preview=Left("comments", JOBS_PREVIEW_LENGTH + 1),
+        )
+
+    def search(self, text, headlines=True):
+        """
+        Full-text search of the description and the comments, ranked by the relevance.
+        The `*_headline` annotations are snippets with the found words between
+        the `JOBS_SEARCH_HIGHLIGHT_START` and `JOBS_SEARCH_HIGHLIGHT_STOP` markers,
+        as the words are stemmed in the primary search config. They are costly,
+        so they can be skipped with `headlines=False`.
+        """
+        query = get_search_query(text)
+        jobs = self.filter(search_vector=query).annotate(rank=SearchRank(F("search_vector"), query))
+        if not headlines:
+            return jobs
+
+        headline_options = {
+            "config": JOBS_SEARCH_CONFIGS[0],
+            "start_sel": JOBS_SEARCH_HIGHLIGHT_START,
+            "stop_sel": JOBS_SEARCH_HIGHLIGHT_STOP,
+            "max_fragments": 2,
+        }
+        return jobs.annotate(
+            description_headline=SearchHeadline("description", query, **headline_options),
+            comments_headline=SearchHeadline("comments", query, **headline_options),
+        )
+
+    def overlapping_chainage(self, km_from=None, km_to=None):
+        """
+        Jobs whose chainage touches the closed interval [km_from, km_to].
+
+        A missing end leaves the interval open on that side and `km_from == km_to` asks
+        about a single point. The lookup is served by the GiST index on the chainage,
+        which the planner combines with the trade index when the jobs are filtered by trade.
+        """
+        return self.filter(chainage__overlap=NumericRange(km_from, km_to, bounds="[]"))
+
+
+def get_attachments_prefetch():
+    """
+    Return the prefetch of the job attachments, oldest first, into `attachment_files`.
+    It can also be used with `prefetch_related_objects` for a page of jobs.
+    """
+    return Prefetch(
+        "attachments", queryset=JobFile.objects.order_by("pk"), to_attr="attachment_files"
+    )
+
+
+def get_search_query(text):
+    """
+    Return a query which matches the text stemmed in any of the `JOBS_SEARCH_CONFIGS`.
+    """
+    queries = [
+        SearchQuery(text, config=config, search_type="websearch") for config in JOBS_SEARCH_CONFIGS
+    ]
+    query = queries[0]
+    for other_query in queries[1:]:
+        query |= other_query
+    return query
 
 
 class Job(models.Model):
@@ -25,6 +133,15 @@ class Job(models.Model):
         max_length=32, choices=JobStatuses.choices, default=JobStatuses.WAITING
     )
     created = models.DateTimeField(auto_now_add=True)
+    # Also touched when the attachments change, see `jobs.signals`
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+    # Maintained by the `jobs_job_search_vector_update` database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+    # [km_from, km_to] or [km_from, km_from] if there is no km_to,
+    # maintained by the `jobs_job_chainage_update` database trigger
+    chainage = DecimalRangeField(null=True, editable=False)
+
+    objects = JobQuerySet.as_manager()
 
     def __str__(self):
         return f"[{self.trade}] {self.kind}: {self.description}"
@@ -63,11 +180,137 @@ class Job(models.Model):
 
     @property
     def get_job_files(self):
-        return JobFile.objects.filter(content_type__model="job", object_id=self.pk)
+        return self.attachments.all()
 
     @property
     def has_attachments(self):
-        return self.get_job_files.exists()
+        if not hasattr(self, "_has_attachments"):
+            self._has_attachments = self.get_job_files.exists()
+        return self._has_attachments
+
+    @has_attachments.setter
+    def has_attachments(self, value):
+        # Set by the `JobQuerySet.with_related` annotation
+        self._has_attachments = value
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the jobs list seeks on (sort key, pk)
+            models.Index(fields=["description", "id"], name="jobs_job_description_id_idx"),
+            models.Index(fields=["deadline", "id"], name="jobs_job_deadline_id_idx"),
+            models.Index(fields=["created", "id"], name="jobs_job_created_id_idx"),
+            GinIndex(fields=["search_vector"], name="jobs_job_search_vector_idx"),
+            # Filters of the jobs list, the equality columns first
+            models.Index(fields=["status", "created", "id"], name="jobs_job_status_created_idx"),
+            models.Index(fields=["status", "deadline", "id"], name="jobs_job_status_deadline_idx"),
+            models.Index(fields=["trade", "status"], name="jobs_job_trade_status_idx"),
+            models.Index(fields=["kind", "status"], name="jobs_job_kind_status_idx"),
+            models.Index(
+                fields=["deadline", "id"],
+                name="jobs_job_open_deadline_idx",
+                condition=~models.Q(status__in=JOBS_CONCLUDED_STATUSES),
+            ),
+            GistIndex(fields=["chainage"], name="jobs_job_chainage_idx"),
+            # The "my jobs" tabs of a user in a role, newest first
+            models.Index(
+                fields=["principal", "status", "-id"], name="jobs_job_principal_status_idx"
+            ),
+            models.Index(
+                fields=["contractor", "status", "-id"], name="jobs_job_contractor_status_idx"
+            ),
+        ]
+
+
+class JobCounterQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Return the numbers of the user jobs as `{role: {status: count}}`.
+
+        All the roles and statuses are there, the missing counters are zeros.
+        """
+        counts = {role: dict.fromkeys(JobStatuses.values, 0) for role in JOB_ROLES}
+        for role, status, count in self.filter(user=user).values_list("role", "status", "count"):
+            counts[role][status] = count
+        return counts
+
+
+class JobCounter(models.Model):
+    """
+    The number of jobs of a user in a role and a status.
+
+    The counters are maintained by the `jobs_job_counters_update` database triggers,
+    in the same transaction as the change of the job, so they also follow
+    `QuerySet.update` and the cascade deletes. They can be checked and rebuilt
+    with the `jobs_counters` command.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="job_counters")
+    role = models.CharField(max_length=16, choices=[(role, role) for role in JOB_ROLES])
+    status = models.CharField(max_length=32, choices=JobStatuses.choices)
+    # Not a positive integer field - a drifted counter must not block the changes of the jobs
+    count = models.IntegerField(default=0)
+
+    objects = JobCounterQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.user} as a {self.role}, {self.status}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "role", "status"], name="jobs_jobcounter_user_role_status_uniq"
+            ),
+        ]
+
+
+class ReminderPolicy(models.Model):
+    """
+    A window, in which the principals or the contractors of the open jobs are reminded
+    about the deadline, see `send_deadline_reminders`.
+
+    The window is `offset_days` after the deadline, a negative offset is before it.
+    With `repeat_days` the reminder is repeated that often, while the job is not concluded.
+    The policy can be limited to the jobs of a kind or a trade.
+    """
+
+    name = models.CharField(max_length=128)
+    recipient = models.CharField(max_length=16, choices=[(role, role) for role in JOB_ROLES])
+    offset_days = models.SmallIntegerField()
+    repeat_days = models.PositiveSmallIntegerField(blank=True, null=True)
+    kind = models.CharField(max_length=16, choices=JobKinds.choices, blank=True)
+    trade = models.ForeignKey(Trade, on_delete=models.CASCADE, blank=True, null=True)
+    message = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name_plural = "reminder policies"
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(repeat_days__gt=0), name="jobs_reminderpolicy_repeat_days_gt_0"
+            ),
+        ]
+
+
+class FileBlob(models.Model):
+    """
+    A content of the job files, stored once under its SHA-256 by the `ContentAddressedStorage`.
+
+    The `references` count the job files sharing the blob. A blob, which is not referenced
+    anymore, is kept for a grace period and then removed by `collect_orphan_blobs`.
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    # Not a positive integer field - a drifted count must not block the deletes of the job files
+    references = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.sha256} ({self.references})"
 
 
 def job_file_directory(instance, filename):
@@ -104,7 +347,56 @@ class FileBase(models.Model):
 
 class JobFile(FileBase):
     file_name = "jobfiles"
+    # The same job as the generic `content_object`, as a plain foreign key it is indexed,
+    # it can be prefetched and the files are deleted together with their job
+    job = models.ForeignKey(
+        Job, on_delete=models.CASCADE, null=True, blank=True, related_name="attachments"
+    )
+    # The stored content, shared with the other job files of the same content - then
+    # the `file` is the name of the blob and the `name` is the name the file is shown with
+    blob = models.ForeignKey(
+        FileBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="job_files"
+    )
+    name = models.CharField(max_length=255, blank=True)
+    # Set by the `jobs_make_thumbnails` task for the image attachments
+    thumbnail = models.FileField(max_length=1024, blank=True)
+
+    def save(self, *args, **kwargs):
+        if self.job_id is None and self.object_id is not None:
+            self.job_id = self.object_id
+        super().save(*args, **kwargs)
 
     def get_path(self, name):
         path = os.path.join(self.file_name, f"job_{self.object_id:06d}")
         return os.path.join(path, name)
+
+    @property
+    def file_basename(self):
+        return self.name or super().file_basename
+
+
+class JobFileUpload(models.Model):
+    """
+    A job file being uploaded in chunks. The chunks are appended to a partial file
+    in the directory of the job files and the upload can be resumed from its `offset`.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="uploads")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="job_file_uploads")
+    name = models.CharField(max_length=255)
+    # The partial file, relative to the storage of the job files
+    path = models.CharField(max_length=1024)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # The SHA-256 of the whole file, checked when the last chunk is received
+    sha256 = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.offset}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
@@ -0,0 +1,266 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+KEYSET_ANNOTATION = "keyset_value"
+CURSOR_NEXT = "n"
+CURSOR_PREVIOUS = "p"
+COUNT_CACHE_TIMEOUT = 60 * 60
+INVALID_CURSOR_MESSAGE = "That cursor is not valid"
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class KeysetPage:
+    """
+    A single page of a `KeysetPaginator`, with cursors pointing to its neighbours.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<Keyset page of {len(self)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking on the (sort key, pk) pair instead of using OFFSET.
+
+    Every page costs the same, no matter how deep it is, as long as there is an index
+    on (sort key, id). The paginator does not know the number of pages - it only moves
+    to the next or previous page with an opaque cursor.
+    """
+
+    def __init__(self, object_list, order_by, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.order_by = order_by
+        self.descending = order_by.startswith("-")
+        self.field = order_by.removeprefix("-")
+
+    @staticmethod
+    def ordering_for(order_by):
+        """
+        Return the ordering with the pk as a tie-breaker, so the order of the rows is stable.
+        """
+        if order_by.removeprefix("-") == "pk":
+            return [order_by]
+        direction = "-" if order_by.startswith("-") else ""
+        return [order_by, f"{direction}pk"]
+
+    @property
+    def ordering(self):
+        return self.ordering_for(self.order_by)
+
+    def _reversed_ordering(self):
+        return [
+            name.removeprefix("-") if name.startswith("-") else f"-{name}" for name in self.ordering
+        ]
+
+    def _model_field(self):
+        model_meta = self.object_list.model._meta
+        return model_meta.pk if self.field == "pk" else model_meta.get_field(self.field)
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, KEYSET_ANNOTATION)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        data = json.dumps([value, obj.pk, direction], separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            value, pk, direction = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            value = self._model_field().to_python(value)
+            pk = self.object_list.model._meta.pk.to_python(pk)
+        except (binascii.Error, TypeError, ValueError, ValidationError) as error:
+            raise InvalidCursor(INVALID_CURSOR_MESSAGE) from error
+        if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+            raise InvalidCursor(INVALID_CURSOR_MESSAGE)
+        return value, pk, direction
+
+    def _seek_filter(self, value, pk, backwards):
+        """
+        Rows that come after (or before, when going backwards) the given (value, pk) pair.
+        """
+        greater = self.descending == backwards
+        lookup = "gt" if greater else "lt"
+        if self.field == "pk":
+            return Q(**{f"pk__{lookup}": pk})
+        return Q(**{f"{self.field}__{lookup}": value}) | Q(
+            **{self.field: value, f"pk__{lookup}": pk}
+        )
+
+    def page(self, cursor=None):
+        """
+        Return a `KeysetPage` for the given cursor or the first page if there is no cursor.
+        """
+        queryset = self.object_list.annotate(**{KEYSET_ANNOTATION: F(self.field)})
+        backwards = False
+        if cursor:
+            value, pk, direction = self.decode_cursor(cursor)
+            backwards = direction == CURSOR_PREVIOUS
+            queryset = queryset.filter(self._seek_filter(value, pk, backwards))
+
+        ordering = self._reversed_ordering() if backwards else self.ordering
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+        return KeysetPage(
+            object_list=rows,
+            paginator=self,
+            next_cursor=self.encode_cursor(rows[-1], CURSOR_NEXT) if rows and has_next else None,
+            previous_cursor=(
+                self.encode_cursor(rows[0], CURSOR_PREVIOUS) if rows and has_previous else None
+            ),
+        )
+
+    def get_page(self, cursor=None):
+        """
+        Return a valid page, even if the cursor is not valid.
+        """
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    The `KeysetPaginator` as a REST framework pagination, with links to the neighbour pages.
+    """
+
+    cursor_query_param = "cursor"
+
+    def __init__(self, order_by, per_page):
+        self.order_by = order_by
+        self.per_page = per_page
+        self.page = None
+        self.request = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, order_by=self.order_by, per_page=self.per_page)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as error:
+            raise NotFound(INVALID_CURSOR_MESSAGE) from error
+        return list(self.page)
+
+    def _get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self._get_link(self.page.next_cursor),
+                "previous": self._get_link(self.page.previous_cursor),
+                "results": data,
+            }
+        )
+
+
+def _count_version_key(model):
+    return f"paginator-count-version:{model._meta.label_lower}"
+
+
+def get_count_version(model):
+    """
+    Return the current version of the cached counts of the model.
+    """
+    key = _count_version_key(model)
+    # A fresh version never repeats an old one, even if the version key has been evicted
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def _bump_count_version(model):
+    key = _count_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate_count_cache(model):
+    """
+    Bump the version of the cached counts of the model, so they are counted again.
+
+    The version is bumped again, once the transaction is committed, so a count cached
+    by another request before the commit is not kept under the new version.
+    """
+    _bump_count_version(model)
+    transaction.on_commit(partial(_bump_count_version, model))
+
+
+class CachedCountPaginator(Paginator):
+    """
+    A paginator which keeps the number of objects in the cache, keyed by the query filter.
+
+    The count is computed once per request and shared between requests until the model's
+    counts are invalidated with `invalidate_count_cache` (on save and delete signals).
+    """
+
+    @cached_property
+    def count(self):
+        try:
+            query = str(self.object_list.order_by().query)
+        except EmptyResultSet:
+            return 0
+
+        model = self.object_list.model
+        query_hash = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+        key = f"paginator-count:{model._meta.label_lower}:{get_count_version(model)}:{query_hash}"
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, timeout=COUNT_CACHE_TIMEOUT)
+        return count
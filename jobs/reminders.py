@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Case, DateField, F, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Mod
+from django.db.models.lookups import Exact
+from django.template.loader import render_to_string
+
+from jobs.consts import (
+    EMAIL_JOB_DEADLINE_REMINDER_CONTENT,
+    EMAIL_JOB_DEADLINE_REMINDER_SUBJECT,
+    EMAIL_JOB_DEADLINE_REMINDER_TEMPLATE,
+    JOB_ROLES,
+)
+from jobs.models import Job, JOBS_CONCLUDED_STATUSES, ReminderPolicy
+from users.helpers import notify
+
+
+def days_after_deadline(day):
+    """
+    Return the number of the days from the deadline of a job to the day, negative before it.
+    """
+    return Func(
+        Value(day, output_field=DateField()),
+        F("deadline"),
+        arg_joiner=" - ",
+        template="(%(expressions)s)",
+        output_field=IntegerField(),
+    )
+
+
+def policy_window(policy, day):
+    """
+    Return the condition of the jobs, which are in the window of the policy on the day.
+    """
+    deadline = day - timedelta(days=policy.offset_days)
+    if policy.repeat_days:
+        condition = Q(deadline__lte=deadline) & Q(
+            Exact(
+                Mod(
+                    days_after_deadline(day) - policy.offset_days,
+                    policy.repeat_days,
+                    output_field=IntegerField(),
+                ),
+                0,
+            )
+        )
+    else:
+        condition = Q(deadline=deadline)
+    if policy.kind:
+        condition &= Q(kind=policy.kind)
+    if policy.trade_id:
+        condition &= Q(trade_id=policy.trade_id)
+    return condition
+
+
+def classify_jobs(policies, day):
+    """
+    Return the open jobs in any window of the policies on the day, in a single query.
+
+    Every job is annotated with the pk of its policy for each role, in the `<role>_window`
+    attribute, or None. The first of the matching policies of a role is taken.
+
+    :param list policies: the reminder policies, in the order of their priority
+    :param datetime.date day: the day of the reminders
+    """
+    windows = {role: [] for role in JOB_ROLES}
+    for policy in policies:
+        windows[policy.recipient].append(When(policy_window(policy, day), then=Value(policy.pk)))
+    return (
+        Job.objects.exclude(status__in=JOBS_CONCLUDED_STATUSES)
+        .filter(reduce(or_, (policy_window(policy, day) for policy in policies)))
+        .annotate(
+            **{
+                f"{role}_window": Case(*whens, default=None, output_field=IntegerField())
+                for role, whens in windows.items()
+                if whens
+            }
+        )
+        .select_related(*JOB_ROLES, "trade")
+        .order_by("deadline", "pk")
+    )
+
+
+def send_deadline_reminders(day):
+    """
+    Remind the principals and the contractors about the deadlines of their open jobs.
+
+    The active reminder policies are evaluated together, in one query of the jobs.
+    Every user gets one notification with his jobs grouped by the windows.
+
+    :param datetime.date day: the day of the reminders
+    :return: the number of the notified users
+    """
+    policies = {
+        policy.pk: policy
+        for policy in ReminderPolicy.objects.filter(is_active=True).order_by("offset_days", "pk")
+    }
+    if not policies:
+        return 0
+
+    users = {}
+    reminders = defaultdict(lambda: defaultdict(list))
+    for job in classify_jobs(list(policies.values()), day):
+        for role in JOB_ROLES:
+            policy_pk = getattr(job, f"{role}_window", None)
+            if policy_pk is not None:
+                user = getattr(job, role)
+                users[user.pk] = user
+                reminders[user.pk][policy_pk].append(job)
+
+    for user_pk, user_windows in reminders.items():
+        windows = [(policies[pk], user_windows[pk]) for pk in policies if pk in user_windows]
+        notify(
+            users=[users[user_pk]],
+            subject=EMAIL_JOB_DEADLINE_REMINDER_SUBJECT.format(
+                len({job.pk for _, jobs in windows for job in jobs})
+            ),
+            content=EMAIL_JOB_DEADLINE_REMINDER_CONTENT
+            + render_to_string(
+                EMAIL_JOB_DEADLINE_REMINDER_TEMPLATE,
+                {"windows": windows, "base_url": settings.BASE_URL},
+            ),
+            idempotency_key=f"job-deadline-reminder:{day}",
+        )
+    return len(reminders)
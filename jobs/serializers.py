@@ -0,0 +1,124 @@
+import os
+
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from jobs.consts import (
+    JOBS_UPLOAD_CHUNK_SIZE,
+    JOBS_UPLOAD_MAX_SIZE,
+    JOBS_UPLOAD_SIGNATURES,
+    UPLOAD_EXTENSION_ERROR,
+    UPLOAD_SIZE_ERROR,
+)
+from jobs.helpers import highlight
+from jobs.models import Job, JobFile, JobFileUpload
+
+
+class JobSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+    description = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
+    status = serializers.CharField(source="get_status_display")
+    kind = serializers.CharField(source="get_kind_display")
+    trade = serializers.StringRelatedField()
+    deadline = serializers.DateField(format="%d.%m.%Y")
+
+    def get_description(self, obj):
+        return highlight(obj.description_headline)
+
+    def get_comments(self, obj):
+        return highlight(obj.comments_headline)
+
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "rank",
+            "description",
+            "comments",
+            "status",
+            "kind",
+            "trade",
+            "deadline",
+        )
+
+
+class SparseFieldsMixin:
+    """
+    Let the `fields` keyword argument limit the fields of a serializer to the given names.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class JobFileSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source="file_basename")
+    url = serializers.HyperlinkedIdentityField(
+        view_name="jobs-file-download", lookup_url_kwarg="job_file_pk"
+    )
+
+    class Meta:
+        model = JobFile
+        fields = ("name", "url", "uploaded")
+
+
+class JobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    trade = serializers.StringRelatedField()
+    attachments = JobFileSerializer(source="attachment_files", many=True, read_only=True)
+
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "principal",
+            "contractor",
+            "status",
+            "kind",
+            "trade",
+            "description",
+            "km_from",
+            "km_to",
+            "deadline",
+            "comments",
+            "created",
+            "updated",
+            "attachments",
+        )
+
+
+class JobFileUploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False, default="")
+    size = serializers.IntegerField(min_value=1)
+    chunk_size = serializers.SerializerMethodField()
+    url = serializers.SerializerMethodField()
+
+    def validate_name(self, value):
+        name = os.path.basename(value.replace("\\", "/"))
+        _, dot, extension = name.rpartition(".")
+        if not dot or extension.lower() not in JOBS_UPLOAD_SIGNATURES:
+            raise serializers.ValidationError(
+                UPLOAD_EXTENSION_ERROR.format(", ".join(sorted(JOBS_UPLOAD_SIGNATURES)))
+            )
+        return name
+
+    def validate_size(self, value):
+        if value > JOBS_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(UPLOAD_SIZE_ERROR.format(JOBS_UPLOAD_MAX_SIZE))
+        return value
+
+    def get_chunk_size(self, obj):
+        return JOBS_UPLOAD_CHUNK_SIZE
+
+    def get_url(self, obj):
+        return reverse(
+            "api-jobs-upload", kwargs={"upload_pk": obj.pk}, request=self.context.get("request")
+        )
+
+    class Meta:
+        model = JobFileUpload
+        fields = ("id", "name", "size", "sha256", "offset", "chunk_size", "url")
+        read_only_fields = ("offset",)
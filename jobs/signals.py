@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
+from kombu.exceptions import OperationalError
+
+from jobs.blobs import release_blob
+from jobs.fragments import bump_fragment_version
+from jobs.models import Job, JobFile
+from jobs.paginators import invalidate_count_cache
+from jobs.tasks import jobs_make_thumbnails
+from jobs.thumbnails import is_image
+from trades.models import Trade
+from users.models import User
+
+
+@receiver([post_save, post_delete], sender=Job)
+def job_changed(sender, instance, **kwargs):
+    invalidate_count_cache(sender)
+    bump_fragment_version(sender, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=JobFile)
+def job_file_changed(sender, instance, **kwargs):
+    if instance.job_id:
+        Job.objects.filter(pk=instance.job_id).update(updated=now())
+        bump_fragment_version(Job, instance.job_id)
+
+
+def make_thumbnail_later(job_file_pk):
+    try:
+        jobs_make_thumbnails.delay([job_file_pk])
+    except OperationalError as error:
+        print(f"The thumbnail will be made by the `jobs_thumbnails` command. {error}")
+
+
+@receiver(post_save, sender=JobFile)
+def job_file_created(sender, instance, created, **kwargs):
+    # The thumbnail is made by a worker, once the file is committed
+    if created and instance.file and is_image(instance.file_basename):
+        transaction.on_commit(lambda: make_thumbnail_later(instance.pk))
+
+
+@receiver(post_delete, sender=JobFile)
+def job_file_deleted(sender, instance, **kwargs):
+    # A shared blob outlives its job files, it is collected when nothing refers to it
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+    # Also when the files go away with their job, but only if the deletion is committed
+    elif instance.file:
+        storage, names = instance.file.storage, [instance.file.name, instance.thumbnail.name]
+        transaction.on_commit(lambda: [storage.delete(name) for name in names if name])
+
+
+@receiver([post_save, post_delete], sender=Trade)
+def trade_changed(sender, instance, **kwargs):
+    bump_fragment_version(sender, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logging in only updates the `last_login` field, which is not shown on the job fragments
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    bump_fragment_version(sender, instance.pk)
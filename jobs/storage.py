@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+from jobs.consts import JOBS_BLOBS_DIRECTORY, JOBS_BLOBS_TEMPORARY_DIRECTORY, JOBS_UPLOAD_CHUNK_SIZE
+
+
+def file_sha256(path):
+    """
+    Return the hex SHA-256 digest of a local file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while piece := file.read(JOBS_UPLOAD_CHUNK_SIZE):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    A file system storage which keeps every content once, named after its SHA-256.
+
+    The name given to `save` is ignored: the content is hashed while it is written
+    to a temporary file, which is then moved to `blobs/ab/cd/abcd...` or dropped,
+    if the same content is already stored. The returned name is the name of the blob.
+    """
+
+    @staticmethod
+    def blob_name(sha256):
+        return os.path.join(JOBS_BLOBS_DIRECTORY, sha256[:2], sha256[2:4], sha256)
+
+    @staticmethod
+    def blob_sha256(name):
+        return os.path.basename(name)
+
+    def get_available_name(self, name, max_length=None):
+        # The same name always means the same content, so an existing blob is never renamed
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(JOBS_BLOBS_TEMPORARY_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            return self.store(path, digest.hexdigest())
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def touch(self, name):
+        """
+        Update the modification time of a stored blob.
+
+        :return: True if the blob exists, otherwise False
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, path, sha256):
+        """
+        Move a local file with a known digest to its blob or remove it, if the blob exists.
+
+        The file must be on the same file system as the storage. An existing blob is touched,
+        so it is not collected as an orphan right after it has been found.
+
+        :param str path: the absolute path of the file
+        :param str sha256: the hex digest of the file
+        :return: the name of the blob
+        """
+        name = self.blob_name(sha256)
+        if self.touch(name):
+            os.remove(path)
+            return name
+
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        os.replace(path, target)
+        return name
+
+
+blob_storage = ContentAddressedStorage()
@@ -1,44 +1,50 @@
 from celery import shared_task
-from dateutil.relativedelta import relativedelta
 from django.core.management import call_command
 from django.utils.timezone import now
 
-from jobs.consts import (
-    EMAIL_JOB_OVERDUE_DEADLINE_CONTENT,
-    EMAIL_JOB_OVERDUE_DEADLINE_SUBJECT,
-    EMAIL_JOB_UPCOMING_DEADLINE_CONTENT,
-    EMAIL_JOB_UPCOMING_DEADLINE_SUBJECT,
-)
-from jobs.models import Job, JOBS_CONCLUDED_STATUSES
-from users.helpers import send_email
+from jobs.archives import clean_archives, send_archive
+from jobs.blobs import collect_orphan_blobs
+from jobs.downloads import flush_downloads
+from jobs.reminders import send_deadline_reminders
+from jobs.thumbnails import make_thumbnails
+from jobs.uploads import abort_stale_uploads
 
 
 @shared_task
-def jobs_upcoming_deadline_contractor():
-    upcoming_deadline = (now() + relativedelta(days=1)).date()
-    jobs = Job.objects.filter(deadline=upcoming_deadline).exclude(
-        status__in=JOBS_CONCLUDED_STATUSES
-    )
-    for job in jobs:
-        send_email(
-            recipients=[job.contractor.email],
-            subject=EMAIL_JOB_UPCOMING_DEADLINE_SUBJECT.format(job.pk),
-            content=EMAIL_JOB_UPCOMING_DEADLINE_CONTENT.format(job.pk),
-        )
+def jobs_deadline_reminders():
+    return send_deadline_reminders(now().date())
 
 
 @shared_task
-def jobs_overdue_deadline_principal():
-    overdue_deadline = (now() - relativedelta(days=1)).date()
-    jobs = Job.objects.filter(deadline=overdue_deadline).exclude(status__in=JOBS_CONCLUDED_STATUSES)
-    for job in jobs:
-        send_email(
-            recipients=[job.principal.email],
-            subject=EMAIL_JOB_OVERDUE_DEADLINE_SUBJECT.format(job.pk),
-            content=EMAIL_JOB_OVERDUE_DEADLINE_CONTENT.format(job.pk),
-        )
+def jobs_monthly_status_report():
+    call_command("jobs_monthly_status")
 
 
 @shared_task
-def jobs_monthly_status_report():
-    call_command("jobs_monthly_status")
+def jobs_flush_file_downloads():
+    flush_downloads()
+
+
+@shared_task
+def jobs_collect_orphan_blobs():
+    collect_orphan_blobs()
+
+
+@shared_task
+def jobs_abort_stale_uploads():
+    return abort_stale_uploads()
+
+
+@shared_task
+def jobs_make_thumbnails(job_file_pks):
+    return make_thumbnails(job_file_pks)
+
+
+@shared_task
+def jobs_send_files_archive(user_pk, job_file_pks, file_name):
+    send_archive(user_pk, job_file_pks, file_name)
+
+
+@shared_task
+def jobs_clean_files_archives():
+    clean_archives()
@@ -1,5 +1,8 @@
 from django import template
-from django.core.paginator import Paginator
+from django.template.defaultfilters import truncatechars
+
+from jobs import helpers
+from jobs.consts import JOBS_PREVIEW_LENGTH
 
 register = template.Library()
 
@@ -12,12 +15,27 @@ def km(value):
     return str(value).replace(".", "+")
 
 
+@register.filter
+def preview(value):
+    """
+    Returns the beginning of a long text, ending with `…` if it has been shortened.
+    """
+    return truncatechars(value, JOBS_PREVIEW_LENGTH)
+
+
+@register.filter
+def highlight(value):
+    """
+    Returns the search headline with the found words marked.
+    """
+    return helpers.highlight(value)
+
+
 @register.simple_tag
 def get_elided_page_range(paginator, number, on_each_side=2, on_ends=1):
     """
     Returns a 1-based list of page numbers.
     """
-    paginator = Paginator(paginator.object_list, paginator.per_page)
     return paginator.get_elided_page_range(
         number=number, on_each_side=on_each_side, on_ends=on_ends
     )
@@ -1,7 +1,9 @@
 import datetime
+import io
 
 import factory
 from factory.fuzzy import FuzzyChoice, FuzzyDate, FuzzyDecimal
+from PIL import Image
 
 from jobs.consts import JobKinds, JobStatuses
 from jobs.models import Job
@@ -30,3 +32,12 @@ class JobFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = Job
+
+
+def image_content(size=(800, 600), image_format="PNG"):
+    """
+    Return the content of a plain image file for the tests.
+    """
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, image_format)
+    return buffer.getvalue()
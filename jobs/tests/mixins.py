@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Adds an assertion that a block of code does not exceed the given number of queries.
+    """
+
+    @contextmanager
+    def assertMaxNumQueries(self, number, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        executed = len(context)
+        queries = "\n".join(
+            f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1)
+        )
+        self.assertLessEqual(
+            executed,
+            number,
+            f"{executed} queries executed, {number} expected at most\nCaptured queries were:\n{queries}",
+        )
@@ -0,0 +1,561 @@
+import base64
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import override_settings, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+from parameterized import parameterized
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from jobs.consts import JobKinds, JobStatuses
+from jobs.models import Job, JobFile, JobFileUpload
+from jobs.tests.factories import JobFactory
+from jobs.tests.mixins import QueryBudgetMixin
+from users.tests.factories import UserFactory
+
+
+class TestSearchJobsAPI(TestCase):
+    """
+    Test module for the full-text search of jobs API.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse("api-jobs-search")
+        cls.user = UserFactory.create(is_active=True)
+        cls.job_description = JobFactory.create(
+            description="Stake out the <b>foundations</b> of the bridge.", comments=""
+        )
+        cls.job_comments = JobFactory.create(
+            description="Inventory of the track.", comments="The bridge is staked out."
+        )
+        JobFactory.create(description="Inventory of the drainage.", comments="")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_get_not_logged_in_user_cannot_search(self):
+        # Act
+        response = self.client.get(self.url, {"q": "bridge"})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_get_without_query(self):
+        # Arrange
+        self.client.force_login(user=self.user)
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_ranked_and_highlighted_results(self):
+        """
+        The stemmed words are found, the description weighs more than the comments
+        and the snippets have no HTML tags apart from the marked words.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+
+        # Act
+        response = self.client.get(self.url, {"q": "staking bridges"})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [job["id"] for job in response.data], [self.job_description.pk, self.job_comments.pk]
+        )
+        self.assertIn("<mark>Stake</mark>", response.data[0]["description"])
+        self.assertNotIn("<b>", response.data[0]["description"])
+        # The snippets are cut with the primary config, which does not stem English words
+        self.assertEqual(response.data[1]["comments"], "The bridge is staked out.")
+
+
+class TestJobsAPI(QueryBudgetMixin, TestCase):
+    """
+    Test module for the jobs list and details API.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse("api-jobs-list")
+        cls.user = UserFactory.create(is_active=True)
+        cls.job = JobFactory.create(
+            status=JobStatuses.ACCEPTED,
+            kind=JobKinds.INVENTORY,
+            deadline=datetime.date(2024, 11, 3),
+        )
+        cls.job_file = JobFile.objects.create(
+            content_object=cls.job,
+            file=SimpleUploadedFile(
+                name="plan.pdf", content=b"Plan", content_type="application/pdf"
+            ),
+        )
+        cls.other_job = JobFactory.create(
+            status=JobStatuses.WAITING,
+            kind=JobKinds.STAKING,
+            deadline=datetime.date(2024, 11, 5),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_login(user=self.user)
+
+    def test_get_not_logged_in_user_cannot_list(self):
+        # Arrange
+        self.client.logout()
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_get_list(self):
+        """
+        The jobs are listed the newest first, with the URLs of their attachments.
+        """
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["next"])
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(
+            [job["id"] for job in response.data["results"]], [self.other_job.pk, self.job.pk]
+        )
+        job = response.data["results"][1]
+        self.assertEqual(job["status"], JobStatuses.ACCEPTED)
+        self.assertEqual(job["trade"], str(self.job.trade))
+        self.assertRegex(job["attachments"][0]["name"], r"^plan(_\w+)?\.pdf$")
+        self.assertTrue(job["attachments"][0]["url"].startswith("http://testserver/"))
+        self.assertEqual(response.data["results"][0]["attachments"], [])
+
+    @mock.patch("jobs.api_views.JOBS_API_PER_PAGE", 2)
+    def test_get_list_cursor_pagination(self):
+        """
+        The cursor links walk through all the jobs in the chosen order.
+        """
+        # Arrange
+        JobFactory.create_batch(size=3)
+        expected_jobs_pk = list(Job.objects.order_by("deadline", "pk").values_list("pk", flat=True))
+
+        # Act
+        pages = [self.client.get(self.url, {"order_by": "deadline"})]
+        while next_url := pages[-1].data["next"]:
+            pages.append(self.client.get(next_url))
+
+        # Assert
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(
+            [job["id"] for page in pages for job in page.data["results"]], expected_jobs_pk
+        )
+        self.assertIsNotNone(pages[-1].data["previous"])
+
+    @parameterized.expand(
+        [
+            ("status", {"status": JobStatuses.ACCEPTED}),
+            ("kind", {"kind": JobKinds.INVENTORY}),
+            ("deadline", {"deadline_from": "2024-11-01", "deadline_to": "2024-11-04"}),
+        ]
+    )
+    def test_get_list_filters(self, _, filters):
+        # Act
+        response = self.client.get(self.url, filters)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([job["id"] for job in response.data["results"]], [self.job.pk])
+
+    def test_get_list_filter_by_trade(self):
+        # Act
+        response = self.client.get(self.url, {"trade": self.other_job.trade.pk})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(self.other_job.pk, [job["id"] for job in response.data["results"]])
+
+    def test_get_list_sparse_fields(self):
+        # Act
+        response = self.client.get(self.url, {"fields": "id,status"})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"][0], {"id": self.other_job.pk, "status": JobStatuses.WAITING}
+        )
+
+    @parameterized.expand(
+        [
+            ("fields", {"fields": "id,password"}, status.HTTP_400_BAD_REQUEST),
+            (
+                "filter",
+                {"deadline_from": "2024-11-02", "deadline_to": "2024-11-01"},
+                status.HTTP_400_BAD_REQUEST,
+            ),
+            ("order_by", {"order_by": "comments"}, status.HTTP_400_BAD_REQUEST),
+            ("cursor", {"cursor": "not-a-cursor"}, status.HTTP_404_NOT_FOUND),
+        ]
+    )
+    def test_get_list_invalid_parameters(self, _, params, expected_status):
+        # Act
+        response = self.client.get(self.url, params)
+
+        # Assert
+        self.assertEqual(response.status_code, expected_status)
+
+    def test_get_list_query_budget(self):
+        """
+        The number of queries does not depend on the number of jobs on the page.
+        """
+        # Arrange
+        for job in JobFactory.create_batch(size=10):
+            JobFile.objects.create(content_object=job)
+
+        # Act
+        with self.assertMaxNumQueries(5):
+            response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 12)
+
+    def test_get_list_not_modified(self):
+        """
+        The list is not sent again until a job is changed or deleted.
+        """
+        # Arrange
+        etag = self.client.get(self.url)["ETag"]
+
+        # Act
+        response_not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.other_job.comments = "Changed"
+        self.other_job.save()
+        response_changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        etag_changed = response_changed["ETag"]
+        Job.objects.filter(pk=self.other_job.pk).delete()
+        response_deleted = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag_changed)
+
+        # Assert
+        self.assertEqual(response_not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response_changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_deleted.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response_deleted.data["results"]), 1)
+
+    def test_get_details(self):
+        # Act
+        response = self.client.get(reverse("api-jobs-details", kwargs={"job_pk": self.job.pk}))
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], self.job.pk)
+        self.assertEqual(len(response.data["attachments"]), 1)
+        self.assertEqual(response["Last-Modified"], http_date(self.job.updated.timestamp()))
+
+    def test_get_details_not_found(self):
+        # Act
+        response = self.client.get(reverse("api-jobs-details", kwargs={"job_pk": 0}))
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_details_not_modified(self):
+        """
+        The job is not sent again until it or its attachments change.
+        """
+        # Arrange
+        url = reverse("api-jobs-details", kwargs={"job_pk": self.job.pk})
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        # Act
+        response_etag = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        response_last_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        JobFile.objects.create(content_object=self.job)
+        response_changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        # Assert
+        self.assertEqual(response_etag.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response_last_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response_changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response_changed.data["attachments"]), 2)
+
+
+class TestJobFileUploadAPI(TestCase):
+    """
+    Test module for the chunked uploads of the job files.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create(is_active=True)
+        cls.job = JobFactory.create()
+        cls.url = reverse("api-jobs-uploads", kwargs={"job_pk": cls.job.pk})
+        cls.content = b"%PDF-1.7\n" + bytes(range(256)) * 40
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _start(self, **data):
+        data = {"name": "plan.pdf", "size": len(self.content), **data}
+        return self.client.post(self.url, data, format="json")
+
+    def _put_chunk(self, upload_url, start, end, content=None, **headers):
+        return self.client.generic(
+            "PUT",
+            upload_url,
+            self.content[start : end + 1] if content is None else content,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{len(self.content)}",
+            **headers,
+        )
+
+    @mock.patch("jobs.uploads.JOBS_UPLOAD_CHUNK_SIZE", 4096)
+    def test_upload_in_chunks(self):
+        """
+        The chunks are appended in order and the last one attaches the file to the job.
+        """
+        # Arrange
+        upload_url = self._start(sha256=hashlib.sha256(self.content).hexdigest()).data["url"]
+        responses = []
+
+        # Act
+        for start in range(0, len(self.content), 4096):
+            end = min(start + 4096, len(self.content)) - 1
+            chunk = self.content[start : end + 1]
+            digest = base64.b64encode(hashlib.sha256(chunk).digest()).decode()
+            responses.append(
+                self._put_chunk(upload_url, start, end, HTTP_CONTENT_DIGEST=f"sha-256=:{digest}:")
+            )
+
+        # Assert
+        self.assertListEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_200_OK] * (len(responses) - 1) + [status.HTTP_201_CREATED],
+        )
+        self.assertEqual(responses[0].data["offset"], 4096)
+        self.assertEqual(responses[-1].data["name"], "plan.pdf")
+        job_file = JobFile.objects.get(job=self.job)
+        with job_file.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(JobFileUpload.objects.exists())
+
+    def test_resume_after_a_lost_chunk(self):
+        """
+        A chunk, which does not continue the upload, is refused and the offset tells
+        where to resume from.
+        """
+        # Arrange
+        upload_url = self._start().data["url"]
+        self._put_chunk(upload_url, 0, 999)
+
+        # Act
+        conflict_response = self._put_chunk(upload_url, 2000, 2999)
+        resume_response = self.client.get(upload_url)
+        last_response = self._put_chunk(upload_url, 1000, len(self.content) - 1)
+
+        # Assert
+        self.assertEqual(conflict_response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resume_response.data["offset"], 1000)
+        self.assertEqual(last_response.status_code, status.HTTP_201_CREATED)
+        with JobFile.objects.get(job=self.job).file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+    @parameterized.expand(
+        [
+            (
+                "digest",
+                {"HTTP_CONTENT_DIGEST": "sha-256=:AAAA:"},
+                None,
+                status.HTTP_400_BAD_REQUEST,
+            ),
+            ("longer_body", {}, b"%PDF-" + b"x" * 1000, status.HTTP_400_BAD_REQUEST),
+            ("signature", {}, b"MZ" + b"x" * 998, status.HTTP_400_BAD_REQUEST),
+        ]
+    )
+    def test_rejected_chunk_is_cut_off(self, _, headers, content, expected_status):
+        """
+        A damaged, oversized or not matching chunk is refused and the upload stays where it was.
+        """
+        # Arrange
+        upload_url = self._start().data["url"]
+        upload = JobFileUpload.objects.get()
+
+        # Act
+        response = self._put_chunk(upload_url, 0, 999, content, **headers)
+
+        # Assert
+        self.assertEqual(response.status_code, expected_status)
+        upload.refresh_from_db()
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(os.path.getsize(os.path.join(self.media_root, upload.path)), 0)
+
+    @mock.patch("jobs.uploads.JOBS_UPLOAD_CHUNK_SIZE", 512)
+    def test_chunk_too_large(self):
+        """
+        A chunk larger than the chunk size is refused before its body is read.
+        """
+        # Arrange
+        upload_url = self._start().data["url"]
+
+        # Act
+        response = self._put_chunk(upload_url, 0, 999)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_wrong_checksum_removes_the_upload(self):
+        """
+        A file with a checksum different from the declared one is not attached to the job.
+        """
+        # Arrange
+        upload_url = self._start(sha256="0" * 64).data["url"]
+        upload = JobFileUpload.objects.get()
+
+        # Act
+        response = self._put_chunk(upload_url, 0, len(self.content) - 1)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(JobFile.objects.exists())
+        self.assertFalse(JobFileUpload.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, upload.path)))
+
+    def test_failed_last_chunk_can_be_sent_again(self):
+        """
+        If the file of the last chunk cannot be attached, the upload stays before the last chunk.
+        """
+        # Arrange
+        upload_url = self._start().data["url"]
+        upload = JobFileUpload.objects.get()
+        self._put_chunk(upload_url, 0, 999)
+
+        # Act
+        with mock.patch("jobs.uploads.attach_blob", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self._put_chunk(upload_url, 1000, len(self.content) - 1)
+        resume_response = self.client.get(upload_url)
+        last_response = self._put_chunk(upload_url, 1000, len(self.content) - 1)
+
+        # Assert
+        self.assertEqual(resume_response.data["offset"], 1000)
+        self.assertEqual(last_response.status_code, status.HTTP_201_CREATED)
+        with JobFile.objects.get(job=self.job).file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, upload.path)))
+
+    @parameterized.expand(
+        [
+            ("extension", {"name": "setup.exe"}),
+            ("no_extension", {"name": "pdf"}),
+            ("size", {"size": 0}),
+            ("too_large", {"size": 10 * 1024**4}),
+            ("sha256", {"sha256": "xyz"}),
+        ]
+    )
+    def test_start_invalid(self, _, data):
+        """
+        The name, the size and the checksum are checked before any chunk is sent.
+        """
+        # Act
+        response = self._start(**data)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(JobFileUpload.objects.exists())
+
+    def test_other_user_cannot_continue(self):
+        """
+        Only the user who started the upload can send its chunks.
+        """
+        # Arrange
+        upload_url = self._start().data["url"]
+        self.client.force_authenticate(user=UserFactory.create(is_active=True))
+
+        # Act
+        response = self._put_chunk(upload_url, 0, 999)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cancel(self):
+        """
+        A cancelled upload leaves no partial file behind.
+        """
+        # Arrange
+        upload_url = self._start().data["url"]
+        upload = JobFileUpload.objects.get()
+        self._put_chunk(upload_url, 0, 999)
+
+        # Act
+        response = self.client.delete(upload_url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(JobFileUpload.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, upload.path)))
+
+    def test_known_content_is_attached_without_upload(self):
+        """
+        A file, whose content is already stored, is attached as soon as its checksum is sent.
+        """
+        # Arrange
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        first_url = self._start(sha256=sha256).data["url"]
+        self._put_chunk(first_url, 0, len(self.content) - 1)
+        other_job = JobFactory.create()
+
+        # Act
+        response = self.client.post(
+            reverse("api-jobs-uploads", kwargs={"job_pk": other_job.pk}),
+            {"name": "copy.pdf", "size": len(self.content), "sha256": sha256},
+            format="json",
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["name"], "copy.pdf")
+        self.assertFalse(JobFileUpload.objects.exists())
+        job_file = JobFile.objects.get(job=other_job)
+        self.assertEqual(job_file.blob_id, sha256)
+        self.assertEqual(job_file.blob.references, 2)
+
+    def test_uploaded_copy_is_stored_once(self):
+        """
+        The same content uploaded again without a checksum is kept in a single blob.
+        """
+        # Arrange
+        self._put_chunk(self._start().data["url"], 0, len(self.content) - 1)
+
+        # Act
+        response = self._put_chunk(
+            self._start(name="copy.pdf").data["url"], 0, len(self.content) - 1
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job_files = JobFile.objects.filter(job=self.job).order_by("pk")
+        self.assertListEqual(
+            [job_file.file_basename for job_file in job_files], ["plan.pdf", "copy.pdf"]
+        )
+        self.assertEqual(len({job_file.file.name for job_file in job_files}), 1)
+        blob_directory = os.path.join(self.media_root, "blobs", job_files[0].blob_id[:2])
+        self.assertEqual(len(os.listdir(blob_directory)), 1)
+        self.assertListEqual(
+            os.listdir(os.path.join(self.media_root, "jobfiles", f"job_{self.job.pk:06d}")), []
+        )
@@ -1,11 +1,21 @@
 import datetime
+import re
+from decimal import Decimal
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
 from parameterized import parameterized
 
-from jobs.consts import DEADLINE_FORM_ERROR, JobKinds, JobStatuses
-from jobs.forms import JobCreateForm, JobFileForm, JobViewForm
+from jobs.consts import (
+    DEADLINE_FORM_ERROR,
+    JobKinds,
+    JobStatuses,
+    KM_FORMAT_ERROR,
+    RANGE_FORM_ERROR,
+)
+from jobs.forms import JobCreateForm, JobFileForm, JobFilterForm, JobViewForm
+from jobs.models import Job
 from jobs.tests.factories import JobFactory
 from trades.factories import TradeFactory
 from users.models import SITE_ENGINEER, SITE_MANAGER, SURVEYOR
@@ -183,3 +193,146 @@ class TestJobViewForm(TestCase):
                 self.assertEqual(self.job.contractor, self.contractor)
                 self.assertEqual(self.job.status, finished_status)
                 self.assertEqual(self.job.comments, finished_comments)
+
+
+class TestJobFilterForm(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.job = JobFactory.create()
+
+    def test_filter_empty_data(self):
+        """
+        An empty form does not filter out any job.
+        """
+        # Arrange
+        JobFactory.create()
+        form = JobFilterForm(data={})
+
+        # Act
+        is_valid = form.is_valid()
+
+        # Assert
+        self.assertTrue(is_valid)
+        self.assertEqual(form.filter(Job.objects.all()).count(), 2)
+
+    @parameterized.expand(["deadline", "created"])
+    def test_filter_range_end_before_start(self, field):
+        """
+        Test should fail, because the end of the range is before its start.
+        """
+        # Arrange
+        data = {f"{field}_from": "2024-11-02", f"{field}_to": "2024-11-01"}
+
+        # Act
+        form = JobFilterForm(data=data)
+
+        # Assert
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors, {f"{field}_to": [RANGE_FORM_ERROR]})
+
+    @parameterized.expand(
+        [
+            ("plus", {"km_from": "123+400"}, Decimal("123.400")),
+            ("dot", {"km_from": "123.4"}, Decimal("123.4")),
+            ("comma", {"km_from": "123,400"}, Decimal("123.400")),
+            ("zero", {"km_from": "0+000", "km_to": "0+000"}, Decimal("0")),
+        ]
+    )
+    def test_filter_chainage(self, _, data, expected_km_from):
+        """
+        The chainage can be written with `+`, `.` or `,` and is cleaned to kilometres.
+        """
+        # Act
+        form = JobFilterForm(data=data)
+
+        # Assert
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["km_from"], expected_km_from)
+
+    @parameterized.expand(
+        [
+            ("format", {"km_from": "km 12"}, {"km_from": [KM_FORMAT_ERROR]}),
+            ("metres", {"km_from": "12+1000"}, {"km_from": [KM_FORMAT_ERROR]}),
+            ("range", {"km_from": "12+400", "km_to": "12+300"}, {"km_to": [RANGE_FORM_ERROR]}),
+        ]
+    )
+    def test_filter_chainage_invalid(self, _, data, expected_errors):
+        """
+        Test should fail, because the chainage is not valid.
+        """
+        # Act
+        form = JobFilterForm(data=data)
+
+        # Assert
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors, expected_errors)
+
+    def test_filter_user_choices_are_queried_once(self):
+        """
+        The principal and the contractor share the choices from a single query,
+        made only when the choices are needed.
+        """
+        # Arrange
+        with self.assertNumQueries(0):
+            form = JobFilterForm(data={"status": JobStatuses.WAITING})
+            form.is_valid()
+
+        # Act
+        with self.assertNumQueries(1):
+            principal_choices = list(form.fields["principal"].choices)
+            contractor_choices = list(form.fields["contractor"].choices)
+
+        # Assert
+        self.assertEqual(principal_choices, contractor_choices)
+        self.assertIn(self.job.principal.pk, dict(principal_choices))
+
+    @parameterized.expand(
+        [
+            ("status", {"status": JobStatuses.WAITING}, "-created"),
+            (
+                "status_deadline",
+                {"status": JobStatuses.WAITING, "deadline_from": "2024-11-01"},
+                "deadline",
+            ),
+            ("trade_status", {"trade": "trade", "status": JobStatuses.WAITING}, "-created"),
+            ("kind_status", {"kind": JobKinds.STAKING, "status": JobStatuses.WAITING}, "-created"),
+            ("open_only", {"open_only": "on"}, "deadline"),
+            ("principal", {"principal": "principal"}, "-created"),
+            ("contractor", {"contractor": "contractor"}, "-created"),
+            ("created", {"created_from": "2024-11-01", "created_to": "2024-11-30"}, "-created"),
+            ("chainage", {"km_from": "123+400", "km_to": "125+000"}, "-created"),
+            (
+                "trade_chainage",
+                {"trade": "trade", "km_from": "123+400", "km_to": "125+000"},
+                "-created",
+            ),
+        ]
+    )
+    def test_filter_uses_indexes(self, _, data, order_by):
+        """
+        The common combinations of the filters are served by the indexes of `jobs_job`.
+
+        Sequential scans are disabled, so the planner falls back to one only if there is
+        no index which can serve the query at all, no matter how small the table is.
+        """
+        # Arrange
+        # The related fields are given by name and filled in with the ids of the job
+        data = {
+            field: (
+                getattr(self.job, f"{value}_id")
+                if value in ("trade", "principal", "contractor")
+                else value
+            )
+            for field, value in data.items()
+        }
+        form = JobFilterForm(data=data)
+        self.assertTrue(form.is_valid())
+        jobs = form.filter(Job.objects.all()).order_by(order_by, "pk")
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        # Act
+        plan = jobs.explain()
+
+        # Assert
+        self.assertIsNone(re.search(r"Seq Scan on jobs_job\b", plan), plan)
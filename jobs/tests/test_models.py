@@ -0,0 +1,352 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.test import override_settings, TestCase, TransactionTestCase
+from parameterized import parameterized
+
+from jobs.blobs import attach_known_blob, collect_orphan_blobs, create_job_file
+from jobs.consts import (
+    JOB_ROLE_CONTRACTOR,
+    JOB_ROLE_PRINCIPAL,
+    JOBS_BLOBS_TEMPORARY_DIRECTORY,
+    JobStatuses,
+)
+from jobs.counters import find_counters_drift
+from jobs.models import FileBlob, Job, JobCounter, JobFile
+from jobs.storage import blob_storage
+from jobs.tests.factories import JobFactory
+from trades.factories import TradeFactory
+from trades.models import ALL_TRADES
+from users.tests.factories import UserFactory
+
+
+class TestJobChainage(TestCase):
+    @parameterized.expand(
+        [
+            ("range", "12.345", "12.400", NumericRange(Decimal("12.345"), Decimal("12.400"), "[]")),
+            ("point", "12.345", None, NumericRange(Decimal("12.345"), Decimal("12.345"), "[]")),
+            (
+                "backwards",
+                "12.400",
+                "12.345",
+                NumericRange(Decimal("12.345"), Decimal("12.400"), "[]"),
+            ),
+        ]
+    )
+    def test_chainage_is_kept_in_sync(self, _, km_from, km_to, expected_chainage):
+        """
+        The chainage range follows km_from and km_to on insert and on update.
+        """
+        # Arrange
+        job = JobFactory.create(km_from=Decimal("1.000"), km_to=Decimal("2.000"))
+
+        # Act
+        Job.objects.filter(pk=job.pk).update(km_from=km_from, km_to=km_to)
+        job.refresh_from_db()
+
+        # Assert
+        self.assertEqual(job.chainage, expected_chainage)
+
+    @parameterized.expand(
+        [
+            ("overlapping", "123.000", "123.500", ["touching_end", "inside", "point"]),
+            ("point", "123.400", "123.400", ["touching_end", "point"]),
+            ("open_end", "124.000", None, ["inside", "after"]),
+            ("open_start", None, "122.000", ["before"]),
+        ]
+    )
+    def test_overlapping_chainage(self, _, km_from, km_to, expected_jobs):
+        """
+        The jobs touching the closed interval are found, including the point jobs.
+        """
+        # Arrange
+        trade, other_trade = (TradeFactory.create(abbreviation=name) for name in ALL_TRADES[:2])
+        jobs = {
+            "before": JobFactory.create(trade=trade, km_from="121.000", km_to="122.000"),
+            "touching_end": JobFactory.create(trade=trade, km_from="122.500", km_to="123.400"),
+            "inside": JobFactory.create(trade=trade, km_from="123.450", km_to="124.100"),
+            "point": JobFactory.create(trade=trade, km_from="123.400", km_to=None),
+            "after": JobFactory.create(trade=trade, km_from="125.000", km_to="126.000"),
+        }
+        JobFactory.create(trade=other_trade, km_from="123.000", km_to="124.000")
+
+        # Act
+        found = Job.objects.filter(trade=trade).overlapping_chainage(
+            km_from and Decimal(km_from), km_to and Decimal(km_to)
+        )
+
+        # Assert
+        self.assertCountEqual(found, [jobs[name] for name in expected_jobs])
+
+
+class TestJobCounter(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.principal = UserFactory.create()
+        cls.contractor = UserFactory.create()
+        cls.other_user = UserFactory.create()
+
+    def setUp(self):
+        self.job = JobFactory.create(
+            principal=self.principal, contractor=self.contractor, status=JobStatuses.WAITING
+        )
+
+    def _counts(self, user, role):
+        return {
+            status: count
+            for status, count in JobCounter.objects.for_user(user)[role].items()
+            if count
+        }
+
+    def test_create(self):
+        """
+        A new job is counted for its principal and its contractor.
+        """
+        # Act
+        JobFactory.create(principal=self.principal, status=JobStatuses.ACCEPTED)
+
+        # Assert
+        self.assertDictEqual(
+            self._counts(self.principal, JOB_ROLE_PRINCIPAL),
+            {JobStatuses.WAITING: 1, JobStatuses.ACCEPTED: 1},
+        )
+        self.assertDictEqual(
+            self._counts(self.contractor, JOB_ROLE_CONTRACTOR), {JobStatuses.WAITING: 1}
+        )
+        self.assertDictEqual(self._counts(self.principal, JOB_ROLE_CONTRACTOR), {})
+
+    @parameterized.expand([("save",), ("update",)])
+    def test_change_status_and_contractor(self, method):
+        """
+        The job moves between the counters, also when it is changed with `QuerySet.update`.
+        """
+        # Act
+        if method == "save":
+            self.job.status = JobStatuses.ONGOING
+            self.job.contractor = self.other_user
+            self.job.save()
+        else:
+            Job.objects.filter(pk=self.job.pk).update(
+                status=JobStatuses.ONGOING, contractor=self.other_user
+            )
+
+        # Assert
+        self.assertDictEqual(
+            self._counts(self.principal, JOB_ROLE_PRINCIPAL), {JobStatuses.ONGOING: 1}
+        )
+        self.assertDictEqual(self._counts(self.contractor, JOB_ROLE_CONTRACTOR), {})
+        self.assertDictEqual(
+            self._counts(self.other_user, JOB_ROLE_CONTRACTOR), {JobStatuses.ONGOING: 1}
+        )
+        self.assertListEqual(find_counters_drift(), [])
+
+    def test_delete(self):
+        """
+        A deleted job is not counted anymore.
+        """
+        # Act
+        self.job.delete()
+
+        # Assert
+        self.assertDictEqual(self._counts(self.principal, JOB_ROLE_PRINCIPAL), {})
+        self.assertDictEqual(self._counts(self.contractor, JOB_ROLE_CONTRACTOR), {})
+        self.assertListEqual(find_counters_drift(), [])
+
+    def test_for_user_has_all_the_roles_and_statuses(self):
+        """
+        The counters of a user without jobs are zeros.
+        """
+        # Act
+        counts = JobCounter.objects.for_user(self.other_user)
+
+        # Assert
+        self.assertCountEqual(counts, [JOB_ROLE_PRINCIPAL, JOB_ROLE_CONTRACTOR])
+        for role_counts in counts.values():
+            self.assertDictEqual(role_counts, dict.fromkeys(JobStatuses.values, 0))
+
+
+class TestJobFile(TestCase):
+    def setUp(self):
+        self.job = JobFactory.create()
+
+    def test_job_is_set_from_the_content_object(self):
+        """
+        A file attached with the generic relation is also related to the job directly.
+        """
+        # Act
+        job_file = JobFile.objects.create(content_object=self.job)
+
+        # Assert
+        self.assertEqual(job_file.job, self.job)
+        self.assertQuerySetEqual(self.job.get_job_files, [job_file])
+
+    def test_files_are_deleted_with_the_job(self):
+        """
+        Deleting a job does not leave its files behind.
+        """
+        # Arrange
+        JobFile.objects.create(content_object=self.job)
+
+        # Act
+        self.job.delete()
+
+        # Assert
+        self.assertFalse(JobFile.objects.exists())
+
+    def test_stored_file_is_deleted_after_commit(self):
+        """
+        The stored file of a deleted attachment is removed once the deletion is committed.
+        """
+        # Arrange
+        job_file = JobFile.objects.create(
+            content_object=self.job, file=SimpleUploadedFile("plan.pdf", b"%PDF")
+        )
+        storage, name = job_file.file.storage, job_file.file.name
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            self.job.delete()
+            stored_before_commit = storage.exists(name)
+
+        # Assert
+        self.assertTrue(stored_before_commit)
+        self.assertFalse(storage.exists(name))
+
+    def test_with_attachments(self):
+        """
+        The attachments of all the jobs are fetched in one query.
+        """
+        # Arrange
+        other_job = JobFactory.create()
+        job_files = [JobFile.objects.create(content_object=self.job) for _ in range(2)]
+
+        # Act
+        with self.assertNumQueries(2):
+            jobs = {job.pk: job for job in Job.objects.with_attachments()}
+
+        # Assert
+        self.assertListEqual(jobs[self.job.pk].attachment_files, job_files)
+        self.assertListEqual(jobs[other_job.pk].attachment_files, [])
+
+
+class TestFileBlob(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.jobs = JobFactory.create_batch(2)
+        self.content = b"%PDF-1.7 the drawing of the bridge"
+
+    def test_same_content_is_stored_once(self):
+        """
+        The same file attached to many jobs is stored in one blob, with the names it was given.
+        """
+        # Act
+        job_files = [
+            create_job_file(job, ContentFile(self.content, name=name))
+            for job, name in zip(self.jobs, ["bridge.pdf", "bridge_copy.pdf"])
+        ]
+
+        # Assert
+        blob = FileBlob.objects.get()
+        self.assertEqual(blob.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(blob.size, len(self.content))
+        self.assertEqual(blob.references, 2)
+        self.assertListEqual(
+            [job_file.file_basename for job_file in job_files], ["bridge.pdf", "bridge_copy.pdf"]
+        )
+        self.assertEqual(job_files[0].file.name, job_files[1].file.name)
+        with job_files[1].file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(os.listdir(os.path.join(self.media_root, JOBS_BLOBS_TEMPORARY_DIRECTORY)))
+
+    def test_deleted_job_files_release_the_blob(self):
+        """
+        The blob is kept while any job file refers to it and collected after the grace period.
+        """
+        # Arrange
+        job_files = [create_job_file(job, ContentFile(self.content, "a.pdf")) for job in self.jobs]
+        name = job_files[0].file.name
+        self.jobs[0].delete()
+
+        # Act
+        collected_in_use = collect_orphan_blobs(grace_period=0)
+        job_files[1].delete()
+        collected_in_grace_period = collect_orphan_blobs()
+        os.utime(job_files[1].file.path, (0, 0))
+        collected = collect_orphan_blobs(grace_period=0)
+
+        # Assert
+        self.assertEqual(collected_in_use, 0)
+        self.assertEqual(collected_in_grace_period, 0)
+        self.assertEqual(collected, 1)
+        self.assertFalse(FileBlob.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+
+    def test_collected_blob_is_stored_again(self):
+        """
+        A content attached again after its blob has been collected is stored anew.
+        """
+        # Arrange
+        job_file = create_job_file(self.jobs[0], ContentFile(self.content, "a.pdf"))
+        job_file.delete()
+        os.utime(job_file.file.path, (0, 0))
+        collect_orphan_blobs(grace_period=0)
+
+        # Act
+        job_file = create_job_file(self.jobs[1], ContentFile(self.content, "b.pdf"))
+
+        # Assert
+        self.assertEqual(FileBlob.objects.get().references, 1)
+        with job_file.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+
+class TestAttachKnownBlob(TransactionTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.job = JobFactory.create()
+        self.content = b"%PDF-1.7 the drawing of the bridge"
+        job_file = create_job_file(self.job, ContentFile(self.content, "a.pdf"))
+        job_file.delete()
+        os.utime(job_file.file.path, (0, 0))
+        self.sha256 = job_file.blob_id
+
+    def test_orphan_being_attached_is_not_collected(self):
+        """
+        A collection running while a known orphan is attached leaves the blob and its file.
+        """
+        # Arrange
+        collected = []
+        touch = blob_storage.touch
+
+        def collect_and_touch(name):
+            def collect():
+                collected.append(collect_orphan_blobs(grace_period=0))
+                connection.close()
+
+            thread = threading.Thread(target=collect)
+            thread.start()
+            thread.join()
+            return touch(name)
+
+        # Act
+        with mock.patch.object(blob_storage, "touch", side_effect=collect_and_touch):
+            job_file = attach_known_blob(self.job, self.sha256, len(self.content), "b.pdf")
+
+        # Assert
+        self.assertListEqual(collected, [0])
+        self.assertEqual(FileBlob.objects.get().references, 1)
+        with job_file.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
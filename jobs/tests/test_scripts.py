@@ -1,13 +1,25 @@
 import datetime
+import io
+import shutil
+import tempfile
 from unittest.mock import patch
 
 from dateutil.relativedelta import relativedelta
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.management import call_command, CommandError
+from django.test import TestCase, TransactionTestCase
 from django.test.utils import override_settings
 
-from jobs.consts import JobKinds, JobStatuses
+from jobs.blobs import create_job_file
+from jobs.consts import JOB_ROLE_PRINCIPAL, JobKinds, JobStatuses
+from jobs.counters import find_counters_drift
 from jobs.management.commands.jobs_monthly_status import Command
-from jobs.tests.factories import JobFactory
+from jobs.models import JobCounter, JobFile
+from jobs.tests.factories import image_content, JobFactory
+from trades.factories import TradeFactory
+from users.const import EmailStatuses
+from users.models import EmailOutbox
+from users.outbox import queue_emails
 
 
 class TestMonthlyStatus(TestCase):
@@ -85,3 +97,136 @@ class TestMonthlyStatus(TestCase):
 
         # Assert
         mock_file.assert_called_with(expected_call)
+
+
+class TestJobsCounters(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.job_1 = JobFactory.create(status=JobStatuses.WAITING)
+        cls.job_2 = JobFactory.create(status=JobStatuses.ONGOING)
+
+    def _break_counters(self):
+        JobCounter.objects.filter(user=self.job_1.principal, role=JOB_ROLE_PRINCIPAL).update(
+            count=5
+        )
+        JobCounter.objects.filter(user=self.job_2.contractor).delete()
+
+    def test_check_correct_counters(self):
+        """
+        The check passes when the counters follow the jobs.
+        """
+        # Arrange
+        output = io.StringIO()
+
+        # Act
+        call_command("jobs_counters", "--check", stdout=output)
+
+        # Assert
+        self.assertIn("The counters are correct!", output.getvalue())
+
+    def test_check_drifted_counters(self):
+        """
+        The check lists the wrong counters and fails.
+        """
+        # Arrange
+        self._break_counters()
+        output = io.StringIO()
+
+        # Act
+        with self.assertRaisesMessage(CommandError, "2 counters have drifted"):
+            call_command("jobs_counters", "--check", stdout=output)
+
+        # Assert
+        self.assertIn(
+            f"User {self.job_1.principal.pk} as a principal, waiting: 5 stored, 1 expected",
+            output.getvalue(),
+        )
+        self.assertIn(
+            f"User {self.job_2.contractor.pk} as a contractor, ongoing: 0 stored, 1 expected",
+            output.getvalue(),
+        )
+
+    def test_rebuild(self):
+        """
+        The rebuild replaces the drifted counters with the ones counted from the jobs.
+        """
+        # Arrange
+        self._break_counters()
+        output = io.StringIO()
+
+        # Act
+        call_command("jobs_counters", stdout=output)
+
+        # Assert
+        self.assertIn("The counters have been rebuilt (4)!", output.getvalue())
+        self.assertListEqual(find_counters_drift(), [])
+
+
+class TestJobsThumbnails(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        job = JobFactory.create()
+        self.photos = [
+            create_job_file(job, ContentFile(image_content(size=(400, 400 + index)), "photo.png"))
+            for index in range(3)
+        ]
+        create_job_file(job, ContentFile(b"%PDF-1.7", "plan.pdf"))
+
+    @patch("jobs.management.commands.jobs_thumbnails.jobs_make_thumbnails.delay")
+    def test_batches_are_queued(self, delay):
+        """
+        The image job files without a thumbnail are sent to the workers in batches.
+        """
+        # Arrange
+        output = io.StringIO()
+
+        # Act
+        call_command("jobs_thumbnails", "--batch-size", "2", stdout=output)
+
+        # Assert
+        self.assertListEqual(
+            [call.args[0] for call in delay.call_args_list],
+            [[self.photos[0].pk, self.photos[1].pk], [self.photos[2].pk]],
+        )
+        self.assertIn("2 batches of thumbnails have been queued!", output.getvalue())
+
+    def test_sync_is_rerunnable(self):
+        """
+        Only the missing thumbnails are made, so the command can be run again.
+        """
+        # Arrange
+        output = io.StringIO()
+        call_command("jobs_thumbnails", "--sync", "--batch-size", "2", stdout=io.StringIO())
+
+        # Act
+        call_command("jobs_thumbnails", "--sync", stdout=output)
+
+        # Assert
+        self.assertFalse(
+            JobFile.objects.filter(pk__in=[photo.pk for photo in self.photos], thumbnail="")
+        )
+        self.assertIn("0 thumbnails have been made!", output.getvalue())
+
+
+@override_settings(EMAIL_DISPATCH_WORKERS=2)
+class TestJobsViewEmailBenchmark(TransactionTestCase):
+    def test_benchmark_sends_only_its_emails(self):
+        """
+        The benchmark sends its own e-mails in every mode and leaves the others in the outbox.
+        """
+        # Arrange
+        TradeFactory.create()
+        queue_emails([("user@example.com", "Subject", "<p>Content</p>", "Content")])
+        output = io.StringIO()
+
+        # Act
+        with patch("users.tasks.users_dispatch_email_outbox.delay") as mock_delay:
+            call_command("jobs_view_email_benchmark", requests=2, latency=0, stdout=output)
+
+        # Assert
+        for mode in ("In the request", "Local worker pool", "Celery, with the task stubbed"):
+            self.assertRegex(output.getvalue(), rf"{mode}: .*, 4/4 e-mails sent")
+        mock_delay.assert_not_called()
+        self.assertEqual(EmailOutbox.objects.get().status, EmailStatuses.PENDING)
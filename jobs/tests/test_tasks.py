@@ -1,34 +1,71 @@
 import datetime
-from unittest.mock import patch
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import ANY, patch
 
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings, TestCase
+from django.urls import reverse
+from django.utils import timezone
 from freezegun import freeze_time
+from kombu.exceptions import OperationalError
 from parameterized import parameterized
+from PIL import Image
 
+from jobs.archives import build_archive, clean_archives
+from jobs.blobs import create_job_file
 from jobs.consts import (
-    EMAIL_JOB_OVERDUE_DEADLINE_CONTENT,
-    EMAIL_JOB_OVERDUE_DEADLINE_SUBJECT,
-    EMAIL_JOB_UPCOMING_DEADLINE_CONTENT,
-    EMAIL_JOB_UPCOMING_DEADLINE_SUBJECT,
+    EMAIL_JOB_DEADLINE_REMINDER_CONTENT,
+    EMAIL_JOB_DEADLINE_REMINDER_SUBJECT,
+    JobKinds,
+    JOBS_THUMBNAIL_SUFFIX,
     JobStatuses,
 )
-from jobs.tasks import jobs_overdue_deadline_principal, jobs_upcoming_deadline_contractor
-from jobs.tests.factories import JobFactory
+from jobs.downloads import (
+    _entry_key,
+    DOWNLOADS_FLUSHED_KEY,
+    DOWNLOADS_SEQUENCE_KEY,
+    flush_downloads,
+    record_download,
+)
+from jobs.models import JobFile, JobFileUpload, ReminderPolicy
+from jobs.tasks import (
+    jobs_abort_stale_uploads,
+    jobs_deadline_reminders,
+    jobs_flush_file_downloads,
+    jobs_make_thumbnails,
+)
+from jobs.tests.factories import image_content, JobFactory
+from jobs.thumbnails import make_thumbnails
+from jobs.uploads import start_upload
+from trades.factories import TradeFactory
+from trades.models import ALL_TRADES
+from users.tests.factories import UserFactory
 
 
 class TestJobsTasks(TestCase):
     @parameterized.expand(
         [
-            ("2024-11-06", JobStatuses.MAKING_DOCUMENTS, True),
-            ("2024-11-06", JobStatuses.FINISHED, False),
-            ("2024-11-05", JobStatuses.ONGOING, False),
-            ("2024-11-05", JobStatuses.CLOSED, False),
+            ("2024-11-12", JobStatuses.WAITING, "contractor"),
+            ("2024-11-06", JobStatuses.MAKING_DOCUMENTS, "contractor"),
+            ("2024-11-06", JobStatuses.FINISHED, None),
+            ("2024-11-05", JobStatuses.ONGOING, None),
+            ("2024-11-04", JobStatuses.DATA_PASSED, "principal"),
+            ("2024-11-04", JobStatuses.REFUSED, None),
+            ("2024-10-28", JobStatuses.ACCEPTED, "principal"),
+            ("2024-10-27", JobStatuses.ACCEPTED, None),
         ]
     )
-    @patch("jobs.tasks.send_email")
-    def test_jobs_upcoming_deadline_contractor(self, deadline, status, send_email, mock_email):
+    @patch("jobs.reminders.notify")
+    def test_jobs_deadline_reminders(self, deadline, status, recipient, mock_notify):
         """
-        Tests if the Contractor of the job gets an e-mail about deadline one day earlier.
+        The contractor is reminded a week and a day before the deadline, the principal a day
+        after it and then every week, while the job is not concluded.
         """
         # Arrange
         job = JobFactory.create(
@@ -37,46 +74,367 @@ class TestJobsTasks(TestCase):
 
         # Act
         with freeze_time("2024-11-05"):
-            jobs_upcoming_deadline_contractor()
+            jobs_deadline_reminders()
 
         # Assert
-        if send_email:
-            mock_email.assert_called_once_with(
-                recipients=[job.contractor.email],
-                subject=EMAIL_JOB_UPCOMING_DEADLINE_SUBJECT.format(job.pk),
-                content=EMAIL_JOB_UPCOMING_DEADLINE_CONTENT.format(job.pk),
+        if recipient:
+            mock_notify.assert_called_once_with(
+                users=[getattr(job, recipient)],
+                subject=EMAIL_JOB_DEADLINE_REMINDER_SUBJECT.format(1),
+                content=ANY,
+                idempotency_key="job-deadline-reminder:2024-11-05",
+            )
+            self.assertTrue(
+                mock_notify.call_args.kwargs["content"].startswith(
+                    EMAIL_JOB_DEADLINE_REMINDER_CONTENT
+                )
             )
         else:
-            mock_email.assert_not_called()
+            mock_notify.assert_not_called()
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_deadline_reminders_are_grouped_by_recipient(self):
+        """
+        A contractor with several jobs in the reminder windows gets one e-mail listing all of them.
+        """
+        # Arrange
+        contractor = UserFactory.create()
+        deadline = datetime.date(2024, 11, 6)
+        jobs = JobFactory.create_batch(
+            2, contractor=contractor, deadline=deadline, status=JobStatuses.ONGOING
+        )
+        jobs.append(
+            JobFactory.create(
+                contractor=contractor,
+                deadline=datetime.date(2024, 11, 12),
+                status=JobStatuses.WAITING,
+            )
+        )
+        other_job = JobFactory.create(deadline=deadline, status=JobStatuses.WAITING)
+        JobFactory.create(contractor=contractor, deadline=deadline, status=JobStatuses.CLOSED)
+
+        # Act
+        with freeze_time("2024-11-05"), self.captureOnCommitCallbacks(execute=True):
+            notified = jobs_deadline_reminders()
+
+        # Assert
+        self.assertEqual(notified, 2)
+        self.assertListEqual(
+            sorted(email.to[0] for email in mail.outbox),
+            sorted([contractor.email, other_job.contractor.email]),
+        )
+        email = next(email for email in mail.outbox if email.to == [contractor.email])
+        self.assertEqual(email.subject, EMAIL_JOB_DEADLINE_REMINDER_SUBJECT.format(3))
+        html_message = email.alternatives[0][0]
+        self.assertLess(
+            html_message.index("A week before the deadline"),
+            html_message.index("Tomorrow is the deadline"),
+        )
+        for job in jobs:
+            self.assertIn(reverse("jobs-job", kwargs={"job_pk": job.pk}), html_message)
+
+    @patch("jobs.reminders.notify")
+    def test_deadline_reminders_in_a_single_query(self, mock_notify):
+        """
+        All the policies are evaluated in one query of the jobs, whatever their number.
+        """
+        # Arrange
+        for days in (-1, 1, 8, 15):
+            JobFactory.create(
+                deadline=datetime.date(2024, 11, 5) - datetime.timedelta(days=days),
+                status=JobStatuses.WAITING,
+            )
+
+        # Act
+        with freeze_time("2024-11-05"), self.assertNumQueries(2):
+            jobs_deadline_reminders()
+
+        # Assert
+        self.assertEqual(mock_notify.call_count, 4)
 
     @parameterized.expand(
         [
-            ("2024-11-07", JobStatuses.READY_TO_STAKE_OUT, False),
-            ("2024-11-07", JobStatuses.FINISHED, False),
-            ("2024-11-08", JobStatuses.DATA_PASSED, True),
-            ("2024-11-08", JobStatuses.REFUSED, False),
+            (JobKinds.STAKING, True, True),
+            (JobKinds.INVENTORY, True, False),
+            (JobKinds.STAKING, False, False),
         ]
     )
-    @patch("jobs.tasks.send_email")
-    def test_jobs_overdue_deadline_principal(self, deadline, status, send_email, mock_email):
+    @patch("jobs.reminders.notify")
+    def test_deadline_reminders_of_a_kind_and_trade(self, kind, is_active, notified, mock_notify):
         """
-        Tests if the Principal of the job gets an e-mail (one day after deadline) that it has not been completed.
+        A policy limited to a kind and a trade reminds only about the jobs of that kind and trade.
         """
         # Arrange
         job = JobFactory.create(
-            deadline=datetime.datetime.strptime(deadline, "%Y-%m-%d").date(), status=status
+            kind=kind, deadline=datetime.date(2024, 11, 8), status=JobStatuses.ACCEPTED
+        )
+        JobFactory.create(
+            kind=JobKinds.STAKING,
+            trade=TradeFactory.create(
+                abbreviation=next(
+                    abbreviation
+                    for abbreviation in ALL_TRADES
+                    if abbreviation != job.trade.abbreviation
+                )
+            ),
+            deadline=datetime.date(2024, 11, 8),
+            status=JobStatuses.ACCEPTED,
+        )
+        ReminderPolicy.objects.create(
+            name="Three days before the deadline",
+            recipient="principal",
+            offset_days=-3,
+            kind=JobKinds.STAKING,
+            trade=job.trade,
+            is_active=is_active,
         )
 
         # Act
-        with freeze_time("2024-11-09"):
-            jobs_overdue_deadline_principal()
+        with freeze_time("2024-11-05"):
+            jobs_deadline_reminders()
 
         # Assert
-        if send_email:
-            mock_email.assert_called_once_with(
-                recipients=[job.principal.email],
-                subject=EMAIL_JOB_OVERDUE_DEADLINE_SUBJECT.format(job.pk),
-                content=EMAIL_JOB_OVERDUE_DEADLINE_CONTENT.format(job.pk),
-            )
+        if notified:
+            mock_notify.assert_called_once()
+            self.assertListEqual(mock_notify.call_args.kwargs["users"], [job.principal])
         else:
-            mock_email.assert_not_called()
+            mock_notify.assert_not_called()
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestFlushFileDownloads(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        job = JobFactory.create()
+        cls.job_file = JobFile.objects.create(content_object=job)
+        cls.other_job_file = JobFile.objects.create(content_object=job)
+
+    def setUp(self):
+        cache.clear()
+        self.time = timezone.now().replace(microsecond=0)
+
+    def test_downloads_are_written_in_bulk(self):
+        """
+        The latest buffered download of every file is written to the file at once.
+        """
+        # Arrange
+        record_download(self.job_file.pk, self.time - datetime.timedelta(minutes=2))
+        record_download(self.job_file.pk, self.time)
+        record_download(self.other_job_file.pk, self.time - datetime.timedelta(minutes=1))
+        record_download(self.job_file.pk, self.time - datetime.timedelta(minutes=1))
+
+        # Act
+        with self.assertNumQueries(1):
+            jobs_flush_file_downloads()
+
+        # Assert
+        self.job_file.refresh_from_db()
+        self.other_job_file.refresh_from_db()
+        self.assertEqual(self.job_file.last_download, self.time)
+        self.assertEqual(
+            self.other_job_file.last_download, self.time - datetime.timedelta(minutes=1)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_downloads(), 0)
+
+    def test_last_download_does_not_move_back(self):
+        """
+        An older buffered download does not overwrite a newer one.
+        """
+        # Arrange
+        JobFile.objects.filter(pk=self.job_file.pk).update(last_download=self.time)
+        record_download(self.job_file.pk, self.time - datetime.timedelta(hours=1))
+
+        # Act
+        flush_downloads()
+
+        # Assert
+        self.job_file.refresh_from_db()
+        self.assertEqual(self.job_file.last_download, self.time)
+
+    def test_download_being_recorded_waits_for_the_next_flush(self):
+        """
+        A download numbered, but not stored yet, stops the flush until the next one,
+        which skips it, if it is still missing.
+        """
+        # Arrange
+        record_download(self.job_file.pk, self.time)
+        # A download running during the flush, between the numbering and the storing
+        cache.incr(DOWNLOADS_SEQUENCE_KEY)
+
+        # Act
+        first_flush = flush_downloads()
+        cache.set(_entry_key(2), (self.other_job_file.pk, self.time))
+        second_flush = flush_downloads()
+        cache.incr(DOWNLOADS_SEQUENCE_KEY)
+        record_download(self.job_file.pk, self.time)
+        blocked_flush = flush_downloads()
+        third_flush = flush_downloads()
+
+        # Assert
+        self.assertEqual(first_flush, 1)
+        self.assertEqual(second_flush, 1)
+        self.assertEqual(blocked_flush, 0)
+        self.assertEqual(third_flush, 1)
+        self.assertEqual(cache.get(DOWNLOADS_FLUSHED_KEY), 4)
+        self.other_job_file.refresh_from_db()
+        self.assertEqual(self.other_job_file.last_download, self.time)
+
+
+class TestMakeThumbnails(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.jobs = JobFactory.create_batch(2)
+
+    def _attach(self, job, content, name):
+        return create_job_file(job, ContentFile(content, name=name))
+
+    def test_thumbnails_of_the_images(self):
+        """
+        The images get a small thumbnail next to the stored file, the other files are skipped.
+        """
+        # Arrange
+        photos = [self._attach(job, image_content(), "photo.png") for job in self.jobs]
+        document = self._attach(self.jobs[0], b"%PDF-1.7", "plan.pdf")
+
+        # Act
+        with self.assertNumQueries(2):
+            count = make_thumbnails([photo.pk for photo in photos] + [document.pk])
+
+        # Assert
+        self.assertEqual(count, 2)
+        for photo in photos:
+            photo.refresh_from_db()
+            self.assertEqual(photo.thumbnail.name, f"{photo.file.name}{JOBS_THUMBNAIL_SUFFIX}")
+        with Image.open(photos[0].thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.format, "JPEG")
+            self.assertEqual(thumbnail.size, (320, 240))
+        document.refresh_from_db()
+        self.assertEqual(document.thumbnail, "")
+
+    def test_thumbnails_are_made_once(self):
+        """
+        Making the thumbnails again neither renders nor changes anything.
+        """
+        # Arrange
+        photo = self._attach(self.jobs[0], image_content(image_format="JPEG"), "photo.jpg")
+        make_thumbnails([photo.pk])
+        photo.refresh_from_db()
+        modified = os.path.getmtime(photo.thumbnail.path)
+
+        # Act
+        with self.assertNumQueries(1):
+            count = make_thumbnails([photo.pk])
+
+        # Assert
+        self.assertEqual(count, 0)
+        self.assertEqual(os.path.getmtime(photo.thumbnail.path), modified)
+
+    def test_broken_image_has_no_thumbnail(self):
+        """
+        A file, which only looks like an image, is left without a thumbnail.
+        """
+        # Arrange
+        photo = self._attach(self.jobs[0], b"\x89PNG\r\n\x1a\nbroken", "photo.png")
+
+        # Act
+        count = make_thumbnails([photo.pk])
+
+        # Assert
+        self.assertEqual(count, 0)
+        self.assertListEqual(os.listdir(os.path.dirname(photo.file.path)), [photo.blob_id])
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_thumbnail_is_made_after_the_upload(self):
+        """
+        The thumbnail of a new image is made by a worker, once the file is committed.
+        """
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = self._attach(self.jobs[0], image_content(), "photo.png")
+
+        # Assert
+        photo.refresh_from_db()
+        self.assertTrue(os.path.exists(photo.thumbnail.path))
+
+    def test_upload_when_the_broker_is_down(self):
+        """
+        The file is saved without a thumbnail, if the broker is down, the command makes it later.
+        """
+        # Act
+        with patch("jobs.signals.jobs_make_thumbnails") as task:
+            task.delay.side_effect = OperationalError("Connection refused")
+            with self.captureOnCommitCallbacks(execute=True):
+                photo = self._attach(self.jobs[0], image_content(), "photo.png")
+
+        # Assert
+        task.delay.assert_called_once_with([photo.pk])
+        photo.refresh_from_db()
+        self.assertFalse(photo.thumbnail)
+
+    def test_task(self):
+        """
+        The task makes the thumbnails of a batch.
+        """
+        # Arrange
+        photo = self._attach(self.jobs[0], image_content(), "photo.png")
+
+        # Act
+        count = jobs_make_thumbnails([photo.pk])
+
+        # Assert
+        self.assertEqual(count, 1)
+
+
+class TestCleanFilesArchives(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        job = JobFactory.create()
+        self.job_file = create_job_file(job, ContentFile(b"km;x;y", "points.csv"))
+
+    @parameterized.expand([(60, 0), (4 * 24 * 60 * 60, 1)])
+    def test_clean_archives(self, age, expected_count):
+        """
+        Only the archives older than their links are removed.
+        """
+        # Arrange
+        name = build_archive([self.job_file.pk])
+        path = default_storage.path(name)
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+
+        # Act
+        count = clean_archives()
+
+        # Assert
+        self.assertEqual(count, expected_count)
+        self.assertEqual(os.path.exists(path), not expected_count)
+
+
+class TestAbortStaleUploads(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.upload = start_upload(JobFactory.create(), UserFactory.create(), "plan.pdf", 1000)
+
+    @parameterized.expand([(datetime.timedelta(days=1), 0), (datetime.timedelta(days=8), 1)])
+    def test_abort_stale_uploads(self, age, expected_count):
+        """
+        Only the uploads without a chunk for longer than the max age are removed with their files.
+        """
+        # Arrange
+        JobFileUpload.objects.update(updated=timezone.now() - age)
+        path = default_storage.path(self.upload.path)
+
+        # Act
+        count = jobs_abort_stale_uploads()
+
+        # Assert
+        self.assertEqual(count, expected_count)
+        self.assertEqual(JobFileUpload.objects.exists(), not expected_count)
+        self.assertEqual(os.path.exists(path), not expected_count)
@@ -1,32 +1,56 @@
+import csv
 import datetime
+import io
+import re
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
 from unittest import mock
 from urllib.parse import urlencode
+from xml.etree import ElementTree
 
 from django.contrib.messages import get_messages
 from django.core import mail
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, DatabaseError
 from django.test import Client, override_settings, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
 from parameterized import parameterized
 
+from jobs.blobs import create_job_file
 from jobs.consts import (
     EMAIL_JOB_CHANGE_CONTRACTOR_SUBJECT,
     EMAIL_JOB_CHANGE_STATUS_SUBJECT,
     EMAIL_JOB_CREATE_SUBJECT,
+    EMAIL_JOBS_ARCHIVE_SUBJECT,
     JOB_CREATE_SUCCESS_MESSAGE,
     JOB_SAVE_SUCCESS_MESSAGE,
     JobKinds,
+    JOBS_ARCHIVE_QUEUED_MESSAGE,
+    JOBS_ARCHIVE_UNAVAILABLE_MESSAGE,
     JOBS_PER_PAGE,
     JobStatuses,
+    RANGE_FORM_ERROR,
 )
-from jobs.models import Job
-from jobs.tests.factories import JobFactory
+from jobs.downloads import flush_downloads
+from jobs.forms import JobViewForm
+from jobs.fragments import get_fragment_stats, get_fragment_versions
+from jobs.models import Job, JobFile, JOBS_IN_PROGRESS_STATUSES
+from jobs.paginators import get_count_version
+from jobs.tests.factories import image_content, JobFactory
+from jobs.tests.mixins import QueryBudgetMixin
+from jobs.thumbnails import make_thumbnails
 from trades.factories import TradeFactory
-from users.models import SITE_MANAGER, SURVEYOR
+from users.models import EmailOutbox, NotificationEvent, SITE_MANAGER, SURVEYOR
 from users.tests.factories import UserFactory
 
 
-class TestJobsAll(TestCase):
+class TestJobsAll(QueryBudgetMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
         cls.url = reverse("jobs-all")
@@ -125,6 +149,436 @@ class TestJobsAll(TestCase):
             tuple(response.context["jobs"].values_list("pk", flat=True)), expected_jobs_pk
         )
 
+    @parameterized.expand([("page", "", 6), ("cursor", "&cursor=", 5)])
+    def test_get_query_budget(self, _, pagination, queries_budget):
+        """
+        The number of queries does not depend on the number of jobs on the page.
+        The filter panel costs two queries - the trades and the users.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        for job in JobFactory.create_batch(size=JOBS_PER_PAGE):
+            JobFile.objects.create(content_object=job)
+
+        # Act
+        with self.assertMaxNumQueries(queries_budget):
+            response = self.client.get(f"{self.url}?order_by=-pk{pagination}")
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "<td>Yes</td>", count=JOBS_PER_PAGE)
+
+    def test_get_jobs_all_count_is_cached(self):
+        """
+        The number of jobs is counted once and then read from the cache,
+        until a job is created or deleted.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        JobFactory.create_batch(size=JOBS_PER_PAGE + 1)
+        self.client.get(self.url)
+
+        # Act
+        with CaptureQueriesContext(connection) as cached_queries:
+            response_cached = self.client.get(f"{self.url}?page=2")
+        JobFactory.create()
+        response_created = self.client.get(self.url)
+        Job.objects.first().delete()
+        response_deleted = self.client.get(self.url)
+
+        # Assert
+        self.assertFalse(any("COUNT" in query["sql"] for query in cached_queries))
+        self.assertEqual(response_cached.context["paginator"].count, JOBS_PER_PAGE + 1)
+        self.assertEqual(response_created.context["paginator"].count, JOBS_PER_PAGE + 2)
+        self.assertEqual(response_deleted.context["paginator"].count, JOBS_PER_PAGE + 1)
+
+    def test_count_cached_before_the_commit_is_not_kept(self):
+        """
+        A count cached by another request, before a new job is committed,
+        is not read after the commit.
+        """
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            JobFactory.create()
+            # Another request caches the count without the new job under this version
+            version_before_commit = get_count_version(Job)
+
+        # Assert
+        self.assertNotEqual(get_count_version(Job), version_before_commit)
+
+    def test_get_job_rows_are_cached(self):
+        """
+        The rendered job rows are read from the cache until the job or its contractor changes.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        job, other_job = JobFactory.create_batch(size=2)
+        self.client.get(self.url)
+        hits_before, misses_before = get_fragment_stats()
+
+        # Act
+        self.client.get(self.url)
+        hits_cached, misses_cached = get_fragment_stats()
+        job.contractor.last_name = "Świtaj"
+        job.contractor.save()
+        response = self.client.get(self.url)
+        hits_changed, misses_changed = get_fragment_stats()
+
+        # Assert
+        self.assertEqual((hits_before, misses_before), (0, 2))
+        self.assertEqual((hits_cached, misses_cached), (2, 2))
+        self.assertEqual((hits_changed, misses_changed), (3, 3))
+        self.assertContains(response, job.contractor.get_full_name())
+
+    def test_row_rendered_before_the_commit_is_not_kept(self):
+        """
+        A job row rendered by another request, before the change of the job is committed,
+        is not read after the commit.
+        """
+        # Arrange
+        job = JobFactory.create()
+        key = f"fragment-version:jobs.job:{job.pk}"
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            job.save()
+            # Another request caches the old row under this version
+            version_before_commit = get_fragment_versions([key])[key]
+
+        # Assert
+        self.assertNotEqual(get_fragment_versions([key])[key], version_before_commit)
+
+    def test_get_search(self):
+        """
+        Only the jobs found by the full-text search are shown, with the found words marked.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        job = JobFactory.create(description="Stake out the axis of the track.")
+        JobFactory.create(description="Inventory of the drainage.", comments="")
+
+        # Act
+        response = self.client.get(self.url, {"q": "staking"})
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_object"]), [job])
+        self.assertContains(response, "<mark>Stake</mark> out the axis of the track")
+
+    @parameterized.expand(
+        [
+            ("status", {"status": JobStatuses.ACCEPTED}),
+            ("open_only", {"open_only": "on"}),
+            ("kind", {"kind": JobKinds.INVENTORY}),
+            ("deadline", {"deadline_from": "2024-11-02", "deadline_to": "2024-11-03"}),
+            ("created", {"created_to": "2024-10-31"}),
+        ]
+    )
+    def test_get_filter(self, _, filters):
+        """
+        Only the jobs matching the filters are shown.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        job = JobFactory.create(
+            status=JobStatuses.ACCEPTED,
+            kind=JobKinds.INVENTORY,
+            deadline=datetime.date(2024, 11, 3),
+        )
+        other_job = JobFactory.create(
+            status=JobStatuses.CLOSED,
+            kind=JobKinds.STAKING,
+            deadline=datetime.date(2024, 11, 4),
+        )
+        Job.objects.filter(pk=job.pk).update(
+            created=timezone.make_aware(datetime.datetime(2024, 10, 31, 23, 30))
+        )
+        Job.objects.filter(pk=other_job.pk).update(
+            created=timezone.make_aware(datetime.datetime(2024, 11, 1, 0, 30))
+        )
+
+        # Act
+        response = self.client.get(self.url, filters)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_object"]), [job])
+        self.assertEqual(response.context["paginator"].count, 1)
+
+    def test_get_filter_by_users_and_trade(self):
+        """
+        The principal, contractor and trade filters can be combined.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        job = JobFactory.create()
+        JobFactory.create(principal=job.principal, trade=job.trade)
+        JobFactory.create(contractor=job.contractor)
+        filters = {"principal": job.principal.pk, "contractor": job.contractor.pk}
+
+        # Act
+        response = self.client.get(self.url, {**filters, "trade": job.trade.pk})
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_object"]), [job])
+
+    def test_get_filter_by_chainage(self):
+        """
+        Only the jobs of the trade which touch the chainage range are shown.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        job = JobFactory.create(km_from="124.500", km_to=None)
+        JobFactory.create(trade=job.trade, km_from="125.100", km_to="126.000")
+        filters = {"trade": job.trade.pk, "km_from": "123+400", "km_to": "125+000"}
+
+        # Act
+        response = self.client.get(self.url, filters)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_object"]), [job])
+
+    def test_get_filter_is_carried_over_to_the_links(self):
+        """
+        The sort and pagination links keep the filters, but not the previous page or sort.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        JobFactory.create_batch(size=JOBS_PER_PAGE + 1, status=JobStatuses.WAITING)
+
+        # Act
+        response = self.client.get(
+            self.url, {"status": JobStatuses.WAITING, "order_by": "pk", "page": 1}
+        )
+
+        # Assert
+        self.assertEqual(response.context["querystring"], "status=waiting")
+        self.assertContains(response, 'href="?page=2&order_by=pk&status=waiting"')
+        self.assertContains(response, 'href="?order_by=-deadline&status=waiting"')
+
+    def test_get_filter_invalid(self):
+        """
+        No jobs are shown for invalid filters and the errors are displayed.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        JobFactory.create()
+
+        # Act
+        response = self.client.get(
+            self.url, {"deadline_from": "2024-11-02", "deadline_to": "2024-11-01"}
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page_object"]), 0)
+        self.assertContains(response, RANGE_FORM_ERROR)
+
+    def test_get_sort_unsupported_field(self):
+        """
+        Sorting by a field which is not on the list of the supported fields is rejected.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+
+        # Act
+        response = self.client.get(f"{self.url}?order_by=comments")
+
+        # Assert
+        self.assertEqual(response.status_code, 400)
+
+    @parameterized.expand(["pk", "-pk", "description", "-deadline", "created", "-created"])
+    def test_get_cursor_pagination(self, field_name):
+        """
+        Checks if the cursor pagination walks through all the jobs forward and backward,
+        keeping the order of the chosen sort.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        JobFactory.create_batch(size=JOBS_PER_PAGE * 2 + 1, description="The same description")
+        ordering = ("pk",) if field_name.endswith("pk") else (field_name, "pk")
+        if field_name.startswith("-"):
+            ordering = tuple(f"-{field.lstrip('-')}" for field in ordering)
+        expected_jobs_pk = list(Job.objects.order_by(*ordering).values_list("pk", flat=True))
+
+        # Act
+        pages = []
+        response = self.client.get(f"{self.url}?order_by={field_name}&cursor=")
+        pages.append(response)
+        while response.context["page_object"].has_next():
+            next_cursor = response.context["page_object"].next_cursor
+            response = self.client.get(f"{self.url}?order_by={field_name}&cursor={next_cursor}")
+            pages.append(response)
+        previous_cursor = pages[-1].context["page_object"].previous_cursor
+        response_back = self.client.get(
+            f"{self.url}?order_by={field_name}&cursor={previous_cursor}"
+        )
+
+        # Assert
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(all(page.status_code == 200 for page in pages))
+        self.assertEqual(
+            [job.pk for page in pages for job in page.context["page_object"]], expected_jobs_pk
+        )
+        self.assertFalse(pages[0].context["page_object"].has_previous())
+        self.assertEqual(
+            [job.pk for job in response_back.context["page_object"]],
+            expected_jobs_pk[JOBS_PER_PAGE : JOBS_PER_PAGE * 2],
+        )
+
+    def test_get_cursor_pagination_invalid_cursor(self):
+        """
+        An invalid cursor shows the first page.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        jobs = JobFactory.create_batch(size=2)
+
+        # Act
+        response = self.client.get(f"{self.url}?order_by=pk&cursor=not-a-cursor")
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_object"]), jobs)
+
+
+class TestJobsExport(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create(is_active=True)
+        cls.job = JobFactory.create(
+            status=JobStatuses.MAKING_DOCUMENTS,
+            kind=JobKinds.INVENTORY,
+            description="=SUM(A1:A2) of the bridge",
+            km_from=Decimal("123.400"),
+            km_to=None,
+            deadline=datetime.date(2024, 11, 3),
+        )
+        JobFile.objects.create(content_object=cls.job)
+        cls.other_job = JobFactory.create(status=JobStatuses.WAITING)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_get_not_logged_in_user_cannot_export(self):
+        """
+        Not logged-in user is not allowed to export the jobs.
+        """
+        # Arrange
+        url = reverse("jobs-export", kwargs={"file_format": "csv"})
+
+        # Act
+        response = self.client.get(url)
+
+        # Assert
+        self.assertEqual(response.status_code, 302)
+
+    def test_get_csv(self):
+        """
+        The filtered jobs are streamed as a CSV file, formatted like in the jobs list.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        url = reverse("jobs-export", kwargs={"file_format": "csv"})
+
+        # Act
+        response = self.client.get(url, {"status": JobStatuses.MAKING_DOCUMENTS})
+        content = b"".join(response.streaming_content).decode()
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        self.assertTrue(content.startswith("\ufeffID,Principal,Contractor,Status,"))
+        rows = list(csv.reader(io.StringIO(content.removeprefix("\ufeff"))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            rows[1][:10],
+            [
+                str(self.job.pk),
+                self.job.principal.get_full_name(),
+                self.job.contractor.get_full_name(),
+                "Making documents",
+                "As-built inventory",
+                "'=SUM(A1:A2) of the bridge",
+                "03.11.2024",
+                "123+400",
+                "-",
+                str(self.job.trade),
+            ],
+        )
+        self.assertEqual(rows[1][12], "Yes")
+
+    def test_get_xlsx(self):
+        """
+        The jobs are streamed as an XLSX file, sorted like in the jobs list.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        url = reverse("jobs-export", kwargs={"file_format": "xlsx"})
+
+        # Act
+        response = self.client.get(url, {"order_by": "-pk"})
+        content = b"".join(response.streaming_content)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        namespace = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        rows = sheet.findall("x:sheetData/x:row", namespace)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            [row.find("x:c/x:v", namespace).text for row in rows[1:]],
+            [str(self.other_job.pk), str(self.job.pk)],
+        )
+        self.assertEqual(
+            [text.text for text in rows[2].iterfind("x:c/x:is/x:t", namespace)][5:7],
+            ["03.11.2024", "123+400"],
+        )
+
+    @mock.patch("jobs.exports.JOBS_EXPORT_CHUNK_SIZE", 2)
+    def test_get_csv_is_streamed_in_chunks(self):
+        """
+        The jobs are read with a server-side cursor and sent in chunks of rows.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        JobFactory.create_batch(size=3)
+        url = reverse("jobs-export", kwargs={"file_format": "csv"})
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            chunks = list(response.streaming_content)
+
+        # Assert
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(any("DECLARE" in query["sql"] for query in queries))
+
+    @parameterized.expand(
+        [
+            ("order_by", {"order_by": "comments"}),
+            ("filter", {"deadline_from": "2024-11-02", "deadline_to": "2024-11-01"}),
+        ]
+    )
+    def test_get_invalid_parameters(self, _, params):
+        """
+        The export with an unsupported sort or invalid filters is rejected.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        url = reverse("jobs-export", kwargs={"file_format": "csv"})
+
+        # Act
+        response = self.client.get(url, params)
+
+        # Assert
+        self.assertEqual(response.status_code, 400)
+
 
 class TestJobsCreate(TestCase):
     @classmethod
@@ -194,7 +648,8 @@ class TestJobsCreate(TestCase):
         data = job_data | file_data
 
         # Act
-        response = self.client.post(path=self.url, data=data)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(path=self.url, data=data)
         response_messages = list(get_messages(response.wsgi_request))
 
         # Assert
@@ -210,8 +665,36 @@ class TestJobsCreate(TestCase):
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, EMAIL_JOB_CREATE_SUBJECT)
 
+    @mock.patch("jobs.views.create_job_file", side_effect=DatabaseError)
+    def test_failed_create_queues_no_notification(self, mock_create_job_file):
+        """
+        If the files of a new job cannot be saved, neither the job nor its notification is kept.
+        """
+        # Arrange
+        self.client.force_login(user=self.principal)
+        data = {
+            "principal": self.principal.pk,
+            "contractor": self.surveyor.pk,
+            "kind": JobKinds.STAKING,
+            "trade": self.trade.pk,
+            "description": "Please stake the track axis out.",
+            "km_from": "19.000",
+            "km_to": "19.750",
+            "deadline": datetime.date.today() + datetime.timedelta(days=3),
+            "file": [self.file1],
+        }
+
+        # Act
+        with self.assertRaises(DatabaseError):
+            self.client.post(path=self.url, data=data)
+
+        # Assert
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertFalse(NotificationEvent.objects.exists())
+
 
-class TestJobView(TestCase):
+class TestJobView(QueryBudgetMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
         cls.principal = UserFactory.create(is_active=True, role=SITE_MANAGER)
@@ -268,8 +751,25 @@ class TestJobView(TestCase):
                 self.assertIn("disabled", form["status"].as_text())
                 self.assertIn("disabled", form["comments"].as_textarea())
 
-    @mock.patch("jobs.views.send_email")
-    def test_update_a_job_and_send_emails(self, mock_email):
+    def test_get_query_budget(self):
+        """
+        The related users, the trade and the attachments are fetched in a constant number of queries.
+        """
+        # Arrange
+        self.client.force_login(user=self.contractor)
+        JobFile.objects.create(content_object=self.job)
+        JobFile.objects.create(content_object=self.job)
+
+        # Act
+        with self.assertMaxNumQueries(7):
+            response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["attachments"]), 2)
+
+    @mock.patch("jobs.views.notify")
+    def test_update_a_job_and_send_emails(self, mock_notify):
         """
         Contractor changes the job status, person assigned to this job and adds a comment.
         """
@@ -296,25 +796,42 @@ class TestJobView(TestCase):
         self.assertEqual(job.status, JobStatuses.READY_TO_STAKE_OUT)
         self.assertEqual(job.comments, data["comments"])
 
-        mock_email.assert_has_calls(
+        mock_notify.assert_has_calls(
             [
                 # Change status -> e-mail to the Principal
                 mock.call(
-                    recipients=[self.principal.email],
+                    users=[self.principal],
                     subject=EMAIL_JOB_CHANGE_STATUS_SUBJECT.format(self.job.pk),
                     content=mock.ANY,
                 ),
                 # Change Contractor -> e-mail to the new Contractor
                 mock.call(
-                    recipients=[self.new_contractor.email],
+                    users=[self.new_contractor],
                     subject=EMAIL_JOB_CHANGE_CONTRACTOR_SUBJECT.format(self.job.pk),
                     content=mock.ANY,
                 ),
             ]
         )
 
+    @mock.patch.object(JobViewForm, "save", side_effect=DatabaseError)
+    def test_failed_save_queues_no_notification(self, mock_save):
+        """
+        If the change of a job cannot be saved, no e-mail or digest event is queued about it.
+        """
+        # Arrange
+        self.client.force_login(user=self.contractor)
+        data = {"contractor": self.new_contractor.pk, "status": JobStatuses.READY_TO_STAKE_OUT}
+
+        # Act
+        with self.assertRaises(DatabaseError):
+            self.client.post(path=self.url, data=data)
+
+        # Assert
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertFalse(NotificationEvent.objects.exists())
+
 
-class TestMyJobsView(TestCase):
+class TestMyJobsView(QueryBudgetMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
         cls.principal = UserFactory.create(is_active=True)
@@ -417,3 +934,472 @@ class TestMyJobsView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("jobs", response.context)
         self.assertEqual(response.context["jobs"].count(), count)
+
+    @parameterized.expand([("principal", "data_passed"), ("contractor", "in_progress")])
+    def test_get_query_budget(self, role, status):
+        """
+        The number of queries does not depend on the number of the user jobs.
+        """
+        # Arrange
+        user = getattr(self, role)
+        self.client.force_login(user=user)
+        session = self.client.session
+        session.update({"role": role})
+        session.save()
+
+        # Act
+        with self.assertMaxNumQueries(4):
+            response = self.client.get(reverse("jobs-my-jobs", kwargs={"status": status}))
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch("jobs.views.JOBS_PER_PAGE", 2)
+    def test_get_pages(self):
+        """
+        The jobs are paginated by the cursor, the newest first.
+        """
+        # Arrange
+        self.client.force_login(user=self.contractor)
+        session = self.client.session
+        session.update({"role": "contractor"})
+        session.save()
+        url = reverse("jobs-my-jobs", kwargs={"status": "in_progress"})
+        expected_pks = list(
+            Job.objects.filter(contractor=self.contractor, status__in=JOBS_IN_PROGRESS_STATUSES)
+            .values_list("pk", flat=True)
+            .order_by("-pk")
+        )
+
+        # Act
+        pks = []
+        pages = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {"cursor": cursor} if cursor else {})
+            page_object = response.context["page_object"]
+            pages.append(page_object)
+            pks.extend(job.pk for job in page_object)
+            if not page_object.has_next():
+                break
+            cursor = page_object.next_cursor
+
+        # Assert
+        self.assertListEqual(pks, expected_pks)
+        self.assertEqual(len(pages), 4)
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+        self.assertContains(response, f"?cursor={pages[-1].previous_cursor}")
+
+    @parameterized.expand([("principal",), ("contractor",)])
+    def test_jobs_match_role_status_index(self, role):
+        """
+        A page of the user jobs in a status filters on the leading columns of the
+        (role user, status, -pk) index and is ordered by its last column.
+        """
+        # Arrange
+        user = getattr(self, role)
+        self.client.force_login(user=user)
+        session = self.client.session
+        session.update({"role": role})
+        session.save()
+        index = next(
+            index for index in Job._meta.indexes if index.name == f"jobs_job_{role}_status_idx"
+        )
+
+        # Act
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("jobs-my-jobs", kwargs={"status": JobStatuses.WAITING}))
+
+        # Assert
+        self.assertListEqual(index.fields, [role, "status", "-id"])
+        page_sql = next(
+            query["sql"]
+            for query in context
+            if query["sql"].startswith('SELECT "jobs_job"."id"') and "LIMIT" in query["sql"]
+        )
+        self.assertIn(f'"jobs_job"."{role}_id" = {user.pk}', page_sql)
+        self.assertIn(f'"jobs_job"."status" = \'{JobStatuses.WAITING}\'', page_sql)
+        self.assertIn('ORDER BY "jobs_job"."id" DESC', page_sql)
+
+    @parameterized.expand(
+        [
+            ("principal", "data_passed", 3, {"waiting": 2, "in_progress": 5, "closed": 0}),
+            ("contractor", "in_progress", 7, {"waiting": 1, "in_progress": 7, "closed": 1}),
+        ]
+    )
+    def test_get_tab_badges(self, role, status, jobs_count, expected_counts):
+        """
+        The tabs show the numbers of the user jobs in the chosen role, read from the counters.
+        """
+        # Arrange
+        user = getattr(self, role)
+        self.client.force_login(user=user)
+        session = self.client.session
+        session.update({"role": role})
+        session.save()
+
+        # Act
+        response = self.client.get(reverse("jobs-my-jobs", kwargs={"status": status}))
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["jobs_count"], jobs_count)
+        for tab, count in expected_counts.items():
+            self.assertEqual(response.context["status_counts"][tab], count)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestJobFileDownload(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create(is_active=True)
+        cls.content = b"0123456789"
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.job_file = JobFile.objects.create(
+            content_object=JobFactory.create(), file=SimpleUploadedFile("plan.pdf", self.content)
+        )
+        self.url = reverse("jobs-file-download", kwargs={"job_file_pk": self.job_file.pk})
+        self.client = Client()
+        self.client.force_login(user=self.user)
+
+    def test_get_not_logged_in_user_cannot_download(self):
+        """
+        Not logged-in user is not allowed to download the files.
+        """
+        # Arrange
+        self.client.logout()
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertRedirects(response, f"{reverse('login')}?{urlencode({'next': self.url})}")
+
+    def test_download(self):
+        """
+        The file is sent as an attachment and the download is buffered, not written.
+        """
+        # Act
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="plan.pdf"')
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.job_file.refresh_from_db()
+        self.assertIsNone(self.job_file.last_download)
+        self.assertEqual(flush_downloads(), 1)
+
+    @parameterized.expand(
+        [
+            ("start_end", "bytes=2-5", b"2345", "bytes 2-5/10"),
+            ("open_end", "bytes=7-", b"789", "bytes 7-9/10"),
+            ("suffix", "bytes=-3", b"789", "bytes 7-9/10"),
+            ("end_past_size", "bytes=8-100", b"89", "bytes 8-9/10"),
+        ]
+    )
+    def test_download_range(self, _, range_header, expected_content, expected_range):
+        """
+        A single byte range of the file is sent, so a download can be resumed.
+        """
+        # Act
+        response = self.client.get(self.url, HTTP_RANGE=range_header)
+
+        # Assert
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), expected_content)
+        self.assertEqual(response["Content-Range"], expected_range)
+        self.assertEqual(response["Content-Length"], str(len(expected_content)))
+
+    def test_download_range_not_satisfiable(self):
+        """
+        A range after the end of the file is refused.
+        """
+        # Act
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-")
+
+        # Assert
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    @parameterized.expand(
+        [
+            ("x-accel-redirect", "X-Accel-Redirect", "/protected-media/jobfiles/job_{:06d}/plan"),
+            ("x-sendfile", "X-Sendfile", "/jobfiles/job_{:06d}/plan"),
+        ]
+    )
+    def test_download_by_the_web_server(self, backend, header, expected_path):
+        """
+        With a sendfile backend, only the headers are sent and the web server sends the file.
+        """
+        # Act
+        with override_settings(JOBS_FILES_SENDFILE=backend):
+            response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertIn(expected_path.format(self.job_file.job_id), response[header])
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="plan.pdf"')
+
+
+class TestJobFileThumbnail(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create(is_active=True)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.job = JobFactory.create()
+        self.photo = create_job_file(self.job, ContentFile(image_content(), "photo.png"))
+        make_thumbnails([self.photo.pk])
+        self.url = reverse("jobs-file-thumbnail", kwargs={"job_file_pk": self.photo.pk})
+        self.client = Client()
+        self.client.force_login(user=self.user)
+
+    def test_thumbnail(self):
+        """
+        The thumbnail is sent inline and kept by the browser.
+        """
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="photo.thumb.jpg"')
+        self.assertIn("max-age=604800", response["Cache-Control"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"\xff\xd8\xff"))
+
+    def test_no_thumbnail(self):
+        """
+        A file without a thumbnail has no thumbnail page.
+        """
+        # Arrange
+        document = create_job_file(self.job, ContentFile(b"%PDF-1.7", "plan.pdf"))
+
+        # Act
+        response = self.client.get(
+            reverse("jobs-file-thumbnail", kwargs={"job_file_pk": document.pk})
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, 404)
+
+    def test_job_page_shows_lazy_thumbnails(self):
+        """
+        The job page shows the thumbnails of the images, loaded when they are scrolled to.
+        """
+        # Act
+        response = self.client.get(reverse("jobs-job", kwargs={"job_pk": self.job.pk}))
+
+        # Assert
+        self.assertContains(response, f'<img src="{self.url}" alt="photo.png"')
+        self.assertContains(response, 'loading="lazy"', count=1)
+
+
+class TestJobFilesArchive(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create(is_active=True)
+        cls.other_user = UserFactory.create(is_active=True)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.job = JobFactory.create(status=JobStatuses.WAITING)
+        self.other_job = JobFactory.create(status=JobStatuses.ONGOING)
+        create_job_file(self.job, ContentFile(b"km;x;y\n" * 100, "points.csv"))
+        create_job_file(self.job, ContentFile(image_content(), "photo.png"))
+        create_job_file(self.job, ContentFile(image_content(), "photo.png"))
+        create_job_file(self.other_job, ContentFile(b"%PDF-1.7", "plan.pdf"))
+        self.client = Client()
+        self.client.force_login(user=self.user)
+
+    @staticmethod
+    def read_archive(response):
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    @staticmethod
+    def emailed_link():
+        html_message = mail.outbox[0].alternatives[0][0]
+        return re.search(r"href=https?://[^/]+([^\s>]+)", html_message).group(1)
+
+    def test_get_not_logged_in_user_cannot_download(self):
+        """
+        Not logged-in user is not allowed to download the archive.
+        """
+        # Arrange
+        self.client.logout()
+
+        # Act
+        response = self.client.get(
+            reverse("jobs-job-files-archive", kwargs={"job_pk": self.job.pk})
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, 302)
+
+    def test_get_job_archive(self):
+        """
+        The files of the job are streamed as a ZIP archive, the compressed formats are stored.
+        """
+        # Act
+        response = self.client.get(
+            reverse("jobs-job-files-archive", kwargs={"job_pk": self.job.pk})
+        )
+        archive = self.read_archive(response)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertEqual(
+            response["Content-Disposition"],
+            f'attachment; filename="job_{self.job.pk:06d}_files.zip"',
+        )
+        self.assertIsNone(archive.testzip())
+        folder = f"job_{self.job.pk:06d}"
+        self.assertEqual(
+            archive.namelist(),
+            [f"{folder}/points.csv", f"{folder}/photo.png", f"{folder}/photo (2).png"],
+        )
+        self.assertEqual(archive.read(f"{folder}/points.csv"), b"km;x;y\n" * 100)
+        self.assertEqual(
+            archive.getinfo(f"{folder}/points.csv").compress_type, zipfile.ZIP_DEFLATED
+        )
+        self.assertEqual(archive.getinfo(f"{folder}/photo.png").compress_type, zipfile.ZIP_STORED)
+
+    def test_get_filtered_jobs_archive(self):
+        """
+        The archive of the jobs list has the files of the filtered jobs only.
+        """
+        # Act
+        response = self.client.get(reverse("jobs-files-archive"), {"status": JobStatuses.ONGOING})
+        archive = self.read_archive(response)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(archive.namelist(), [f"job_{self.other_job.pk:06d}/plan.pdf"])
+
+    def test_get_missing_file_is_skipped(self):
+        """
+        A file missing in the storage is left out of the archive.
+        """
+        # Arrange
+        JobFile.objects.filter(job=self.other_job).get().file.delete(save=False)
+
+        # Act
+        response = self.client.get(reverse("jobs-files-archive"))
+        archive = self.read_archive(response)
+
+        # Assert
+        self.assertEqual(len(archive.namelist()), 3)
+
+    def test_get_invalid_sort(self):
+        """
+        The archive of the jobs list is not sent for an unknown sort.
+        """
+        # Act
+        response = self.client.get(reverse("jobs-files-archive"), {"order_by": "password"})
+
+        # Assert
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    @mock.patch("jobs.archives.JOBS_ARCHIVE_STREAM_MAX_FILES", 2)
+    def test_get_large_archive_is_sent_by_email(self):
+        """
+        Too many files are archived by a worker and the user gets the link by an e-mail.
+        """
+        # Arrange
+        url = reverse("jobs-job-files-archive", kwargs={"job_pk": self.job.pk})
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(url, follow=True)
+        download_url = self.emailed_link()
+        download = self.client.get(download_url)
+
+        # Assert
+        self.assertRedirects(response, reverse("jobs-job", kwargs={"job_pk": self.job.pk}))
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            [JOBS_ARCHIVE_QUEUED_MESSAGE],
+        )
+        self.assertEqual(mail.outbox[0].subject, EMAIL_JOBS_ARCHIVE_SUBJECT)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(
+            download["Content-Disposition"],
+            f'attachment; filename="job_{self.job.pk:06d}_files.zip"',
+        )
+        self.assertEqual(len(self.read_archive(download).namelist()), 3)
+
+    @mock.patch("jobs.archives.JOBS_ARCHIVE_STREAM_MAX_FILES", 2)
+    def test_get_large_archive_when_the_broker_is_down(self):
+        """
+        The user is sent back with an error, if the large archive cannot be sent to a worker.
+        """
+        # Arrange
+        url = reverse("jobs-job-files-archive", kwargs={"job_pk": self.job.pk})
+
+        # Act
+        with mock.patch("jobs.views.jobs_send_files_archive") as task:
+            task.delay.side_effect = OperationalError("Connection refused")
+            response = self.client.get(url, follow=True)
+
+        # Assert
+        self.assertRedirects(response, reverse("jobs-job", kwargs={"job_pk": self.job.pk}))
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            [JOBS_ARCHIVE_UNAVAILABLE_MESSAGE],
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    @mock.patch("jobs.archives.JOBS_ARCHIVE_STREAM_MAX_SIZE", 1000)
+    def test_get_large_file_without_a_blob_is_sent_by_email(self):
+        """
+        The size of a file stored before the blobs is taken from the storage.
+        """
+        # Arrange
+        job_file = JobFile(job=self.other_job, content_object=self.other_job)
+        job_file.file.save("scan.tif", ContentFile(b"II*\x00" + b"x" * 1000))
+        url = reverse("jobs-job-files-archive", kwargs={"job_pk": self.other_job.pk})
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(url)
+
+        # Assert
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox[0].subject, EMAIL_JOBS_ARCHIVE_SUBJECT)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    @mock.patch("jobs.archives.JOBS_ARCHIVE_STREAM_MAX_FILES", 2)
+    def test_get_built_archive_of_another_user(self):
+        """
+        The link of a built archive does not work for another user.
+        """
+        # Arrange
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("jobs-job-files-archive", kwargs={"job_pk": self.job.pk}))
+        download_url = self.emailed_link()
+        self.client.force_login(user=self.other_user)
+
+        # Act
+        response = self.client.get(download_url)
+
+        # Assert
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,106 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
+from PIL import Image, ImageOps
+
+from jobs.consts import (
+    JOBS_THUMBNAIL_EXTENSIONS,
+    JOBS_THUMBNAIL_QUALITY,
+    JOBS_THUMBNAIL_SIZE,
+    JOBS_THUMBNAIL_SUFFIX,
+    JOBS_THUMBNAIL_WORKERS,
+)
+from jobs.models import JobFile
+from jobs.storage import blob_storage
+
+IMAGE_NAME_REGEX = r"\.({})$".format("|".join(JOBS_THUMBNAIL_EXTENSIONS))
+
+
+def is_image(name):
+    return name.rpartition(".")[2].lower() in JOBS_THUMBNAIL_EXTENSIONS
+
+
+def thumbnail_name(name):
+    return f"{name}{JOBS_THUMBNAIL_SUFFIX}"
+
+
+def pending_thumbnails():
+    """
+    Return the image attachments without a thumbnail, one per stored file, in the order of pks.
+    """
+    first_per_file = (
+        JobFile.objects.filter(thumbnail="")
+        .exclude(file="")
+        .filter(Q(name__iregex=IMAGE_NAME_REGEX) | Q(name="", file__iregex=IMAGE_NAME_REGEX))
+        .order_by("file", "pk")
+        .distinct("file")
+        .values("pk")
+    )
+    return JobFile.objects.filter(pk__in=first_per_file).order_by("pk")
+
+
+def render_thumbnail(name):
+    """
+    Write the thumbnail of a stored image next to it, unless it is there already.
+
+    The JPEG images are decoded right at a reduced scale. The thumbnail is written
+    to a temporary file and moved in place, so a thumbnail is never seen half written.
+
+    :param str name: the name of the stored image
+    :return: the name of the thumbnail or None, if the file is not a readable image
+    """
+    target_name = thumbnail_name(name)
+    target = blob_storage.path(target_name)
+    if os.path.exists(target):
+        return target_name
+    try:
+        with Image.open(blob_storage.path(name)) as image:
+            image.draft("RGB", JOBS_THUMBNAIL_SIZE)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(JOBS_THUMBNAIL_SIZE)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            descriptor, path = tempfile.mkstemp(dir=os.path.dirname(target))
+            try:
+                with os.fdopen(descriptor, "wb") as file:
+                    image.save(file, "JPEG", quality=JOBS_THUMBNAIL_QUALITY, optimize=True)
+                os.replace(path, target)
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return target_name
+
+
+def make_thumbnails(job_file_pks, workers=JOBS_THUMBNAIL_WORKERS):
+    """
+    Make the thumbnails of a batch of job files, at most `workers` at a time.
+
+    It is safe to run again: the existing thumbnails are not rendered twice. Every job file
+    sharing a stored image gets its thumbnail.
+
+    :param job_file_pks: the pks of the job files, the ones which are not images are skipped
+    :param int workers: the number of the images rendered in parallel
+    :return: the number of the job files which got a thumbnail
+    """
+    names = {
+        name
+        for name, shown_name in JobFile.objects.filter(
+            pk__in=job_file_pks, thumbnail=""
+        ).values_list("file", "name")
+        if name and is_image(shown_name or name)
+    }
+    # Pillow releases the GIL while it decodes and resizes, the threads do not touch the database
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rendered = [
+            name
+            for name, target_name in zip(names, executor.map(render_thumbnail, names))
+            if target_name
+        ]
+    return JobFile.objects.filter(file__in=rendered, thumbnail="").update(
+        thumbnail=Concat("file", Value(JOBS_THUMBNAIL_SUFFIX))
+    )
@@ -0,0 +1,221 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import re
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from jobs.blobs import attach_blob
+from jobs.consts import (
+    JOBS_UPLOAD_CHUNK_SIZE,
+    JOBS_UPLOAD_MAX_AGE,
+    JOBS_UPLOAD_PART_SUFFIX,
+    JOBS_UPLOAD_READ_SIZE,
+    JOBS_UPLOAD_SIGNATURES,
+    UPLOAD_CHECKSUM_ERROR,
+    UPLOAD_CHUNK_SIZE_ERROR,
+    UPLOAD_DIGEST_ERROR,
+    UPLOAD_LENGTH_ERROR,
+    UPLOAD_OFFSET_ERROR,
+    UPLOAD_RANGE_ERROR,
+    UPLOAD_SIGNATURE_ERROR,
+)
+from jobs.models import job_file_directory, JobFile, JobFileUpload
+from jobs.storage import blob_storage, file_sha256
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (?P<start>\d+)-(?P<end>\d+)/(?P<size>\d+)$")
+# RFC 9530, e.g. `Content-Digest: sha-256=:<base64>:`
+CONTENT_DIGEST_RE = re.compile(r"sha-256=:(?P<digest>[A-Za-z0-9+/]+={0,2}):")
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_code = "conflict"
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "too_large"
+
+
+def get_storage():
+    return JobFile._meta.get_field("file").storage
+
+
+def parse_content_range(header):
+    """
+    Return the first and the last byte of a chunk and the size of the whole file.
+
+    :param header: the `Content-Range` header, e.g. `bytes 0-8388607/20000000`
+    :return: a tuple of `(start, end, size)`, the end is inclusive
+    """
+    match = CONTENT_RANGE_RE.match(header or "")
+    if not match:
+        raise ValidationError(UPLOAD_RANGE_ERROR)
+    start, end, size = (int(value) for value in match.group("start", "end", "size"))
+    if end < start or end >= size:
+        raise ValidationError(UPLOAD_RANGE_ERROR)
+    return start, end, size
+
+
+def parse_content_digest(header):
+    """
+    Return the SHA-256 digest of a chunk from the `Content-Digest` header or None if not given.
+    """
+    if not header:
+        return None
+    match = CONTENT_DIGEST_RE.search(header)
+    if not match:
+        return None
+    try:
+        return base64.b64decode(match.group("digest"), validate=True)
+    except binascii.Error as error:
+        raise ValidationError(UPLOAD_DIGEST_ERROR) from error
+
+
+def start_upload(job, user, name, size, sha256=""):
+    """
+    Create an upload with an empty partial file in the directory of the job files.
+
+    :param job: the job the file is attached to
+    :param user: the user who uploads the file
+    :param str name: the name of the file, already validated
+    :param int size: the size of the whole file in bytes
+    :param str sha256: the hex digest of the whole file, checked at the end if given
+    :return: the `JobFileUpload`
+    """
+    upload = JobFileUpload(job=job, user=user, name=name, size=size, sha256=sha256.lower())
+    # The partial file is named after the upload, so it never takes the name of a finished file
+    part_name = job_file_directory(
+        JobFile(object_id=job.pk), f"{upload.pk}{JOBS_UPLOAD_PART_SUFFIX}"
+    )
+    upload.path = get_storage().save(part_name, ContentFile(b""))
+    upload.save()
+    return upload
+
+
+def _check_signature(name, head):
+    signatures = JOBS_UPLOAD_SIGNATURES.get(name.rpartition(".")[2].lower())
+    if signatures and not head.startswith(signatures):
+        raise ValidationError(UPLOAD_SIGNATURE_ERROR)
+
+
+def _write_chunk(file, stream, length):
+    """
+    Copy exactly `length` bytes of the stream to the file and return their SHA-256 digest.
+    More bytes are never read from the stream, so an oversized body is rejected early.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    while written <= length:
+        piece = stream.read(min(JOBS_UPLOAD_READ_SIZE, length + 1 - written)) if stream else b""
+        if not piece:
+            break
+        written += len(piece)
+        if written > length:
+            break
+        file.write(piece)
+        digest.update(piece)
+    if written != length:
+        raise ValidationError(UPLOAD_LENGTH_ERROR)
+    return digest.digest()
+
+
+def append_chunk(upload, stream, content_range, content_digest=None):
+    """
+    Append a chunk to the partial file of the upload and register the `JobFile`
+    when the last chunk arrives.
+
+    The chunk must start where the upload stopped, which makes a repeated or a lost chunk
+    easy to detect and resume. A rejected chunk is cut off the partial file.
+
+    :param upload: the `JobFileUpload`
+    :param stream: the body of the request, read in small pieces
+    :param content_range: the `Content-Range` header of the chunk
+    :param content_digest: the optional `Content-Digest` header of the chunk
+    :return: the created `JobFile` after the last chunk, otherwise None
+    """
+    start, end, size = parse_content_range(content_range)
+    length = end - start + 1
+    if length > JOBS_UPLOAD_CHUNK_SIZE:
+        raise UploadTooLarge(UPLOAD_CHUNK_SIZE_ERROR.format(JOBS_UPLOAD_CHUNK_SIZE))
+    expected_digest = parse_content_digest(content_digest)
+
+    with transaction.atomic():
+        # Concurrent chunks of the same upload wait for each other here
+        upload = JobFileUpload.objects.select_for_update().get(pk=upload.pk)
+        if size != upload.size:
+            raise ValidationError(UPLOAD_RANGE_ERROR)
+        if start != upload.offset:
+            raise UploadConflict(UPLOAD_OFFSET_ERROR.format(upload.offset))
+
+        with open(get_storage().path(upload.path), "r+b") as file:
+            # Whatever an interrupted request left after the offset is overwritten
+            file.truncate(upload.offset)
+            file.seek(upload.offset)
+            try:
+                digest = _write_chunk(file, stream, length)
+                if expected_digest is not None and digest != expected_digest:
+                    raise ValidationError(UPLOAD_DIGEST_ERROR)
+                if start == 0:
+                    file.seek(0)
+                    _check_signature(upload.name, file.read(16))
+            except ValidationError:
+                file.truncate(upload.offset)
+                raise
+
+        upload.offset = end + 1
+        upload.save(update_fields=["offset", "updated"])
+        if not upload.is_complete:
+            return None
+
+        # The upload is finished under its lock, so a failure leaves the last chunk to be sent
+        # again instead of a complete upload without a job file
+        sha256 = file_sha256(get_storage().path(upload.path))
+        if not upload.sha256 or sha256 == upload.sha256:
+            return complete_upload(upload, sha256)
+        abort_upload(upload)
+    raise ValidationError(UPLOAD_CHECKSUM_ERROR)
+
+
+def complete_upload(upload, sha256):
+    """
+    Attach the whole file of a locked upload to the job and move it to its blob.
+    The file is moved last, so it is still there, if attaching it fails.
+    """
+    job_file = attach_blob(upload.job, sha256, upload.size, upload.name)
+    path = get_storage().path(upload.path)
+    upload.delete()
+    blob_storage.store(path, sha256)
+    return job_file
+
+
+def abort_upload(upload):
+    """
+    Remove the partial file and the upload.
+    """
+    get_storage().delete(upload.path)
+    upload.delete()
+
+
+def abort_stale_uploads(max_age=JOBS_UPLOAD_MAX_AGE):
+    """
+    Remove the uploads, which have not received a chunk for a while, with their partial files.
+
+    :param int max_age: the number of seconds an upload is kept for since its last chunk
+    :return: the number of the removed uploads
+    """
+    cutoff = now() - datetime.timedelta(seconds=max_age)
+    with transaction.atomic():
+        # An upload receiving a chunk right now is locked and skipped
+        uploads = list(
+            JobFileUpload.objects.select_for_update(skip_locked=True).filter(updated__lt=cutoff)
+        )
+        for upload in uploads:
+            abort_upload(upload)
+    return len(uploads)
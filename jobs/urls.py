@@ -1,11 +1,17 @@
 from django.urls import path, re_path
 
-from jobs import views
+from jobs import api_views, views
 
 urlpatterns = [
     path("jobs-all/", views.jobs_all, name="jobs-all"),
+    re_path(r"^jobs-all/export/(?P<file_format>csv|xlsx)/$", views.jobs_export, name="jobs-export"),
+    path("jobs-all/files/", views.jobs_files_archive, name="jobs-files-archive"),
+    path("archives/<str:token>/", views.jobs_archive_download, name="jobs-archive-download"),
     path("create/", views.job_create, name="jobs-create"),
     path("job/<int:job_pk>/", views.job_view, name="jobs-job"),
+    path("job/<int:job_pk>/files/", views.job_files_archive, name="jobs-job-files-archive"),
+    path("file/<int:job_file_pk>/", views.job_file_download, name="jobs-file-download"),
+    path("file/<int:job_file_pk>/thumbnail/", views.job_file_thumbnail, name="jobs-file-thumbnail"),
     path("my-jobs/", views.my_jobs, name="jobs-my-jobs"),
     re_path(
         r"^my-jobs/(?P<status>waiting|accepted|refused|making_documents|ready_to_stake_out|data_passed|ongoing|finished|closed|in_progress)/$",
@@ -17,4 +23,9 @@ urlpatterns = [
         views.set_role_session,
         name="jobs-switch-role",
     ),
+    path("api/search/", api_views.search_jobs, name="api-jobs-search"),
+    path("api/jobs/", api_views.jobs_list, name="api-jobs-list"),
+    path("api/jobs/<int:job_pk>/", api_views.job_details, name="api-jobs-details"),
+    path("api/jobs/<int:job_pk>/uploads/", api_views.job_file_uploads, name="api-jobs-uploads"),
+    path("api/uploads/<uuid:upload_pk>/", api_views.job_file_upload, name="api-jobs-upload"),
 ]
@@ -1,9 +1,20 @@
+import os
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core import signing
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
+from django.utils.timezone import localdate
+from kombu.exceptions import OperationalError
 
+from jobs.archives import archive_job_files, is_too_large_to_stream, load_archive_token, stream_zip
+from jobs.blobs import create_job_file
 from jobs.consts import (
     EMAIL_JOB_CHANGE_CONTRACTOR_CONTENT,
     EMAIL_JOB_CHANGE_CONTRACTOR_SUBJECT,
@@ -11,15 +22,59 @@ from jobs.consts import (
     EMAIL_JOB_CHANGE_STATUS_SUBJECT,
     EMAIL_JOB_CREATE_CONTENT,
     EMAIL_JOB_CREATE_SUBJECT,
+    JOB_ARCHIVE_FILE_NAME,
     JOB_CREATE_SUCCESS_MESSAGE,
     JOB_ROLE_PRINCIPAL,
     JOB_SAVE_SUCCESS_MESSAGE,
+    JOBS_ARCHIVE_FILE_NAME,
+    JOBS_ARCHIVE_QUEUED_MESSAGE,
+    JOBS_ARCHIVE_UNAVAILABLE_MESSAGE,
+    JOBS_CURSOR_PARAM,
+    JOBS_EXPORT_FILE_NAME,
+    JOBS_IN_PROGRESS,
+    JOBS_ORDER_BY_DEFAULT,
+    JOBS_ORDER_BY_ERROR,
+    JOBS_ORDER_BY_FIELDS,
+    JOBS_PAGINATION_PARAMS,
     JOBS_PER_PAGE,
+    JOBS_SEARCH_PARAM,
+    JOBS_THUMBNAIL_CACHE_TIMEOUT,
+    JOBS_THUMBNAIL_SUFFIX,
     JobStatuses,
 )
-from jobs.forms import JobCreateForm, JobFileForm, JobViewForm
-from jobs.models import Job, JobFile
-from users.helpers import send_email
+from jobs.downloads import record_download, serve_file
+from jobs.exports import job_export_rows, stream_csv, stream_xlsx, XLSX_CONTENT_TYPE
+from jobs.forms import JobCreateForm, JobFileForm, JobFilterForm, JobViewForm
+from jobs.fragments import render_job_fragments
+from jobs.models import Job, JobCounter, JobFile, JOBS_IN_PROGRESS_STATUSES
+from jobs.paginators import CachedCountPaginator, KeysetPaginator
+from jobs.tasks import jobs_send_files_archive
+from users.helpers import notify
+
+
+def filter_jobs(request, jobs, headlines=True):
+    """
+    Filter, search and sort the jobs by the parameters of the jobs list.
+
+    :param request: the request object
+    :param jobs: a queryset of jobs
+    :param bool headlines: whether the found jobs get the search headlines
+    :return: a tuple of the sorted jobs, the bound `JobFilterForm`, the sort and the search text;
+        there are no jobs if the filters are not valid
+    :raises ValueError: if the jobs cannot be sorted by the `order_by` parameter
+    """
+    order_by = request.GET.get("order_by", JOBS_ORDER_BY_DEFAULT)
+    if order_by.removeprefix("-") not in JOBS_ORDER_BY_FIELDS:
+        raise ValueError(JOBS_ORDER_BY_ERROR.format(order_by))
+
+    filter_form = JobFilterForm(data=request.GET)
+    jobs = filter_form.filter(jobs) if filter_form.is_valid() else jobs.none()
+    search = request.GET.get(JOBS_SEARCH_PARAM, "").strip()
+    if search:
+        jobs = jobs.search(search, headlines=headlines).order_by("-rank", "-pk")
+    else:
+        jobs = jobs.order_by(*KeysetPaginator.ordering_for(order_by))
+    return jobs, filter_form, order_by, search
 
 
 @login_required
@@ -27,15 +82,36 @@ def jobs_all(request):
     """
     Display all jobs as a table.
 
+    The jobs are paginated by the page number or, if the `cursor` parameter is given,
+    by the cursor (keyset pagination), which costs the same on every page.
+    If the `q` parameter is given, only the jobs found by the full-text search are shown,
+    the most relevant first. The fields of the `JobFilterForm` narrow down the jobs further
+    and are carried over to the sorting, pagination and export links.
+
     :template: jobs/jobs_all.html
     :param request: the request object
     :return: the request response - `jobs-all` page
     """
-    page_number = request.GET.get("page")
-    order_by = request.GET.get("order_by", "-created")
-    jobs = Job.objects.all().order_by(order_by)
-    paginator = Paginator(jobs, per_page=JOBS_PER_PAGE)
-    page_object = paginator.get_page(page_number)
+    try:
+        jobs, filter_form, order_by, search = filter_jobs(
+            request, Job.objects.with_related().with_previews()
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    cursor_mode = JOBS_CURSOR_PARAM in request.GET and not search
+    if cursor_mode:
+        paginator = KeysetPaginator(jobs, order_by=order_by, per_page=JOBS_PER_PAGE)
+        page_object = paginator.get_page(request.GET.get(JOBS_CURSOR_PARAM))
+    else:
+        paginator = CachedCountPaginator(jobs, per_page=JOBS_PER_PAGE)
+        page_object = paginator.get_page(request.GET.get("page"))
+
+    query = request.GET.copy()
+    for param in JOBS_PAGINATION_PARAMS:
+        query.pop(param, None)
+    querystring = query.urlencode()
+
     return render(
         request=request,
         template_name="jobs/jobs_all.html",
@@ -43,11 +119,96 @@ def jobs_all(request):
             "jobs": jobs,
             "page_object": page_object,
             "paginator": paginator,
+            "job_rows": render_job_fragments(
+                page_object, "jobs/job_row.html", use_cache=not search
+            ),
             "order_by": order_by,
+            "search": search,
+            "cursor_mode": cursor_mode,
+            "filter_form": filter_form,
+            "querystring": querystring,
         },
     )
 
 
+@login_required
+def jobs_export(request, file_format):
+    """
+    Export the jobs list with its filters, search and sort as a CSV or an XLSX file.
+
+    The file is streamed while the jobs are read from the database in chunks,
+    so the memory use does not depend on the number of jobs.
+
+    :param request: the request object
+    :param str file_format: `csv` or `xlsx`
+    :return: the streamed file
+    """
+    try:
+        jobs, filter_form, _, _ = filter_jobs(request, Job.objects.with_related(), headlines=False)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    if filter_form.errors:
+        return HttpResponseBadRequest(filter_form.errors.as_text())
+
+    rows = job_export_rows(jobs)
+    if file_format == "xlsx":
+        response = StreamingHttpResponse(stream_xlsx(rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(stream_csv(rows), content_type="text/csv; charset=utf-8")
+    file_name = JOBS_EXPORT_FILE_NAME.format(localdate(), file_format)
+    response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+    return response
+
+
+def send_files_archive(request, job_files, file_name, redirect_url):
+    """
+    Stream a ZIP archive of the job files or have it built by a worker, if there are too many.
+
+    :param request: the request object
+    :param job_files: a queryset of the selected job files
+    :param str file_name: the name of the downloaded archive
+    :param str redirect_url: where the user goes back, when the archive is built by a worker
+    :return: the streamed archive or a redirect
+    """
+    job_files = archive_job_files(job_files)
+    if is_too_large_to_stream(job_files):
+        try:
+            jobs_send_files_archive.delay(
+                request.user.pk, list(job_files.values_list("pk", flat=True)), file_name
+            )
+        except OperationalError:
+            messages.error(request, JOBS_ARCHIVE_UNAVAILABLE_MESSAGE)
+        else:
+            messages.info(request, JOBS_ARCHIVE_QUEUED_MESSAGE)
+        return redirect(redirect_url)
+
+    response = StreamingHttpResponse(stream_zip(job_files), content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(True, file_name)
+    return response
+
+
+@login_required
+def jobs_files_archive(request):
+    """
+    Send a ZIP archive of the files of the jobs list with its filters and search.
+
+    :param request: the request object
+    :return: the streamed archive or a redirect to the `jobs-all` page
+    """
+    try:
+        jobs, filter_form, _, _ = filter_jobs(request, Job.objects.all(), headlines=False)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    if filter_form.errors:
+        return HttpResponseBadRequest(filter_form.errors.as_text())
+
+    job_files = JobFile.objects.filter(job__in=jobs.order_by().values("pk"))
+    redirect_url = f"{reverse('jobs-all')}?{request.GET.urlencode()}"
+    return send_files_archive(
+        request, job_files, JOBS_ARCHIVE_FILE_NAME.format(localdate()), redirect_url
+    )
+
+
 @login_required
 def job_create(request):
     """
@@ -65,17 +226,19 @@ def job_create(request):
             principal = form.cleaned_data["principal"]
             contractor = form.cleaned_data["contractor"]
             trade = form.cleaned_data["trade"]
-            form.save()
+            # The job, its files and the notification stand or fall together
+            with transaction.atomic():
+                form.save()
 
-            if files := request.FILES.getlist("file"):
-                for file in files:
-                    JobFile.objects.create(file=file, content_object=form.instance)
+                if files := request.FILES.getlist("file"):
+                    for file in files:
+                        create_job_file(form.instance, file)
 
-            send_email(
-                recipients=[contractor.email],
-                subject=EMAIL_JOB_CREATE_SUBJECT,
-                content=EMAIL_JOB_CREATE_CONTENT.format(principal.get_full_name(), trade.name),
-            )
+                notify(
+                    users=[contractor],
+                    subject=EMAIL_JOB_CREATE_SUBJECT,
+                    content=EMAIL_JOB_CREATE_CONTENT.format(principal.get_full_name(), trade.name),
+                )
 
             messages.success(request, JOB_CREATE_SUCCESS_MESSAGE)
             return redirect("jobs-all")
@@ -97,20 +260,25 @@ def job_view(request, job_pk):
     :param int job_pk: a job pk
     :return: redirects to the `jobs-all` page
     """
-    job = get_object_or_404(Job, pk=job_pk)
+    job = get_object_or_404(
+        Job.objects.select_related("principal", "contractor", "trade"), pk=job_pk
+    )
     form = JobViewForm(data=request.POST or None, instance=job, user=request.user)
-    attachments = job.get_job_files
+    attachments = list(job.get_job_files)
 
     if request.method == "POST":
         if form.is_valid():
             principal = form.cleaned_data["principal"]
             contractor = form.cleaned_data["contractor"]
             status = form.cleaned_data["status"]
-            if form.has_changed():
+            changed_data = form.changed_data
+            # The notifications are queued only when the change is saved
+            with transaction.atomic():
+                form.save()
                 job_url = settings.BASE_URL + reverse("jobs-job", kwargs={"job_pk": job_pk})
-                if "status" in form.changed_data:
-                    send_email(
-                        recipients=[principal.email],
+                if "status" in changed_data:
+                    notify(
+                        users=[principal],
                         subject=EMAIL_JOB_CHANGE_STATUS_SUBJECT.format(job_pk),
                         content=EMAIL_JOB_CHANGE_STATUS_CONTENT.format(
                             job_pk=job_pk,
@@ -118,26 +286,102 @@ def job_view(request, job_pk):
                             url=job_url,
                         ),
                     )
-                if "contractor" in form.changed_data:
-                    send_email(
-                        recipients=[contractor.email],
+                if "contractor" in changed_data:
+                    notify(
+                        users=[contractor],
                         subject=EMAIL_JOB_CHANGE_CONTRACTOR_SUBJECT.format(job_pk),
                         content=EMAIL_JOB_CHANGE_CONTRACTOR_CONTENT.format(
                             job_pk=job_pk, trade=job.trade, url=job_url
                         ),
                     )
-            form.save()
             messages.success(request, JOB_SAVE_SUCCESS_MESSAGE)
             return redirect("jobs-all")
 
     return render(request, "jobs/job.html", {"job": job, "form": form, "attachments": attachments})
 
 
+@login_required
+def job_file_download(request, job_file_pk):
+    """
+    Send a job file to a logged-in user and buffer the time of the download.
+
+    :param request: the request object
+    :param int job_file_pk: a job file pk
+    :return: the file or the headers for the front web server to send it
+    """
+    job_file = get_object_or_404(
+        JobFile.objects.exclude(file="").filter(job__isnull=False), pk=job_file_pk
+    )
+    response = serve_file(request, job_file.file, job_file.file_basename)
+    if response.status_code < 400:
+        record_download(job_file.pk)
+    return response
+
+
+@login_required
+def job_file_thumbnail(request, job_file_pk):
+    """
+    Send the thumbnail of an image job file to a logged-in user, to be shown inline.
+
+    The thumbnail never changes for the same file, so the browser keeps it for a while.
+
+    :param request: the request object
+    :param int job_file_pk: a job file pk
+    :return: the thumbnail or the headers for the front web server to send it
+    """
+    job_file = get_object_or_404(
+        JobFile.objects.exclude(thumbnail="").filter(job__isnull=False), pk=job_file_pk
+    )
+    filename = f"{os.path.splitext(job_file.file_basename)[0]}{JOBS_THUMBNAIL_SUFFIX}"
+    response = serve_file(request, job_file.thumbnail, filename, as_attachment=False)
+    patch_cache_control(response, private=True, max_age=JOBS_THUMBNAIL_CACHE_TIMEOUT)
+    return response
+
+
+@login_required
+def job_files_archive(request, job_pk):
+    """
+    Send a ZIP archive of all the files of a job.
+
+    :param request: the request object
+    :param int job_pk: a job pk
+    :return: the streamed archive or a redirect to the `jobs-job` page
+    """
+    job = get_object_or_404(Job, pk=job_pk)
+    return send_files_archive(
+        request,
+        JobFile.objects.filter(job=job),
+        JOB_ARCHIVE_FILE_NAME.format(job.pk),
+        reverse("jobs-job", kwargs={"job_pk": job.pk}),
+    )
+
+
+@login_required
+def jobs_archive_download(request, token):
+    """
+    Send a ZIP archive built by a worker to the user who asked for it.
+
+    :param request: the request object
+    :param str token: the signed token from the e-mail with the link
+    :return: the archive or the headers for the front web server to send it
+    """
+    try:
+        name, file_name = load_archive_token(token, request.user.pk)
+    except signing.BadSignature as error:
+        raise Http404(token) from error
+    return serve_file(request, FieldFile(None, JobFile._meta.get_field("file"), name), file_name)
+
+
 @login_required
 def my_jobs(request, status=JobStatuses.WAITING):
     """
     Display user jobs.
 
+    The jobs are paginated by the cursor (keyset pagination) over the (role user, status, pk)
+    indexes. The `in_progress` tab spans several statuses, so its rows are read from the index
+    for each status and sorted by the pk, it is not served in order by the index. The numbers
+    of the jobs on the status tabs come from the job counters.
+
     :template: jobs/my_jobs.html
     :param request: the request object
     :param str status: a status of the job
@@ -148,27 +392,38 @@ def my_jobs(request, status=JobStatuses.WAITING):
     if not role:
         return render(request, "jobs/my_jobs.html")
 
-    jobs = Job.objects.all().order_by("-pk")
+    jobs = Job.objects.with_related().with_previews().order_by("-pk")
     if role == JOB_ROLE_PRINCIPAL:
         jobs = jobs.filter(principal=user)
     else:
         jobs = jobs.filter(contractor=user)
 
-    if status == "in_progress":
-        role_filter = {role: user}
-        jobs = jobs.filter(
-            **role_filter,
-            status__in=[
-                JobStatuses.MAKING_DOCUMENTS,
-                JobStatuses.READY_TO_STAKE_OUT,
-                JobStatuses.DATA_PASSED,
-                JobStatuses.ONGOING,
-            ],
-        )
+    if status == JOBS_IN_PROGRESS:
+        jobs = jobs.filter(status__in=JOBS_IN_PROGRESS_STATUSES)
     else:
         jobs = jobs.filter(status=status)
 
-    return render(request, "jobs/my_jobs.html", {"jobs": jobs, "role": role})
+    # The badges of the tabs, read from the counters in a single query
+    status_counts = JobCounter.objects.for_user(user)[role]
+    status_counts[JOBS_IN_PROGRESS] = sum(
+        status_counts[in_progress] for in_progress in JOBS_IN_PROGRESS_STATUSES
+    )
+
+    paginator = KeysetPaginator(jobs, order_by="-pk", per_page=JOBS_PER_PAGE)
+    page_object = paginator.get_page(request.GET.get(JOBS_CURSOR_PARAM))
+    job_cards = render_job_fragments(page_object, "jobs/job_card.html", {"role": role})
+    return render(
+        request,
+        "jobs/my_jobs.html",
+        {
+            "jobs": jobs,
+            "page_object": page_object,
+            "job_cards": job_cards,
+            "role": role,
+            "status_counts": status_counts,
+            "jobs_count": status_counts.get(status, 0),
+        },
+    )
 
 
 def set_role_session(request, role_url=JOB_ROLE_PRINCIPAL):
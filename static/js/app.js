@@ -12,3 +12,89 @@ const formJobUpdate = document.getElementById('form-job-update')
 function form_job_update_submit()  {
     formJobUpdate.submit();
 }
+
+
+const UPLOAD_MAX_RETRIES = 3;
+// The whole file is read into memory to be hashed, so only the smaller files are checked up front
+const UPLOAD_DIGEST_MAX_SIZE = 256 * 1024 * 1024;
+
+async function chunk_digest(data) {
+    // Web Crypto is only available on HTTPS and localhost, the digest is optional
+    if (!window.crypto || !window.crypto.subtle) {
+        return {};
+    }
+    const digest = new Uint8Array(await window.crypto.subtle.digest('SHA-256', data));
+    return {'Content-Digest': 'sha-256=:' + btoa(String.fromCharCode(...digest)) + ':'};
+}
+
+async function file_digest(file) {
+    if (!window.crypto || !window.crypto.subtle || file.size > UPLOAD_DIGEST_MAX_SIZE) {
+        return {};
+    }
+    const digest = new Uint8Array(await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer()));
+    return {sha256: Array.from(digest, (byte) => byte.toString(16).padStart(2, '0')).join('')};
+}
+
+async function upload_job_file(file, url, headers, progress) {
+    let response = await fetch(url, {
+        method: 'POST',
+        headers: {...headers, 'Content-Type': 'application/json'},
+        body: JSON.stringify({name: file.name, size: file.size, ...await file_digest(file)}),
+    });
+    let upload = await response.json();
+    if (!response.ok) {
+        throw new Error(JSON.stringify(upload));
+    }
+    if (upload.offset === undefined) {
+        // The same content is already stored, the server has attached it without an upload
+        return;
+    }
+
+    let retries = 0;
+    while (upload.offset < file.size) {
+        const data = await file.slice(upload.offset, upload.offset + upload.chunk_size).arrayBuffer();
+        const end = upload.offset + data.byteLength - 1;
+        try {
+            response = await fetch(upload.url, {
+                method: 'PUT',
+                headers: {
+                    ...headers,
+                    ...await chunk_digest(data),
+                    'Content-Type': 'application/octet-stream',
+                    'Content-Range': `bytes ${upload.offset}-${end}/${file.size}`,
+                },
+                body: data,
+            });
+        } catch (error) {
+            response = null;
+        }
+        if (response && response.status === 201) {
+            break;
+        }
+        if (response && response.ok) {
+            upload = await response.json();
+            retries = 0;
+        } else if (++retries > UPLOAD_MAX_RETRIES) {
+            throw new Error(response ? await response.text() : 'The connection has been lost');
+        } else {
+            // Resume from wherever the server has stopped
+            upload = await (await fetch(upload.url, {headers: headers})).json();
+        }
+        progress.textContent = `${file.name}: ${Math.floor(upload.offset / file.size * 100)}%`;
+    }
+}
+
+async function upload_job_files(input) {
+    const headers = {'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value};
+    const progress = document.getElementById('job-file-upload-progress');
+    input.disabled = true;
+    try {
+        for (const file of input.files) {
+            await upload_job_file(file, input.dataset.url, headers, progress);
+        }
+        window.location.reload();
+    } catch (error) {
+        progress.textContent = error.message;
+        input.disabled = false;
+    }
+}
@@ -9,7 +9,7 @@ class TradeFactory(factory.django.DjangoModelFactory):
     Create a Trade Factory object for the tests with pre-defined values.
     """
 
-    name = factory.Faker("sentence", nb_words=3)
+    name = factory.Faker("text", max_nb_chars=32)
     abbreviation = FuzzyChoice(ALL_TRADES)
     slug = factory.Faker("slug")
     description = factory.Faker("text", max_nb_chars=15)
@@ -0,0 +1,90 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from users.const import (
+    AVATAR_VARIANT_FORMATS,
+    AVATAR_VARIANT_QUALITY,
+    AVATAR_VARIANT_SIZES,
+    AVATAR_VARIANTS_DIRECTORY,
+)
+from users.models import User
+
+
+def avatar_variant_name(avatar_name, size, extension):
+    stem = os.path.splitext(os.path.basename(avatar_name))[0]
+    return os.path.join(AVATAR_VARIANTS_DIRECTORY, f"{stem}_{size}.{extension}")
+
+
+def get_avatar_variants(user):
+    """
+    Return the variants of the current avatar of the user.
+
+    :return: a dict of `{size: {extension: name}}`, empty until the variants are made
+    """
+    variants = user.avatar_variants or {}
+    if not user.avatar or variants.get("source") != user.avatar.name:
+        return {}
+    return {int(size): names for size, names in variants.get("sizes", {}).items()}
+
+
+def _encode(image, image_format):
+    if image_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no transparency, the transparent pixels become white
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=AVATAR_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def make_avatar_variants(user_pk):
+    """
+    Make the square variants of the avatar of the user, in every size and format.
+
+    The avatar is decoded once, cropped to the largest size and the smaller sizes are
+    resized from that. The variants of a replaced avatar are removed. Nothing is done
+    if the variants of the current avatar are already there.
+
+    :param int user_pk: the pk of the user
+    :return: True if the variants have been made, otherwise False
+    """
+    user = User.objects.exclude(avatar="").filter(pk=user_pk).first()
+    if user is None or get_avatar_variants(user):
+        return False
+
+    storage = user.avatar.storage
+    largest = max(AVATAR_VARIANT_SIZES)
+    with user.avatar.open("rb"), Image.open(user.avatar) as image:
+        # A JPEG is decoded right at a reduced scale, if it is much larger than needed
+        image.draft("RGB", (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert(
+            "RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB"
+        )
+        image = ImageOps.fit(image, (largest, largest), Image.Resampling.LANCZOS)
+
+    sizes = {}
+    for size in AVATAR_VARIANT_SIZES:
+        resized = image if size == largest else image.resize((size, size), Image.Resampling.LANCZOS)
+        sizes[str(size)] = {
+            extension: storage.save(
+                avatar_variant_name(user.avatar.name, size, extension),
+                ContentFile(_encode(resized, image_format)),
+            )
+            for extension, image_format, _ in AVATAR_VARIANT_FORMATS
+        }
+
+    variants = {"source": user.avatar.name, "sizes": sizes}
+    # The avatar may have been replaced in the meantime, then these variants are not needed
+    updated = User.objects.filter(pk=user.pk, avatar=user.avatar.name).update(
+        avatar_variants=variants
+    )
+    stale = (user.avatar_variants or {}).get("sizes", {}) if updated else sizes
+    for names in stale.values():
+        for name in names.values():
+            storage.delete(name)
+    return bool(updated)
@@ -1,10 +1,31 @@
+from django.db import models
+
+
+# TextChoices
+class EmailStatuses(models.TextChoices):
+    PENDING = "pending", "pending"
+    SENT = "sent", "sent"
+    DEAD = "dead", "dead"
+
+
+class NotificationDeliveries(models.TextChoices):
+    IMMEDIATE = "immediate", "an e-mail for every event"
+    HOURLY = "hourly", "an hourly digest"
+    DAILY = "daily", "a daily digest"
+
+
 # Constants
 LEGAL_AGE = 18
 PASSWORD_STRONG = "c=%j!Qu3&#SSaz47_Of("
 PASSWORD_NUMERIC = "123"
 USERS_OBJECTS_PER_PAGE = 20
-AVATAR_MAX_DIMENSION = 600
-AVATAR_MAX_SIZE = 2 * 1024 * 1024  # 2 MB
+AVATAR_MAX_DIMENSION = 6000
+AVATAR_MAX_SIZE = 10 * 1024 * 1024  # 10 MB
+# The avatars are shown from square variants, WebP with a JPEG fallback, e.g. `<name>_48.webp`
+AVATAR_VARIANT_SIZES = (48, 128, 256)
+AVATAR_VARIANT_FORMATS = (("webp", "WEBP", "image/webp"), ("jpg", "JPEG", "image/jpeg"))
+AVATAR_VARIANT_QUALITY = 80
+AVATAR_VARIANTS_DIRECTORY = "avatars/variants"
 
 
 # Forms
@@ -21,8 +42,7 @@ LOGOUT_SUCCESS_MESSAGE = "You have been logged out!"
 
 AVATAR_ALLOWED_CONTENT_TYPES = ("image/png", "image/jpg", "image/jpeg")
 AVATAR_DIMENSION_ERROR = "Use image smaller than {max_dimension}x{max_dimension} pixels"
-AVATAR_FILE_ERROR = "Invalid image file"
-AVATAR_SIZE_ERROR = "Avatar size cannot be larger then 2 MB"
+AVATAR_SIZE_ERROR = "Avatar size cannot be larger then 10 MB"
 AVATAR_TYPE_ERROR = "Use JPEG or PNG image"
 
 
@@ -31,10 +51,28 @@ LOGIN_NECESSITY_MESSAGE = "You must be logged in to visit this page"
 ADMIN_NECESSITY_MESSAGE = "You are not authorized to visit this page"
 USERS_ACCEPTED = "{} user(s) have been accepted"
 USERS_DELETED = "{} user(s) have been deleted"
+EMAILS_RETRIED = "{} e-mail(s) will be sent again"
+NOTIFICATIONS_SAVED_MESSAGE = "The notification settings have been saved!"
 
 
 # E-mails
+# The e-mails of a mailing are sent in batches, each over a single SMTP connection
+EMAIL_BATCH_SIZE = 50
+EMAIL_DEFAULT_USER_NAME = "User"
+# A failed e-mail is retried after 1, 2, 4... minutes, at most after the maximum backoff
+EMAIL_OUTBOX_MAX_ATTEMPTS = 10
+EMAIL_OUTBOX_BACKOFF = 60
+EMAIL_OUTBOX_BACKOFF_MAX = 2 * 60 * 60
+# A claimed e-mail is sent again after the lease, if its worker has died in the meantime
+EMAIL_OUTBOX_LEASE = 10 * 60
+# The number of the e-mails sent through the mail server in a minute
+EMAIL_OUTBOX_RATE_LIMIT = 60
+EMAIL_OUTBOX_RETENTION_DAYS = 30
+EMAIL_OUTBOX_STATS_HOURS = 24
+EMAIL_OUTBOX_FAILURES_SHOWN = 50
+NOTIFICATION_DIGEST_TEMPLATE = "users/notification_digest.html"
 EMAIL_REGISTRATION_SUBJECT = "You have just created an account on the MarBud website"
 EMAIL_REGISTRATION_CONTENT = "You have successfully created an account on the MarBud website. Wait for the administration to confirm your data. After positive verification, you will be able to log in to your account."
 EMAIL_ACCEPTANCE_SUBJECT = "Your account has been successfully verified"
 EMAIL_ACCEPTANCE_CONTENT = "Your account has been successfully verified! From now on you can take full advantage of the service."
+EMAIL_NOTIFICATION_DIGEST_SUBJECT = "{} new notification(s) from the MarBud website"
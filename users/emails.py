@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.html import escape, strip_tags
+
+# Rendered in place of the name of the user, which is then filled in for each recipient
+USER_NAME_PLACEHOLDER = "__email_user_name__"
+
+
+def render_email(content, template_name=settings.EMAIL_TEMPLATE):
+    """
+    Render the e-mail template once for all the recipients of a mailing.
+
+    The compiled template is kept by the cached template loader, so it is parsed once
+    per process. The plain text is stripped from the rendered HTML here as well, instead
+    of once for each e-mail.
+
+    :param str content: a content of an e-mail
+    :param str template_name: a template name of an e-mail
+    :return: a tuple of the HTML and the plain text, with the placeholder of the user name
+    """
+    html_message = get_template(template_name).render(
+        {"user_name": USER_NAME_PLACEHOLDER, "content": content}
+    )
+    return html_message, strip_tags(html_message)
+
+
+def personalize_email(rendered, user_name):
+    """
+    Fill in the name of the user in the rendered e-mail.
+
+    :param tuple rendered: the HTML and the plain text, see `render_email`
+    :param str user_name: the full name of the user
+    :return: a tuple of the HTML and the plain text of the user
+    """
+    user_name = escape(user_name)
+    return tuple(part.replace(USER_NAME_PLACEHOLDER, user_name) for part in rendered)
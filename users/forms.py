@@ -4,14 +4,13 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Column, Div, Field, Layout, Row, Submit
 from dateutil.relativedelta import relativedelta
 from django import forms
-from django.core.files.images import get_image_dimensions
 from PIL import Image
 
+from jobs.paginators import invalidate_count_cache
 from trades.models import ABBREVIATION_RAILWAY, Trade
 from users.const import (
     AVATAR_ALLOWED_CONTENT_TYPES,
     AVATAR_DIMENSION_ERROR,
-    AVATAR_FILE_ERROR,
     AVATAR_MAX_DIMENSION,
     AVATAR_MAX_SIZE,
     AVATAR_SIZE_ERROR,
@@ -25,6 +24,31 @@ from users.const import (
 from users.models import User
 
 
+class AvatarField(forms.ImageField):
+    """
+    An image field which reads only the header of the image, not the whole image.
+
+    The format (as the content type) and the size of the image are known from the header,
+    its content is decoded once, when the avatar variants are made.
+    """
+
+    def to_python(self, data):
+        file = forms.FileField.to_python(self, data)
+        if file is None:
+            return None
+
+        try:
+            with Image.open(file) as image:
+                file.image_size = image.size
+                file.content_type = Image.MIME.get(image.format)
+        except Exception as error:
+            raise forms.ValidationError(
+                self.error_messages["invalid_image"], code="invalid_image"
+            ) from error
+        file.seek(0)
+        return file
+
+
 class RegistrationForm(forms.ModelForm):
     password1 = forms.CharField(label="Password", widget=forms.PasswordInput)
     password2 = forms.CharField(label="Confirm password", widget=forms.PasswordInput)
@@ -72,17 +96,11 @@ class RegistrationForm(forms.ModelForm):
         if avatar := self.cleaned_data.get("avatar"):
             if avatar.content_type not in AVATAR_ALLOWED_CONTENT_TYPES:
                 raise forms.ValidationError(AVATAR_TYPE_ERROR)
-            else:
-                try:
-                    with Image.open(avatar) as image:
-                        image.verify()
-                except Exception:
-                    raise forms.ValidationError(AVATAR_FILE_ERROR)
 
             if avatar.size > AVATAR_MAX_SIZE:
                 raise forms.ValidationError(AVATAR_SIZE_ERROR)
 
-            width, height = get_image_dimensions(avatar)
+            width, height = avatar.image_size
             if width > AVATAR_MAX_DIMENSION or height > AVATAR_MAX_DIMENSION:
                 raise forms.ValidationError(
                     AVATAR_DIMENSION_ERROR.format(max_dimension=AVATAR_MAX_DIMENSION)
@@ -113,6 +131,7 @@ class RegistrationForm(forms.ModelForm):
             "avatar",
         ]
         widgets = {"trades": forms.CheckboxSelectMultiple}
+        field_classes = {"avatar": AvatarField}
 
 
 class LoginForm(forms.Form):
@@ -141,7 +160,16 @@ class AcceptOrDeleteForm(forms.ModelForm):
     @staticmethod
     def accept_users(users_list):
         User.objects.filter(pk__in=users_list).update(is_active=True)
+        # The bulk update does not send the `post_save` signals
+        invalidate_count_cache(User)
 
     @staticmethod
     def delete_users(users_list):
         User.objects.filter(pk__in=users_list).delete()
+
+
+class NotificationsForm(forms.ModelForm):
+    class Meta:
+        model = User
+        fields = ["notification_delivery"]
+        labels = {"notification_delivery": "Notifications"}
@@ -1,47 +1,149 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.db import connection, transaction
+from kombu.exceptions import OperationalError
 
+from users.const import EMAIL_DEFAULT_USER_NAME, NotificationDeliveries
+from users.emails import personalize_email, render_email
 from users.models import User
-from users.tasks import email_to_user
+from users.notifications import store_events
+from users.outbox import dispatch_outbox, queue_emails
+from users.tasks import users_dispatch_email_outbox
 
+_dispatch_pool = None
+_dispatch_pool_lock = threading.Lock()
+_dispatch_slots = None
 
-def convert_to_html_content(template_name, context):
-    return render_to_string(
-        template_name=template_name,
-        context=context,
-    )
 
+def recipient_names(recipients):
+    """
+    Return the full names of the users with the given e-mails, read in a single query.
 
-def html_content(user_name, content, template_name):
-    return convert_to_html_content(
-        template_name=template_name,
-        context={
-            "user_name": user_name,
-            "content": content,
-        },
-    )
+    :param list recipients: a list of strings, each an email address
+    :return: a dict of `{email: full name}`, without the e-mails of unknown users
+    """
+    users = User.objects.filter(email__in=recipients).only("email", "first_name", "last_name")
+    return {user.email: user.get_full_name() for user in users}
+
+
+def _dispatch_in_background():
+    try:
+        dispatch_outbox()
+    except Exception as error:
+        print(f"The e-mails will be sent by the next dispatch. {error!r}")
+    finally:
+        _dispatch_slots.release()
+        # The thread has its own database connection, which Django closes only in the requests
+        connection.close()
+
+
+def dispatch_in_background():
+    """
+    Send the e-mails of the outbox in a thread of the local worker pool.
+
+    The pool has `EMAIL_DISPATCH_WORKERS` threads and at most one waiting dispatch more.
+    A dispatch sends all the due e-mails, so when the pool is full, the waiting dispatch
+    sends the new e-mails as well and nothing more is queued.
+    """
+    global _dispatch_pool, _dispatch_slots
+    with _dispatch_pool_lock:
+        if _dispatch_pool is None:
+            _dispatch_pool = ThreadPoolExecutor(
+                max_workers=settings.EMAIL_DISPATCH_WORKERS, thread_name_prefix="email-dispatch"
+            )
+            _dispatch_slots = threading.BoundedSemaphore(settings.EMAIL_DISPATCH_WORKERS + 1)
+    if _dispatch_slots.acquire(blocking=False):
+        _dispatch_pool.submit(_dispatch_in_background)
+
+
+def wait_for_dispatches():
+    """
+    Wait until the local worker pool has sent the e-mails, the next dispatch starts a new pool.
+    """
+    global _dispatch_pool
+    with _dispatch_pool_lock:
+        if _dispatch_pool is not None:
+            _dispatch_pool.shutdown(wait=True)
+            _dispatch_pool = None
 
 
-def send_email(recipients, subject, content, template_name=settings.EMAIL_TEMPLATE, attachments=None):  # fmt: skip
+def dispatch_emails():
+    """
+    Start sending the e-mails of the outbox, it is run once the transaction is committed.
+
+    Without the broker the e-mails are sent by the local worker pool or, if it has no
+    workers, right away. If the broker cannot be reached, the e-mails stay in the outbox
+    and they are sent by the periodic `users_dispatch_email_outbox` task.
+    """
+    if not settings.SEND_EMAIL_CELERY:
+        if settings.EMAIL_DISPATCH_WORKERS:
+            dispatch_in_background()
+        else:
+            dispatch_outbox()
+        return
+    try:
+        users_dispatch_email_outbox.delay()
+    except OperationalError as error:
+        print(f"The e-mails will be sent by the periodic dispatch. {error}")
+
+
+def send_email(recipients, subject, content, template_name=settings.EMAIL_TEMPLATE, attachments=None, idempotency_key=None, recipient_keys=None):  # fmt: skip
     """
     Prepare to send an e-mail to the recipients list.
 
+    The template is rendered and stripped to the plain text once, only the name of the user
+    is filled in for each recipient. The e-mails are written to the outbox in the current transaction and they
+    are dispatched once it is committed, so they are not lost if the broker is down.
+
     :param list recipients: a list of strings, each an email address
     :param str subject: a subject of an e-mail
     :param str content: a content of an e-mail
     :param str template_name: a template name of an e-mail
     :param list attachments: a list of attachments to put on the message
+    :param str idempotency_key: a key of the mailing, it is sent once to each recipient
+    :param dict recipient_keys: the keys of the e-mails by their recipients, see `queue_emails`
+    """
+    if not recipients:
+        return
+    names = recipient_names(recipients)
+    rendered = render_email(content, template_name)
+    queue_emails(
+        [
+            (
+                recipient,
+                subject,
+                *personalize_email(rendered, names.get(recipient, EMAIL_DEFAULT_USER_NAME)),
+            )
+            for recipient in recipients
+        ],
+        attachments=attachments,
+        idempotency_key=idempotency_key,
+        recipient_keys=recipient_keys,
+    )
+    transaction.on_commit(dispatch_emails)
+
+
+def notify(users, subject, content, idempotency_key=None):
+    """
+    Tell the users about an event, by an e-mail right away or in their next digest.
+
+    :param users: a list of users, their notification delivery decides how they are told
+    :param str subject: a subject of an e-mail
+    :param str content: a content of an e-mail
+    :param str idempotency_key: a key of the event, it is sent once to each user
     """
-    for recipient in recipients:
-        try:
-            to_user_name = User.objects.get(email=recipient).get_full_name()
-        except User.DoesNotExist:
-            to_user_name = "User"
-        html_message = html_content(
-            user_name=to_user_name, content=content, template_name=template_name
-        )
-
-        if settings.SEND_EMAIL_CELERY:
-            email_to_user.delay(recipient, subject, html_message, attachments)
+    immediate, digested = [], []
+    for user in users:
+        if user.notification_delivery == NotificationDeliveries.IMMEDIATE:
+            immediate.append(user)
         else:
-            email_to_user(recipient, subject, html_message, attachments)
+            digested.append(user)
+    send_email(
+        recipients=[user.email for user in immediate],
+        subject=subject,
+        content=content,
+        idempotency_key=idempotency_key,
+    )
+    store_events(digested, subject, content, idempotency_key)
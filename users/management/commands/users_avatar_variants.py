@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from users.avatars import get_avatar_variants
+from users.models import User
+from users.tasks import users_make_avatar_variants
+
+
+class Command(BaseCommand):
+    help = "Makes the missing variants of the avatars."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Make the variants here instead of sending the users to the workers.",
+        )
+
+    def handle(self, *args, **options):
+        users = [user for user in User.objects.exclude(avatar="") if not get_avatar_variants(user)]
+        for user in users:
+            if options["sync"]:
+                users_make_avatar_variants(user.pk)
+            else:
+                users_make_avatar_variants.delay(user.pk)
+        self.stdout.write(self.style.SUCCESS(f"The avatars of {len(users)} users are processed!"))
@@ -0,0 +1,131 @@
+import socketserver
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from users.const import EMAIL_BATCH_SIZE
+from users.outbox import dispatch_outbox, queue_emails
+from users.tasks import email_to_user
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Talks just enough SMTP to accept the messages and drop them.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        # The greeting is delayed like the TCP and TLS handshakes of a remote mail server
+        time.sleep(self.server.latency)
+        self.reply("220 localhost SMTP sink")
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command in (b"HELO", b"EHLO"):
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                break
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.received = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares sending the e-mails one connection per e-mail with the outbox dispatch, "
+        "whose batches share a connection, against a local SMTP server. "
+        "Only the e-mails of the benchmark are sent and they are rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages", type=int, default=200, help="The number of the sent e-mails."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=EMAIL_BATCH_SIZE,
+            help="The number of the e-mails sent over one connection.",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=50,
+            help="The delay of the server greeting in ms, like the handshakes of a remote server.",
+        )
+
+    def measure(self, name, sink, send, number):
+        sink.received = 0
+        start = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{name}: {sink.received}/{number} e-mails in {elapsed:.2f} s, "
+            f"{sink.received / elapsed:.1f} e-mails/s"
+        )
+
+    def handle(self, *args, **options):
+        number, batch_size = options["messages"], options["batch_size"]
+        # The addresses are unique, so the e-mails of the real users are never dispatched
+        run = time.time_ns()
+        messages = [
+            (f"benchmark-{index}-{run}@example.com", "Benchmark", f"<p>Hello user {index}!</p>", "")
+            for index in range(number)
+        ]
+
+        sink = SMTPSink(options["latency"] / 1000)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        host, port = sink.server_address
+        try:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                EMAIL_HOST=host,
+                EMAIL_PORT=port,
+                EMAIL_USE_SSL=False,
+                EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER="",
+                EMAIL_HOST_PASSWORD="",
+            ):
+                self.measure(
+                    "One connection per e-mail",
+                    sink,
+                    lambda: [email_to_user(*message[:3], None) for message in messages],
+                    number,
+                )
+                with transaction.atomic():
+                    queue_emails(messages)
+                    self.measure(
+                        f"Outbox, one connection per batch of {batch_size}",
+                        sink,
+                        lambda: dispatch_outbox(
+                            batch_size=batch_size,
+                            rate_limit=number,
+                            recipients=[message[0] for message in messages],
+                        ),
+                        number,
+                    )
+                    transaction.set_rollback(True)
+        finally:
+            sink.shutdown()
+            sink.server_close()
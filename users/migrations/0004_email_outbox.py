@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255, unique=True, verbose_name='idempotency key')),
+                ('recipient', models.EmailField(max_length=254, verbose_name='recipient')),
+                ('subject', models.TextField(verbose_name='subject')),
+                ('html_message', models.TextField(verbose_name='HTML message')),
+                ('attachments', models.JSONField(blank=True, default=list, verbose_name='attachments')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('dead', 'dead')], default='pending', max_length=16, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='sent')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt', 'id'], name='users_email_outbox_due_idx'),
+                    models.Index(fields=['status', 'created'], name='users_email_outbox_status_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_delivery',
+            field=models.CharField(choices=[('immediate', 'an e-mail for every event'), ('hourly', 'an hourly digest'), ('daily', 'a daily digest')], default='immediate', max_length=16, verbose_name='notifications'),
+        ),
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField(verbose_name='subject')),
+                ('content', models.TextField(verbose_name='content')),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='idempotency key')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('digested', models.DateTimeField(blank=True, null=True, verbose_name='digested')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_events', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(condition=models.Q(('digested__isnull', True)), fields=['user', 'id'], name='users_notification_pending_idx'),
+                ],
+            },
+        ),
+    ]
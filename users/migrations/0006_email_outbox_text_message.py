@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_notification_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='text_message',
+            field=models.TextField(blank=True, verbose_name='text message'),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractBaseUser, AbstractUser, PermissionsMixin
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from trades.models import Trade
+from users.const import EmailStatuses, NotificationDeliveries
 from users.managers import UserManager
 
 CONTRACT_DIRECTOR = "contract_director"
@@ -44,6 +46,16 @@ class User(AbstractBaseUser, PermissionsMixin):
     trades = models.ManyToManyField(to=Trade, related_name="users")
     birth_date = models.DateField(_("date of birth"), blank=True, null=True)
     avatar = models.ImageField(_("avatar"), upload_to="avatars", blank=True)
+    # The resized copies of the avatar, made by the `users_make_avatar_variants` task
+    avatar_variants = models.JSONField(
+        _("avatar variants"), default=dict, blank=True, editable=False
+    )
+    notification_delivery = models.CharField(
+        _("notifications"),
+        max_length=16,
+        choices=NotificationDeliveries.choices,
+        default=NotificationDeliveries.IMMEDIATE,
+    )
 
     objects = UserManager()
 
@@ -67,3 +79,72 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def get_role_display(self):
         return dict(ROLES)[self.role]
+
+
+class EmailOutbox(models.Model):
+    """
+    An e-mail to be sent, written in the same transaction as the change it is about.
+
+    The e-mails are sent by `dispatch_outbox`. A failed e-mail is tried again later
+    and it is left dead after `EMAIL_OUTBOX_MAX_ATTEMPTS` failures.
+    """
+
+    # The same e-mail is queued once, e.g. by a task which has been run twice
+    idempotency_key = models.CharField(_("idempotency key"), max_length=255, unique=True)
+    recipient = models.EmailField(_("recipient"))
+    subject = models.TextField(_("subject"))
+    html_message = models.TextField(_("HTML message"))
+    text_message = models.TextField(_("text message"), blank=True)
+    attachments = models.JSONField(_("attachments"), default=list, blank=True)
+    status = models.CharField(
+        _("status"), max_length=16, choices=EmailStatuses.choices, default=EmailStatuses.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    next_attempt = models.DateTimeField(_("next attempt"), default=timezone.now)
+    last_error = models.TextField(_("last error"), blank=True)
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+    sent = models.DateTimeField(_("sent"), blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The due e-mails, in the order they are sent
+            models.Index(
+                fields=["next_attempt", "id"],
+                name="users_email_outbox_due_idx",
+                condition=models.Q(status=EmailStatuses.PENDING),
+            ),
+            models.Index(fields=["status", "created"], name="users_email_outbox_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
+
+
+class NotificationEvent(models.Model):
+    """
+    An event, which a user is told about in the next digest e-mail, see `send_digests`.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="notification_events", verbose_name=_("user")
+    )
+    subject = models.TextField(_("subject"))
+    content = models.TextField(_("content"))
+    # The same event is stored once for a user, e.g. by a task which has been run twice
+    idempotency_key = models.CharField(
+        _("idempotency key"), max_length=255, unique=True, blank=True, null=True
+    )
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+    digested = models.DateTimeField(_("digested"), blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "id"],
+                name="users_notification_pending_idx",
+                condition=models.Q(digested__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} for {self.user}"
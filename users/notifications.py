@@ -0,0 +1,84 @@
+from itertools import groupby
+from operator import attrgetter
+
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.timezone import now
+
+from users.const import (
+    EMAIL_NOTIFICATION_DIGEST_SUBJECT,
+    NOTIFICATION_DIGEST_TEMPLATE,
+    NotificationDeliveries,
+)
+from users.emails import personalize_email, render_email
+from users.models import NotificationEvent
+from users.outbox import queue_emails
+
+
+def store_events(users, subject, content, idempotency_key=None):
+    """
+    Store an event for the next digest of each of the users.
+
+    :param users: a list of users
+    :param str subject: a subject of the event
+    :param str content: a content of the event
+    :param str idempotency_key: a key of the event, it is stored once for each user
+    """
+    NotificationEvent.objects.bulk_create(
+        [
+            NotificationEvent(
+                user=user,
+                subject=subject,
+                content=content,
+                idempotency_key=f"{idempotency_key}:{user.pk}" if idempotency_key else None,
+            )
+            for user in users
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def send_digests(delivery):
+    """
+    Queue one digest e-mail with all the pending events for every user with the given delivery.
+
+    The pending events are read together with their users in a single query. The digests
+    are queued in the outbox in the same transaction, in which the events are marked
+    as digested, so an event is in exactly one digest.
+
+    :param str delivery: `NotificationDeliveries.HOURLY` or `NotificationDeliveries.DAILY`
+    :return: the number of the queued digests
+    """
+    deliveries = [delivery]
+    if delivery == NotificationDeliveries.HOURLY:
+        # The events stored before a switch to the immediate e-mails go with the hourly digests
+        deliveries.append(NotificationDeliveries.IMMEDIATE)
+
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.filter(
+                digested__isnull=True, user__notification_delivery__in=deliveries
+            )
+            .select_related("user")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("user_id", "pk")
+        )
+        messages = []
+        for _, user_events in groupby(events, key=attrgetter("user_id")):
+            user_events = list(user_events)
+            user = user_events[0].user
+            rendered = render_email(
+                render_to_string(NOTIFICATION_DIGEST_TEMPLATE, {"events": user_events})
+            )
+            messages.append(
+                (
+                    user.email,
+                    EMAIL_NOTIFICATION_DIGEST_SUBJECT.format(len(user_events)),
+                    *personalize_email(rendered, user.get_full_name()),
+                )
+            )
+        queue_emails(messages)
+        NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            digested=now()
+        )
+    return len(messages)
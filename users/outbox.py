@@ -0,0 +1,252 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import BadHeaderError, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils.html import strip_tags
+from django.utils.timezone import now
+
+from users.const import (
+    EMAIL_BATCH_SIZE,
+    EMAIL_OUTBOX_BACKOFF,
+    EMAIL_OUTBOX_BACKOFF_MAX,
+    EMAIL_OUTBOX_LEASE,
+    EMAIL_OUTBOX_MAX_ATTEMPTS,
+    EMAIL_OUTBOX_RATE_LIMIT,
+    EMAIL_OUTBOX_RETENTION_DAYS,
+    EMAIL_OUTBOX_STATS_HOURS,
+    EmailStatuses,
+)
+from users.models import EmailOutbox
+
+RATE_LIMIT_WINDOW = 60
+
+
+def build_email(recipient, subject, html_message, attachments, connection=None, text_message=""):
+    """
+    Return the e-mail with the plain text body and the HTML alternative.
+
+    The plain text is stripped from the HTML, if it has not been given.
+    """
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text_message or strip_tags(html_message),
+        from_email=None,
+        to=[recipient],
+        bcc=None,
+        connection=connection,
+        reply_to=None,
+        headers=None,
+    )
+    if attachments:
+        for attachment in attachments:
+            email.attach_file(attachment)
+    if html_message:
+        email.attach_alternative(content=html_message, mimetype="text/html")
+    return email
+
+
+def email_idempotency_key(recipient, idempotency_key=None, recipient_keys=None):
+    """
+    Return the idempotency key of the e-mail to the recipient, a new one if no key is given.
+    """
+    if recipient_keys and recipient in recipient_keys:
+        return recipient_keys[recipient]
+    if idempotency_key:
+        return f"{idempotency_key}:{recipient}"
+    return uuid.uuid4().hex
+
+
+def queue_emails(messages, attachments=None, idempotency_key=None, recipient_keys=None):
+    """
+    Write the e-mails to the outbox, in the transaction of the caller.
+
+    An e-mail, whose idempotency key is in the outbox already, is not queued again.
+
+    :param list messages: a list of `(recipient, subject, html_message, text_message)`
+    :param list attachments: a list of attachments to put on every message
+    :param str idempotency_key: the key of the mailing, the recipient is added to it;
+        every e-mail is new without it
+    :param dict recipient_keys: the keys of the e-mails by their recipients,
+        e.g. to key them by the users, they take precedence over the key of the mailing
+    """
+    EmailOutbox.objects.bulk_create(
+        [
+            EmailOutbox(
+                idempotency_key=email_idempotency_key(recipient, idempotency_key, recipient_keys),
+                recipient=recipient,
+                subject=subject,
+                html_message=html_message,
+                text_message=text_message,
+                attachments=attachments or [],
+            )
+            for recipient, subject, html_message, text_message in messages
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def rate_limit_key():
+    """
+    Return the cache key of the e-mails sent through the mail server in the current minute.
+    """
+    return f"email-outbox:sent:{settings.EMAIL_HOST}:{int(time.time() // RATE_LIMIT_WINDOW)}"
+
+
+def reserve_sends(number, rate_limit=EMAIL_OUTBOX_RATE_LIMIT):
+    """
+    Reserve up to `number` e-mails in the current minute of the mail server.
+
+    :return: the number of the e-mails which can be sent now
+    """
+    key = rate_limit_key()
+    cache.add(key, 0, timeout=RATE_LIMIT_WINDOW * 2)
+    used = cache.incr(key, number)
+    return max(0, min(number, rate_limit - (used - number)))
+
+
+def claim_emails(number, recipients=None):
+    """
+    Claim the due e-mails for the lease time, the e-mails claimed by other workers are skipped.
+
+    :param int number: the maximal number of the claimed e-mails
+    :param list recipients: only the e-mails to these addresses are claimed, if given
+    """
+    emails = EmailOutbox.objects.filter(status=EmailStatuses.PENDING, next_attempt__lte=now())
+    if recipients is not None:
+        emails = emails.filter(recipient__in=recipients)
+    with transaction.atomic():
+        pks = list(
+            emails.order_by("next_attempt", "pk")
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)[:number]
+        )
+        EmailOutbox.objects.filter(pk__in=pks).update(
+            next_attempt=now() + timedelta(seconds=EMAIL_OUTBOX_LEASE)
+        )
+    return list(EmailOutbox.objects.filter(pk__in=pks).order_by("pk"))
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS or isinstance(error, BadHeaderError):
+        email.status = EmailStatuses.DEAD
+    else:
+        backoff = min(EMAIL_OUTBOX_BACKOFF * 2 ** (email.attempts - 1), EMAIL_OUTBOX_BACKOFF_MAX)
+        email.next_attempt = now() + timedelta(seconds=backoff)
+
+
+def send_claimed(emails):
+    """
+    Send the claimed e-mails over a single connection and record the results.
+
+    :return: the number of the sent e-mails
+    """
+    connection = get_connection()
+    try:
+        connection.open()
+    except (SMTPException, OSError) as error:
+        for email in emails:
+            _failed(email, error)
+    else:
+        with connection:
+            for email in emails:
+                try:
+                    build_email(
+                        email.recipient,
+                        email.subject,
+                        email.html_message,
+                        email.attachments,
+                        connection,
+                        email.text_message,
+                    ).send()
+                except (SMTPException, BadHeaderError, OSError) as error:
+                    _failed(email, error)
+                else:
+                    email.status = EmailStatuses.SENT
+                    email.sent = now()
+    EmailOutbox.objects.bulk_update(
+        emails, ["status", "attempts", "next_attempt", "last_error", "sent"]
+    )
+    return sum(email.status == EmailStatuses.SENT for email in emails)
+
+
+def dispatch_outbox(
+    batch_size=EMAIL_BATCH_SIZE, rate_limit=EMAIL_OUTBOX_RATE_LIMIT, recipients=None
+):
+    """
+    Send the due e-mails of the outbox in batches, until none is due or the rate limit is hit.
+
+    Several dispatchers can run at the same time, every e-mail is claimed by one of them.
+    The e-mails over the rate limit are postponed to the next minute.
+
+    :param int batch_size: the number of the e-mails sent over one connection
+    :param int rate_limit: the number of the e-mails sent through the mail server in a minute
+    :param list recipients: only the e-mails to these addresses are sent, if given
+    :return: the number of the sent e-mails
+    """
+    sent = 0
+    while emails := claim_emails(batch_size, recipients):
+        allowed = reserve_sends(len(emails), rate_limit)
+        emails, postponed = emails[:allowed], emails[allowed:]
+        if emails:
+            sent += send_claimed(emails)
+        if postponed:
+            next_window = (int(time.time() // RATE_LIMIT_WINDOW) + 1) * RATE_LIMIT_WINDOW
+            EmailOutbox.objects.filter(pk__in=[email.pk for email in postponed]).update(
+                next_attempt=datetime.fromtimestamp(next_window, tz=timezone.utc)
+            )
+            break
+    return sent
+
+
+def retry_emails(pks):
+    """
+    Queue the dead e-mails again, from the first attempt.
+
+    :return: the number of the queued e-mails
+    """
+    return EmailOutbox.objects.filter(pk__in=pks, status=EmailStatuses.DEAD).update(
+        status=EmailStatuses.PENDING, attempts=0, next_attempt=now()
+    )
+
+
+def clean_outbox(retention_days=EMAIL_OUTBOX_RETENTION_DAYS):
+    """
+    Remove the sent and the dead e-mails older than the retention period.
+
+    :return: the number of the removed e-mails
+    """
+    deleted, _ = EmailOutbox.objects.filter(
+        status__in=[EmailStatuses.SENT, EmailStatuses.DEAD],
+        created__lt=now() - timedelta(days=retention_days),
+    ).delete()
+    return deleted
+
+
+def outbox_stats(hours=EMAIL_OUTBOX_STATS_HOURS):
+    """
+    Return the depth of the queue, the send latency of the recent e-mails and the failures.
+
+    :param int hours: the period of the latency and of the sent e-mails count
+    :return: a dict of the statistics
+    """
+    latency = ExpressionWrapper(F("sent") - F("created"), output_field=DurationField())
+    recent = Q(status=EmailStatuses.SENT, sent__gte=now() - timedelta(hours=hours))
+    pending = Q(status=EmailStatuses.PENDING)
+    return EmailOutbox.objects.aggregate(
+        pending=Count("pk", filter=pending),
+        due=Count("pk", filter=pending & Q(next_attempt__lte=now())),
+        retrying=Count("pk", filter=pending & Q(attempts__gt=0)),
+        oldest_pending=Min("created", filter=pending),
+        dead=Count("pk", filter=Q(status=EmailStatuses.DEAD)),
+        sent_recently=Count("pk", filter=recent),
+        latency_avg=Avg(latency, filter=recent),
+        latency_max=Max(latency, filter=recent),
+    )
@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from kombu.exceptions import OperationalError
+
+from jobs.paginators import invalidate_count_cache
+from users.avatars import get_avatar_variants
+from users.models import User
+from users.tasks import users_make_avatar_variants
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Logging in only updates the `last_login` field, which does not change any count
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_count_cache(sender)
+
+
+def make_avatar_variants_later(user_pk):
+    try:
+        users_make_avatar_variants.delay(user_pk)
+    except OperationalError as error:
+        print(f"The avatar variants will be made by the `users_avatar_variants` command. {error}")
+
+
+@receiver(post_save, sender=User)
+def user_avatar_changed(sender, instance, update_fields=None, **kwargs):
+    # The variants of a new avatar are made by a worker, once the avatar is committed
+    if update_fields and "avatar" not in update_fields:
+        return
+    if instance.avatar and not get_avatar_variants(instance):
+        transaction.on_commit(lambda: make_avatar_variants_later(instance.pk))
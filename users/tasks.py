@@ -1,8 +1,11 @@
 from smtplib import SMTPException
 
 from celery import shared_task
-from django.core.mail import BadHeaderError, EmailMultiAlternatives
-from django.utils.html import strip_tags
+from django.core.mail import BadHeaderError
+
+from users.avatars import make_avatar_variants
+from users.notifications import send_digests
+from users.outbox import build_email, clean_outbox, dispatch_outbox
 
 
 @shared_task
@@ -10,31 +13,39 @@ def email_to_user(recipient, subject, html_message, attachments):
     """
     Send an email as an asynchronous task that runs independently of Django app.
 
+    The e-mails are queued in the outbox now, the task sends the ones queued before.
+
     :param str recipient: a recipient of an e-mail
     :param str subject: a subject of an e-mail
     :param str html_message: an alternative representation of the message body in the email
     :param list attachments: a list of attachments to put on the message
     """
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body=strip_tags(html_message),
-        from_email=None,
-        to=[recipient],
-        bcc=None,
-        reply_to=None,
-        headers=None,
-    )
-    if attachments:
-        for attachment in attachments:
-            email.attach_file(attachment)
-    if html_message:
-        email.attach_alternative(content=html_message, mimetype="text/html")
-
     try:
-        email.send()
+        build_email(recipient, subject, html_message, attachments).send()
     except BadHeaderError:
         print("Subject is not properly formatted.")
     except SMTPException as error:
         print(
             f"There was an error while trying to send a `{subject}` email to the {recipient} user. {error}"
         )
+
+
+@shared_task
+def users_dispatch_email_outbox():
+    return dispatch_outbox()
+
+
+@shared_task
+def users_clean_email_outbox():
+    return clean_outbox()
+
+
+@shared_task
+def users_send_notification_digests(delivery):
+    if send_digests(delivery):
+        dispatch_outbox()
+
+
+@shared_task
+def users_make_avatar_variants(user_pk):
+    return make_avatar_variants(user_pk)
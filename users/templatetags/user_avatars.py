@@ -0,0 +1,45 @@
+from django import template
+from django.conf import settings
+
+from users.avatars import get_avatar_variants
+from users.const import AVATAR_VARIANT_FORMATS
+
+register = template.Library()
+
+
+@register.inclusion_tag("users/avatar.html")
+def avatar(user, size, css_class="avatar-image", tooltip=False, lazy=True):
+    """
+    Renders the avatar as a `<picture>` of its variants, the browser picks the smallest one
+    sharp enough for the shown size in pixels, WebP if it can show it, otherwise JPEG.
+    Until the variants are made, the original avatar is shown.
+    """
+    context = {
+        "size": size,
+        "css_class": css_class,
+        "lazy": lazy,
+        "src": user.avatar.url if user.avatar else settings.DEFAULT_AVATAR,
+        "sources": [],
+    }
+    context["preview"] = context["src"] if tooltip else None
+    if variants := get_avatar_variants(user):
+        storage = user.avatar.storage
+        srcsets = {
+            extension: ", ".join(
+                f"{storage.url(names[extension])} {variant_size}w"
+                for variant_size, names in sorted(variants.items())
+            )
+            for extension, _, _ in AVATAR_VARIANT_FORMATS
+        }
+        # The last format is the fallback for the browsers which show none of the others
+        *sources, (fallback, _, _) = AVATAR_VARIANT_FORMATS
+        context["sources"] = [
+            {"type": content_type, "srcset": srcsets[extension]}
+            for extension, _, content_type in sources
+        ]
+        context["srcset"] = srcsets[fallback]
+        fitting = min((s for s in variants if s >= size), default=max(variants))
+        context["src"] = storage.url(variants[fitting][fallback])
+        if tooltip:
+            context["preview"] = storage.url(variants[max(variants)][fallback])
+    return context
@@ -1,5 +1,6 @@
 import datetime
 from io import BytesIO
+from unittest import mock
 
 from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile
 from django.test import Client, TestCase
@@ -12,6 +13,7 @@ from trades.models import ABBREVIATION_RAILWAY
 from users.const import (
     AVATAR_DIMENSION_ERROR,
     AVATAR_MAX_DIMENSION,
+    AVATAR_MAX_SIZE,
     AVATAR_SIZE_ERROR,
     AVATAR_TYPE_ERROR,
     BIRTH_DATE_FORM_ERROR,
@@ -26,10 +28,10 @@ from users.tests.factories import UserFactory
 
 
 class TestUserRegistrationForm(TestCase):
-    correct_dimensions = (100, 100)
+    correct_dimensions = (1200, 900)
     correct_size = 1024 * 1024
-    incorrect_dimensions = (700, 700)
-    incorrect_size = correct_size * 5
+    incorrect_dimensions = (AVATAR_MAX_DIMENSION + 1, 10)
+    incorrect_size = AVATAR_MAX_SIZE + 1
 
     @classmethod
     def setUpTestData(cls):
@@ -212,6 +214,27 @@ class TestUserRegistrationForm(TestCase):
             self.assertFalse(form.is_valid())
             self.assertEqual(expected_errors, form.errors)
 
+    def test_registration_avatar_reads_only_the_header(self):
+        """
+        A large avatar is accepted without decoding its content.
+        """
+        # Arrange
+        avatar = self._create_temporary_avatar(
+            file_format="JPEG", dimensions=(4000, 3000), file_size=self.correct_size
+        )
+
+        # Act
+        with mock.patch.object(Image.Image, "load") as load, mock.patch.object(
+            Image.Image, "verify"
+        ) as verify:
+            form = RegistrationForm(data=self.data, files={"avatar": avatar})
+            is_valid = form.is_valid()
+
+        # Assert
+        self.assertTrue(is_valid)
+        load.assert_not_called()
+        verify.assert_not_called()
+
 
 class TestUserLoginForm(TestCase):
     @classmethod
@@ -0,0 +1,574 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.mail import get_connection
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import transaction
+from django.test import override_settings, TestCase, TransactionTestCase
+from django.utils import timezone
+from django.utils.html import strip_tags
+from freezegun import freeze_time
+from kombu.exceptions import OperationalError
+from parameterized import parameterized
+from PIL import Image
+
+from jobs.tests.factories import image_content
+from users.avatars import get_avatar_variants, make_avatar_variants
+from users.const import EMAIL_OUTBOX_MAX_ATTEMPTS, EmailStatuses, NotificationDeliveries
+from users.helpers import dispatch_in_background, notify, send_email, wait_for_dispatches
+from users.models import EmailOutbox, NotificationEvent, User
+from users.notifications import send_digests
+from users.outbox import clean_outbox, dispatch_outbox, queue_emails, retry_emails, send_claimed
+from users.tasks import users_make_avatar_variants, users_send_notification_digests
+from users.tests.factories import UserFactory
+
+
+class TestMakeAvatarVariants(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.user = UserFactory.create()
+
+    def _set_avatar(self, content, name="avatar.jpg"):
+        self.user.avatar.save(name, ContentFile(content))
+        self.user.refresh_from_db()
+
+    def test_variants(self):
+        """
+        The avatar is cropped to squares of every size, in WebP and JPEG.
+        """
+        # Arrange
+        self._set_avatar(image_content(size=(1600, 1200), image_format="JPEG"))
+
+        # Act
+        made = make_avatar_variants(self.user.pk)
+
+        # Assert
+        self.assertTrue(made)
+        self.user.refresh_from_db()
+        variants = get_avatar_variants(self.user)
+        self.assertListEqual(sorted(variants), [48, 128, 256])
+        for size, names in variants.items():
+            for extension, expected_format in [("webp", "WEBP"), ("jpg", "JPEG")]:
+                with Image.open(os.path.join(self.media_root, names[extension])) as image:
+                    self.assertEqual(image.format, expected_format)
+                    self.assertEqual(image.size, (size, size))
+
+    def test_transparent_avatar(self):
+        """
+        The transparency of a PNG avatar is kept in WebP and becomes white in JPEG.
+        """
+        # Arrange
+        buffer = io.BytesIO()
+        Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(buffer, "PNG")
+        self._set_avatar(buffer.getvalue(), "avatar.png")
+
+        # Act
+        make_avatar_variants(self.user.pk)
+
+        # Assert
+        self.user.refresh_from_db()
+        names = get_avatar_variants(self.user)[48]
+        with Image.open(os.path.join(self.media_root, names["webp"])) as image:
+            self.assertEqual(image.mode, "RGBA")
+        with Image.open(os.path.join(self.media_root, names["jpg"])) as image:
+            self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+    def test_variants_are_made_once(self):
+        """
+        The variants of the same avatar are not made again.
+        """
+        # Arrange
+        self._set_avatar(image_content(image_format="JPEG"))
+        make_avatar_variants(self.user.pk)
+
+        # Act
+        made = make_avatar_variants(self.user.pk)
+
+        # Assert
+        self.assertFalse(made)
+
+    def test_variants_of_a_replaced_avatar_are_removed(self):
+        """
+        A new avatar gets new variants and the old ones are removed.
+        """
+        # Arrange
+        self._set_avatar(image_content(image_format="JPEG"))
+        make_avatar_variants(self.user.pk)
+        self.user.refresh_from_db()
+        old_names = [
+            name for names in get_avatar_variants(self.user).values() for name in names.values()
+        ]
+        self._set_avatar(image_content(image_format="PNG"), "new_avatar.png")
+
+        # Act
+        made = make_avatar_variants(self.user.pk)
+
+        # Assert
+        self.assertTrue(made)
+        self.user.refresh_from_db()
+        self.assertTrue(get_avatar_variants(self.user)[48]["webp"].endswith("new_avatar_48.webp"))
+        for name in old_names:
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_variants_are_made_after_the_upload(self):
+        """
+        The variants of a new avatar are made by a worker, once the avatar is committed.
+        """
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            self._set_avatar(image_content(image_format="JPEG"))
+
+        # Assert
+        self.assertTrue(get_avatar_variants(User.objects.get(pk=self.user.pk)))
+
+    def test_task_without_avatar(self):
+        """
+        There is nothing to do for a user without an avatar.
+        """
+        # Act
+        made = users_make_avatar_variants(self.user.pk)
+
+        # Assert
+        self.assertFalse(made)
+
+
+class TestSendEmail(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = UserFactory.create_batch(3)
+        cls.users[0].first_name, cls.users[0].last_name = "Jan <b>", "Kowalski"
+        cls.users[0].save()
+        cls.recipients = [user.email for user in cls.users] + ["unknown@example.com"]
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_send_email(self):
+        """
+        The names of the recipients are read in one query and filled in the rendered template.
+        """
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(2):
+                send_email(recipients=self.recipients, subject="Subject", content="<i>C</i>")
+
+        # Assert
+        self.assertListEqual(
+            [email.to for email in mail.outbox], [[email] for email in self.recipients]
+        )
+        html_message = mail.outbox[0].alternatives[0][0]
+        self.assertIn("Hello Jan &lt;b&gt; Kowalski,", html_message)
+        self.assertIn("<i>C</i>", html_message)
+        self.assertIn(f"Hello {self.users[1].get_full_name()},", mail.outbox[1].body)
+        self.assertIn("Hello User,", mail.outbox[3].body)
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_email_is_rendered_once(self):
+        """
+        The template is rendered and stripped to the plain text once for all the recipients.
+        """
+        # Act
+        with mock.patch("users.emails.strip_tags", wraps=strip_tags) as strip:
+            with self.captureOnCommitCallbacks(execute=True):
+                send_email(recipients=self.recipients, subject="Subject", content="<i>C</i>")
+
+        # Assert
+        strip.assert_called_once()
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertIn("Hello Jan &lt;b&gt; Kowalski,", mail.outbox[0].body)
+        self.assertNotIn("<i>", mail.outbox[0].body)
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_emails_wait_for_the_commit(self):
+        """
+        The e-mails are queued in the outbox and sent once the transaction is committed.
+        """
+        # Act
+        with self.captureOnCommitCallbacks() as callbacks:
+            send_email(recipients=self.recipients, subject="Subject", content="Content")
+
+        # Assert
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailStatuses.PENDING).count(), 4)
+
+    def test_rolled_back_emails(self):
+        """
+        The e-mails of a rolled back transaction are not queued.
+        """
+        # Act
+        with transaction.atomic():
+            send_email(recipients=self.recipients, subject="Subject", content="Content")
+            transaction.set_rollback(True)
+
+        # Assert
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_idempotency_key(self):
+        """
+        A mailing with the same idempotency key is queued once for each recipient.
+        """
+        # Act
+        for recipients in [self.recipients[:2], self.recipients]:
+            send_email(
+                recipients=recipients, subject="Subject", content="Content", idempotency_key="k"
+            )
+
+        # Assert
+        self.assertListEqual(
+            list(EmailOutbox.objects.order_by("pk").values_list("idempotency_key", flat=True)),
+            [f"k:{recipient}" for recipient in self.recipients],
+        )
+
+    @override_settings(SEND_EMAIL_CELERY=True)
+    def test_broker_is_down(self):
+        """
+        The e-mails stay in the outbox for the periodic dispatch, if the broker is down.
+        """
+        # Act
+        with mock.patch("users.helpers.users_dispatch_email_outbox") as task:
+            task.delay.side_effect = OperationalError("Connection refused")
+            with self.captureOnCommitCallbacks(execute=True):
+                send_email(recipients=self.recipients, subject="Subject", content="Content")
+
+        # Assert
+        task.delay.assert_called_once_with()
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailStatuses.PENDING).count(), 4)
+
+
+@override_settings(SEND_EMAIL_CELERY=False, EMAIL_DISPATCH_WORKERS=1)
+class TestDispatchInBackground(TransactionTestCase):
+    def tearDown(self):
+        wait_for_dispatches()
+
+    def test_send_email(self):
+        """
+        The e-mails are sent by the local worker pool, once they are committed.
+        """
+        # Arrange
+        recipients = [user.email for user in UserFactory.create_batch(2)]
+
+        # Act
+        with transaction.atomic():
+            send_email(recipients=recipients, subject="Subject", content="Content")
+            self.assertEqual(EmailOutbox.objects.count(), 2)
+        wait_for_dispatches()
+
+        # Assert
+        self.assertListEqual(sorted(email.to[0] for email in mail.outbox), sorted(recipients))
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailStatuses.SENT).count(), 2)
+
+    def test_pool_is_bounded(self):
+        """
+        When the workers are busy, one more dispatch waits and the others are not queued.
+        """
+        # Arrange
+        busy = threading.Event()
+
+        # Act
+        with mock.patch("users.helpers.dispatch_outbox", side_effect=busy.wait) as dispatch:
+            for _ in range(5):
+                dispatch_in_background()
+            busy.set()
+            wait_for_dispatches()
+
+        # Assert
+        self.assertEqual(dispatch.call_count, 2)
+
+
+class TestDispatchOutbox(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipients = [f"user{index}@example.com" for index in range(3)]
+
+    def setUp(self):
+        queue_emails(
+            [(recipient, "Subject", "<p>Content</p>", "Content") for recipient in self.recipients]
+        )
+
+    def test_dispatch(self):
+        """
+        The due e-mails are sent in batches, each over a single connection.
+        """
+        # Act
+        with mock.patch("users.outbox.get_connection", wraps=get_connection) as connection:
+            sent = dispatch_outbox(batch_size=2)
+
+        # Assert
+        self.assertEqual(sent, 3)
+        self.assertEqual(connection.call_count, 2)
+        self.assertListEqual([email.to for email in mail.outbox], [[r] for r in self.recipients])
+        self.assertFalse(
+            EmailOutbox.objects.exclude(status=EmailStatuses.SENT).exclude(sent__isnull=False)
+        )
+
+    def test_dispatch_to_recipients(self):
+        """
+        Only the e-mails to the given recipients are sent, the others stay in the outbox.
+        """
+        # Act
+        sent = dispatch_outbox(recipients=self.recipients[:2])
+
+        # Assert
+        self.assertEqual(sent, 2)
+        self.assertListEqual(
+            [email.to for email in mail.outbox], [[r] for r in self.recipients[:2]]
+        )
+        self.assertEqual(
+            EmailOutbox.objects.get(status=EmailStatuses.PENDING).recipient, self.recipients[2]
+        )
+
+    def test_not_due(self):
+        """
+        An e-mail waiting for its next attempt is not sent.
+        """
+        # Arrange
+        EmailOutbox.objects.update(next_attempt=timezone.now() + timedelta(minutes=1))
+
+        # Act
+        sent = dispatch_outbox()
+
+        # Assert
+        self.assertEqual(sent, 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @parameterized.expand([(0, 60), (2, 240), (7, 2 * 60 * 60)])
+    def test_failure_backoff(self, attempts, expected_backoff):
+        """
+        An e-mail refused by the mail server is tried again later, the rest of the batch is sent.
+        """
+        # Arrange
+        EmailOutbox.objects.update(attempts=attempts, next_attempt=datetime_utc("2024-11-05 12:00"))
+        send = locmem.EmailBackend.send_messages
+
+        def send_messages(backend, emails):
+            if self.recipients[1] in emails[0].to:
+                raise SMTPRecipientsRefused({})
+            return send(backend, emails)
+
+        # Act
+        with freeze_time("2024-11-05 12:00"), mock.patch.object(
+            locmem.EmailBackend, "send_messages", send_messages
+        ):
+            sent = dispatch_outbox()
+
+        # Assert
+        self.assertEqual(sent, 2)
+        failed = EmailOutbox.objects.get(recipient=self.recipients[1])
+        self.assertEqual(failed.status, EmailStatuses.PENDING)
+        self.assertEqual(failed.attempts, attempts + 1)
+        self.assertEqual(failed.last_error, "SMTPRecipientsRefused: {}")
+        self.assertEqual(
+            failed.next_attempt,
+            datetime_utc("2024-11-05 12:00") + timedelta(seconds=expected_backoff),
+        )
+
+    def test_dead_letter(self):
+        """
+        An e-mail is left dead after the last failed attempt.
+        """
+        # Arrange
+        EmailOutbox.objects.update(attempts=EMAIL_OUTBOX_MAX_ATTEMPTS - 1)
+
+        # Act
+        with mock.patch.object(locmem.EmailBackend, "open", side_effect=OSError("Refused")):
+            sent = dispatch_outbox()
+
+        # Assert
+        self.assertEqual(sent, 0)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailStatuses.DEAD).count(), 3)
+        self.assertEqual(EmailOutbox.objects.first().last_error, "OSError: Refused")
+
+    def test_rate_limit(self):
+        """
+        The e-mails over the rate limit are postponed to the next minute.
+        """
+        # Arrange
+        EmailOutbox.objects.update(next_attempt=datetime_utc("2024-11-05 12:00"))
+
+        # Act
+        with freeze_time("2024-11-05 12:00:30"):
+            sent = dispatch_outbox(rate_limit=2)
+
+        # Assert
+        self.assertEqual(sent, 2)
+        postponed = EmailOutbox.objects.get(status=EmailStatuses.PENDING)
+        self.assertEqual(postponed.next_attempt, datetime_utc("2024-11-05 12:01"))
+        self.assertEqual(postponed.attempts, 0)
+
+    def test_retry_and_clean(self):
+        """
+        The dead e-mails can be queued again and the old ones are removed.
+        """
+        # Arrange
+        EmailOutbox.objects.update(status=EmailStatuses.DEAD, attempts=EMAIL_OUTBOX_MAX_ATTEMPTS)
+        old = EmailOutbox.objects.first()
+        EmailOutbox.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=31))
+
+        # Act
+        removed = clean_outbox()
+        retried = retry_emails(EmailOutbox.objects.values_list("pk", flat=True))
+
+        # Assert
+        self.assertEqual(removed, 1)
+        self.assertEqual(retried, 2)
+        self.assertEqual(dispatch_outbox(), 2)
+
+    def test_benchmark(self):
+        """
+        The benchmark sends its e-mails to a local SMTP server in both ways, the queued ones
+        are left in the outbox.
+        """
+        # Arrange
+        output = io.StringIO()
+
+        # Act
+        with mock.patch("users.outbox.send_claimed", wraps=send_claimed) as sent:
+            call_command(
+                "users_email_benchmark", messages=4, batch_size=2, latency=0, stdout=output
+            )
+
+        # Assert
+        self.assertIn("One connection per e-mail: 4/4 e-mails", output.getvalue())
+        self.assertIn("Outbox, one connection per batch of 2: 4/4 e-mails", output.getvalue())
+        recipients = {email.recipient for call in sent.call_args_list for email in call.args[0]}
+        self.assertTrue(recipients.isdisjoint(self.recipients))
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailStatuses.PENDING).count(), 3)
+
+
+class TestNotificationDigests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.immediate, cls.hourly, cls.daily = [
+            UserFactory.create(notification_delivery=delivery)
+            for delivery in NotificationDeliveries
+        ]
+        cls.users = [cls.immediate, cls.hourly, cls.daily]
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_notify(self):
+        """
+        The user with the immediate delivery gets an e-mail, the others get an event for a digest.
+        """
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(users=self.users, subject="Subject", content="Content")
+
+        # Assert
+        self.assertListEqual([email.to for email in mail.outbox], [[self.immediate.email]])
+        self.assertListEqual(
+            list(NotificationEvent.objects.order_by("user_id").values_list("user", flat=True)),
+            sorted([self.hourly.pk, self.daily.pk]),
+        )
+
+    def test_notify_idempotency_key(self):
+        """
+        An event with the same idempotency key is stored once for each user.
+        """
+        # Act
+        for _ in range(2):
+            notify(users=self.users, subject="Subject", content="Content", idempotency_key="k")
+
+        # Assert
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+        self.assertSetEqual(
+            set(NotificationEvent.objects.values_list("idempotency_key", flat=True)),
+            {f"k:{self.hourly.pk}", f"k:{self.daily.pk}"},
+        )
+
+    @parameterized.expand([(NotificationDeliveries.HOURLY,), (NotificationDeliveries.DAILY,)])
+    def test_send_digests(self, delivery):
+        """
+        The pending events of every user are queued in one digest e-mail, in a fixed number of queries.
+        """
+        # Arrange
+        other = UserFactory.create(notification_delivery=delivery)
+        for index in range(3):
+            notify(
+                users=self.users + [other], subject=f"Subject {index}", content=f"<i>{index}</i>"
+            )
+        user = self.hourly if delivery == NotificationDeliveries.HOURLY else self.daily
+
+        # Act
+        with self.assertNumQueries(5):
+            sent = send_digests(delivery)
+
+        # Assert
+        self.assertEqual(sent, 2)
+        self.assertListEqual(
+            list(
+                EmailOutbox.objects.exclude(recipient=self.immediate.email)
+                .order_by("recipient")
+                .values_list("recipient", flat=True)
+            ),
+            sorted([user.email, other.email]),
+        )
+        html_message = EmailOutbox.objects.get(recipient=user.email).html_message
+        self.assertIn(f"Hello {user.get_full_name()},", html_message)
+        for index in range(3):
+            self.assertIn(f"<i>{index}</i>", html_message)
+        self.assertFalse(
+            NotificationEvent.objects.filter(user__in=[user, other], digested__isnull=True).exists()
+        )
+        self.assertTrue(NotificationEvent.objects.filter(digested__isnull=True).exists())
+
+    def test_send_digests_once(self):
+        """
+        The digested events are not sent again.
+        """
+        # Arrange
+        notify(users=[self.daily], subject="Subject", content="Content")
+        send_digests(NotificationDeliveries.DAILY)
+
+        # Act
+        sent = send_digests(NotificationDeliveries.DAILY)
+
+        # Assert
+        self.assertEqual(sent, 0)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_hourly_digest_takes_events_of_the_immediate_delivery(self):
+        """
+        The events left from before a switch to the immediate delivery go with the hourly digests.
+        """
+        # Arrange
+        notify(users=[self.daily], subject="Subject", content="Content")
+        User.objects.filter(pk=self.daily.pk).update(
+            notification_delivery=NotificationDeliveries.IMMEDIATE
+        )
+
+        # Act
+        sent = send_digests(NotificationDeliveries.HOURLY)
+
+        # Assert
+        self.assertEqual(sent, 1)
+        self.assertEqual(EmailOutbox.objects.get().recipient, self.daily.email)
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_users_send_notification_digests(self):
+        """
+        The task sends the queued digests right away.
+        """
+        # Arrange
+        notify(users=[self.hourly], subject="Subject", content="Content")
+
+        # Act
+        users_send_notification_digests(NotificationDeliveries.HOURLY)
+
+        # Assert
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "1 new notification(s) from the MarBud website")
+
+
+def datetime_utc(value):
+    return datetime.strptime(value, "%Y-%m-%d %H:%M").replace(tzinfo=dt_timezone.utc)
@@ -1,29 +1,47 @@
 import datetime
+import shutil
+import tempfile
+from unittest import mock
 from urllib.parse import urlencode
 
 from django.contrib.messages import get_messages
 from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, override_settings, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
 
 from jobs.consts import JobStatuses
-from jobs.tests.factories import JobFactory
+from jobs.tests.factories import image_content, JobFactory
 from trades.factories import TradeFactory
 from trades.models import ABBREVIATION_RAILWAY, Trade
+from users.avatars import make_avatar_variants
 from users.const import (
     ADMIN_NECESSITY_MESSAGE,
     EMAIL_ACCEPTANCE_SUBJECT,
+    EMAIL_OUTBOX_MAX_ATTEMPTS,
     EMAIL_REGISTRATION_SUBJECT,
+    EMAILS_RETRIED,
+    EmailStatuses,
     LOGIN_NECESSITY_MESSAGE,
     LOGIN_SUCCESS_MESSAGE,
     LOGOUT_SUCCESS_MESSAGE,
+    NotificationDeliveries,
+    NOTIFICATIONS_SAVED_MESSAGE,
     PASSWORD_STRONG,
     REGISTRATION_SUCCESS_MESSAGE,
     USERS_ACCEPTED,
     USERS_DELETED,
     USERS_OBJECTS_PER_PAGE,
 )
-from users.models import SITE_MANAGER, User
+from users.forms import AcceptOrDeleteForm
+from users.helpers import dispatch_emails
+from users.models import EmailOutbox, SITE_MANAGER, User
+from users.outbox import queue_emails
 from users.tests.factories import UserFactory
 
 
@@ -71,7 +89,8 @@ class TestUserRegistration(TestCase):
         }
 
         # Act
-        response = self.client.post(self.url, data=data)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, data=data)
         response_messages = list(get_messages(response.wsgi_request))
 
         # Assert
@@ -82,6 +101,45 @@ class TestUserRegistration(TestCase):
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, EMAIL_REGISTRATION_SUBJECT)
 
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_post_with_an_avatar_when_the_broker_is_down(self):
+        """
+        The user is registered and e-mailed, if the avatar variants cannot be sent to a worker.
+        """
+        # Arrange
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        data = {
+            "first_name": "Genowefa",
+            "last_name": "Nowakowska",
+            "phone": "123123123",
+            "role": SITE_MANAGER,
+            "trades": Trade.objects.all().values_list("pk", flat=True),
+            "birth_date": datetime.date(1964, 6, 3),
+            "email": self.email,
+            "password1": PASSWORD_STRONG,
+            "password2": PASSWORD_STRONG,
+            "avatar": SimpleUploadedFile(
+                "avatar.jpg", image_content(image_format="JPEG"), content_type="image/jpeg"
+            ),
+        }
+
+        # Act
+        with mock.patch("users.signals.users_make_avatar_variants") as task:
+            task.delay.side_effect = OperationalError("Connection refused")
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, data=data)
+        response_messages = list(get_messages(response.wsgi_request))
+
+        # Assert
+        _assert_redirects_and_response_messages(
+            self, response, response_messages, REGISTRATION_SUCCESS_MESSAGE
+        )
+        task.delay.assert_called_once_with(User.objects.get(email=self.email).pk)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, EMAIL_REGISTRATION_SUBJECT)
+
 
 class TestUserLogin(TestCase):
     @classmethod
@@ -239,6 +297,60 @@ class TestUserPanel(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertDictEqual(response.context["jobs_statistics"], expected_stats)
 
+    def test_get_jobs_statistics_in_a_single_query(self):
+        """
+        The statistics are read from the job counters, in one query for both roles.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        JobFactory.create(principal=self.user, status=JobStatuses.WAITING)
+        JobFactory.create(contractor=self.user, status=JobStatuses.ONGOING)
+
+        # Act
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len([query for query in context if "jobs_job" in query["sql"]]), 1, context
+        )
+
+    def test_post_notification_delivery(self):
+        """
+        The user chooses to get the notifications in a daily digest.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+
+        # Act
+        response = self.client.post(
+            self.url, data={"notification_delivery": NotificationDeliveries.DAILY}
+        )
+        response_messages = list(get_messages(response.wsgi_request))
+
+        # Assert
+        self.assertRedirects(response, self.url)
+        self.assertEqual(response_messages[0].message, NOTIFICATIONS_SAVED_MESSAGE)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.notification_delivery, NotificationDeliveries.DAILY)
+
+    def test_post_invalid_notification_delivery(self):
+        """
+        An unknown delivery is not saved.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+
+        # Act
+        response = self.client.post(self.url, data={"notification_delivery": "weekly"})
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["notifications_form"].errors)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.notification_delivery, NotificationDeliveries.IMMEDIATE)
+
 
 class TestUsersAll(TestCase):
     @classmethod
@@ -292,6 +404,25 @@ class TestUsersAll(TestCase):
         )
         self.assertEqual(response.context["paginator"].num_pages, 2)
 
+    def test_users_all_count_is_invalidated(self):
+        """
+        The cached number of users changes after a user is created or deleted.
+        """
+        # Arrange
+        self.client.force_login(user=self.user)
+        response_before = self.client.get(self.url)
+
+        # Act
+        user = UserFactory.create()
+        response_created = self.client.get(self.url)
+        AcceptOrDeleteForm.delete_users([user.pk])
+        response_deleted = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response_before.context["paginator"].count, 1)
+        self.assertEqual(response_created.context["paginator"].count, 2)
+        self.assertEqual(response_deleted.context["paginator"].count, 1)
+
 
 class TestAcceptOrDelete(TestCase):
     @classmethod
@@ -359,7 +490,9 @@ class TestAcceptOrDelete(TestCase):
         data = {"action_checkbox": users_to_accept, "action_accept": [""]}
 
         # Act
-        response = self.client.post(self.url, data=data)
+        with mock.patch("users.helpers.dispatch_emails", wraps=dispatch_emails) as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, data=data)
         response_messages = list(get_messages(response.wsgi_request))
 
         # Assert
@@ -370,8 +503,41 @@ class TestAcceptOrDelete(TestCase):
             USERS_ACCEPTED.format(users_to_accept.count()), response_messages[0].message
         )
         self.assertEqual(User.objects.filter(is_active=True).count(), users_count)
+        self.assertGreater(users_to_accept.count(), 1)
+        # All the users are accepted in a single mailing
+        dispatch.assert_called_once_with()
         self.assertEqual(len(mail.outbox), users_to_accept.count())
         self.assertEqual(set([mail.subject for mail in mail.outbox]), {EMAIL_ACCEPTANCE_SUBJECT})
+        self.assertSetEqual(
+            set(EmailOutbox.objects.values_list("idempotency_key", flat=True)),
+            {f"account-acceptance:{pk}" for pk in users_to_accept},
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_post_action_accept_a_new_account_with_the_address_of_a_deleted_one(self):
+        """
+        A new account registered with the address of a deleted one gets its own acceptance e-mail.
+        """
+        # Arrange
+        self.client.force_login(user=self.user_admin)
+        user = UserFactory.create(is_active=False)
+        email = user.email
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, data={"action_checkbox": [user.pk], "action_accept": [""]})
+        user.delete()
+        new_user = UserFactory.create(email=email, is_active=False)
+        mail.outbox.clear()
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                self.url, data={"action_checkbox": [new_user.pk], "action_accept": [""]}
+            )
+
+        # Assert
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [email])
+        self.assertEqual(mail.outbox[0].subject, EMAIL_ACCEPTANCE_SUBJECT)
 
     def test_post_action_delete_should_delete_users(self):
         """
@@ -395,3 +561,135 @@ class TestAcceptOrDelete(TestCase):
             USERS_DELETED.format(users_to_delete.count()), response_messages[0].message
         )
         self.assertEqual(User.objects.count(), users_count - users_to_delete.count())
+
+
+class TestUsersAllAvatars(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.user = UserFactory.create(is_active=True)
+        self.user.avatar.save("avatar.jpg", ContentFile(image_content(image_format="JPEG")))
+        self.client = Client()
+        self.client.force_login(user=self.user)
+
+    def test_original_avatar_until_the_variants_are_made(self):
+        """
+        The original avatar is shown until its variants are made.
+        """
+        # Act
+        response = self.client.get(reverse("users-all"))
+
+        # Assert
+        self.assertContains(response, f'src="{self.user.avatar.url}"', count=2)
+        self.assertNotContains(response, "<source")
+
+    def test_avatar_variants(self):
+        """
+        The avatars are shown from their variants, WebP with a JPEG fallback.
+        """
+        # Arrange
+        make_avatar_variants(self.user.pk)
+
+        # Act
+        response = self.client.get(reverse("users-all"))
+
+        # Assert
+        self.assertContains(
+            response,
+            '<source type="image/webp" srcset="/media/avatars/variants/avatar_48.webp 48w, '
+            "/media/avatars/variants/avatar_128.webp 128w, "
+            '/media/avatars/variants/avatar_256.webp 256w" sizes="50px">',
+            count=2,
+        )
+        self.assertContains(response, 'src="/media/avatars/variants/avatar_128.jpg"', count=2)
+        self.assertContains(
+            response, "data-bs-title=\"<img src='/media/avatars/variants/avatar_256.jpg'/>\""
+        )
+        self.assertNotContains(response, self.user.avatar.url)
+
+
+class TestEmailOutbox(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse("email-outbox")
+        cls.user_admin = UserFactory.create(is_active=True, is_admin=True)
+        cls.user_active = UserFactory.create(is_active=True)
+        queue_emails(
+            [
+                (f"user{index}@example.com", "Subject", "<p>Content</p>", "Content")
+                for index in range(3)
+            ]
+        )
+        EmailOutbox.objects.filter(recipient="user0@example.com").update(
+            status=EmailStatuses.DEAD,
+            attempts=EMAIL_OUTBOX_MAX_ATTEMPTS,
+            last_error="SMTPRecipientsRefused: {}",
+        )
+        EmailOutbox.objects.filter(recipient="user1@example.com").update(
+            status=EmailStatuses.SENT, sent=timezone.now()
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_get_not_admin_user_cannot_enter(self):
+        """
+        Logged-in user is not allowed to enter the page.
+        """
+        # Arrange
+        self.client.force_login(user=self.user_active)
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertRedirects(response, reverse("home-page"))
+
+    def test_get_admin_user_sees_the_queue(self):
+        """
+        An admin user sees the depth of the queue, the latency and the failed e-mails.
+        """
+        # Arrange
+        self.client.force_login(user=self.user_admin)
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        stats = response.context["stats"]
+        self.assertEqual(
+            (stats["pending"], stats["due"], stats["dead"], stats["sent_recently"]), (1, 1, 1, 1)
+        )
+        self.assertIsNotNone(stats["latency_avg"])
+        self.assertListEqual(
+            [email.recipient for email in response.context["failures"]], ["user0@example.com"]
+        )
+        self.assertContains(response, "SMTPRecipientsRefused: {}")
+
+    @override_settings(SEND_EMAIL_CELERY=False)
+    def test_post_retry(self):
+        """
+        An admin user can send the dead e-mails again.
+        """
+        # Arrange
+        self.client.force_login(user=self.user_admin)
+        dead = EmailOutbox.objects.get(status=EmailStatuses.DEAD)
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url, data={"action_checkbox": [dead.pk], "action_retry": [""]}
+            )
+
+        # Assert
+        self.assertRedirects(response, self.url)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            [EMAILS_RETRIED.format(1)],
+        )
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailStatuses.SENT).count(), 3)
+        self.assertListEqual(
+            sorted(email.to[0] for email in mail.outbox), ["user0@example.com", "user2@example.com"]
+        )
@@ -1,29 +1,38 @@
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import redirect, render
 
 from jobs.consts import JobStatuses
+from jobs.models import JobCounter
+from jobs.paginators import CachedCountPaginator
 from users.const import (
     ADMIN_NECESSITY_MESSAGE,
     EMAIL_ACCEPTANCE_CONTENT,
     EMAIL_ACCEPTANCE_SUBJECT,
+    EMAIL_OUTBOX_FAILURES_SHOWN,
+    EMAIL_OUTBOX_STATS_HOURS,
     EMAIL_REGISTRATION_CONTENT,
     EMAIL_REGISTRATION_SUBJECT,
+    EMAILS_RETRIED,
+    EmailStatuses,
     FORM_ERROR_MESSAGE,
     LOGIN_FAIL_MESSAGE,
     LOGIN_NECESSITY_MESSAGE,
     LOGIN_SUCCESS_MESSAGE,
     LOGOUT_SUCCESS_MESSAGE,
+    NOTIFICATIONS_SAVED_MESSAGE,
     REGISTRATION_SUCCESS_MESSAGE,
     USERS_ACCEPTED,
     USERS_DELETED,
     USERS_OBJECTS_PER_PAGE,
 )
-from users.forms import AcceptOrDeleteForm, LoginForm, RegistrationForm
-from users.helpers import send_email
-from users.models import User
+from users.forms import AcceptOrDeleteForm, LoginForm, NotificationsForm, RegistrationForm
+from users.helpers import dispatch_emails, send_email
+from users.models import EmailOutbox, User
+from users.outbox import outbox_stats, retry_emails
 
 
 def registration(request):
@@ -63,6 +72,7 @@ def registration(request):
                 recipients=[user.email],
                 subject=EMAIL_REGISTRATION_SUBJECT,
                 content=EMAIL_REGISTRATION_CONTENT,
+                idempotency_key=f"registration:{user.pk}",
             )
 
             messages.success(request, REGISTRATION_SUCCESS_MESSAGE)
@@ -116,7 +126,7 @@ def log_out(request):
 
 def panel(request):
     """
-    Display a user details and his job statistics.
+    Display a user details and his job statistics, allow to choose how he is notified.
 
     :template: users/panel.html
     :param request: the request object
@@ -124,19 +134,18 @@ def panel(request):
     """
     user = request.user
     if user and user.is_authenticated:
-        roles_dict = {
-            "principal": user.jobs_principal.all(),
-            "contractor": user.jobs_contractor.all(),
-        }
+        notifications_form = NotificationsForm(data=request.POST or None, instance=user)
+        if request.method == "POST" and notifications_form.is_valid():
+            notifications_form.save()
+            messages.success(request, NOTIFICATIONS_SAVED_MESSAGE)
+            return redirect("panel")
+
         jobs_statistics = {}
-        for role, query in roles_dict.items():
-            result = {
-                "all": query.count(),
-                "statuses": {
-                    status.label: query.filter(status=status).count() for status in JobStatuses
-                },
+        for role, counts in JobCounter.objects.for_user(user).items():
+            jobs_statistics[role] = {
+                "all": sum(counts.values()),
+                "statuses": {status.label: counts[status] for status in JobStatuses},
             }
-            jobs_statistics[role] = result
 
         return render(
             request=request,
@@ -144,6 +153,7 @@ def panel(request):
             context={
                 "user": user,
                 "jobs_statistics": jobs_statistics,
+                "notifications_form": notifications_form,
             },
         )
     else:
@@ -161,7 +171,7 @@ def users_all(request):
     :return: the request response - `users-all` page
     """
     users = User.objects.all().order_by("last_name", "first_name")
-    paginator = Paginator(users, per_page=USERS_OBJECTS_PER_PAGE)
+    paginator = CachedCountPaginator(users, per_page=USERS_OBJECTS_PER_PAGE)
 
     page_number = request.GET.get("page")
     page_object = paginator.get_page(page_number)
@@ -201,12 +211,15 @@ def accept_or_delete_inactive_users(request):
             users_list = request.POST.getlist("action_checkbox")
             if "action_accept" in request.POST:
                 form.accept_users(users_list)
-                for user in User.objects.filter(pk__in=users_list):
-                    send_email(
-                        recipients=[user.email],
-                        subject=EMAIL_ACCEPTANCE_SUBJECT,
-                        content=EMAIL_ACCEPTANCE_CONTENT,
-                    )
+                accepted = User.objects.filter(pk__in=users_list).only("pk", "email")
+                send_email(
+                    recipients=[user.email for user in accepted],
+                    subject=EMAIL_ACCEPTANCE_SUBJECT,
+                    content=EMAIL_ACCEPTANCE_CONTENT,
+                    recipient_keys={
+                        user.email: f"account-acceptance:{user.pk}" for user in accepted
+                    },
+                )
                 messages.success(request, USERS_ACCEPTED.format(len(users_list)))
             else:
                 form.delete_users(users_list)
@@ -217,3 +230,41 @@ def accept_or_delete_inactive_users(request):
         template_name="users/accept_or_delete.html",
         context={"form": form, "inactive_users": inactive_users},
     )
+
+
+@login_required
+def email_outbox(request):
+    """
+    Display the depth of the e-mail queue, the send latency and the failed e-mails.
+
+    The dead e-mails can be queued again.
+
+    :template: users/email_outbox.html
+    :param request: the request object
+    :return: the request response - `email-outbox` page
+    """
+    if not request.user.is_admin:
+        messages.error(request, ADMIN_NECESSITY_MESSAGE)
+        return redirect("home-page")
+
+    if request.method == "POST":
+        pks = [pk for pk in request.POST.getlist("action_checkbox") if pk.isdigit()]
+        retried = retry_emails(pks)
+        transaction.on_commit(dispatch_emails)
+        messages.success(request, EMAILS_RETRIED.format(retried))
+        return redirect("email-outbox")
+
+    failures = (
+        EmailOutbox.objects.filter(~Q(status=EmailStatuses.SENT), attempts__gt=0)
+        .defer("html_message")
+        .order_by("-pk")[:EMAIL_OUTBOX_FAILURES_SHOWN]
+    )
+    return render(
+        request=request,
+        template_name="users/email_outbox.html",
+        context={
+            "stats": outbox_stats(),
+            "stats_hours": EMAIL_OUTBOX_STATS_HOURS,
+            "failures": failures,
+        },
+    )